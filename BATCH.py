@@ -0,0 +1,214 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import seaborn as sns
+try:
+    import yaml
+except ImportError:
+    yaml = None
+from CACHE import content_hash, stamp_fingerprint
+from LOAD import DISK_CACHE, EXCEL_TYPES, CSV_ENGINES, compact_dtypes, project, read_upload, resolve_engine
+from RENDER import PLOT_DPI, PLOT_FORMAT, draw_plot, encode_figure
+from DENSITY import binned_displot, binned_kdeplot
+from FIT import analytic_lmplot, analytic_regplot, grouped_lmplot, lowess_regplot, lowess_residplot
+from MATRIX import CLUSTER_ROWS, CLUSTER_SAMPLE, correlation_matrix, linked_clustermap, representative_rows
+from REL import aggregated_lineplot, rasterized_relplot, rasterized_scatterplot
+from STATS import binned_matrix
+from SUMMARY import summary_boxenplot, summary_boxplot, summary_catplot, summary_violinplot
+from SWARM import budget_swarmplot, fast_catplot
+
+BATCH_FORMATS = ["png", "svg", "pdf"]
+BATCH_WORKERS = int(os.environ.get("EDA_BATCH_WORKERS", os.cpu_count() or 1))
+# Plot types a spec can name. Seaborn's names draw seaborn's plot, through the app's engines only where the figure
+# comes out the same (cached box and letter-value summaries) or where the app's page guards it the same way by
+# default (the swarm point budget, line pre-aggregation with batched bootstrap and downsampling); the engines that
+# approximate seaborn's figure are available under their own names
+BATCH_PLOTS = {
+    "scatterplot": sns.scatterplot, "lineplot": aggregated_lineplot, "relplot": sns.relplot,
+    "histplot": sns.histplot, "kdeplot": sns.kdeplot, "ecdfplot": sns.ecdfplot, "rugplot": sns.rugplot, "displot": sns.displot,
+    "stripplot": sns.stripplot, "swarmplot": budget_swarmplot, "boxplot": summary_boxplot, "violinplot": sns.violinplot,
+    "boxenplot": summary_boxenplot, "pointplot": sns.pointplot, "barplot": sns.barplot, "countplot": sns.countplot, "catplot": sns.catplot,
+    "regplot": sns.regplot, "residplot": sns.residplot, "lmplot": sns.lmplot,
+    "heatmap": sns.heatmap, "clustermap": linked_clustermap,
+    "rasterized_scatterplot": rasterized_scatterplot, "rasterized_relplot": rasterized_relplot,
+    "binned_kdeplot": binned_kdeplot, "binned_displot": binned_displot,
+    "summary_violinplot": summary_violinplot, "summary_catplot": summary_catplot, "fast_catplot": fast_catplot,
+    "analytic_regplot": analytic_regplot, "analytic_lmplot": analytic_lmplot, "grouped_lmplot": grouped_lmplot,
+    "lowess_regplot": lowess_regplot, "lowess_residplot": lowess_residplot,
+}
+MATRIX_PLOTS = {"heatmap", "clustermap"}
+# Spec keys that choose the plot, its output and its data; every other key is passed to the plot function
+SPEC_KEYS = {"plot", "name", "format", "columns", "correlation", "matrix", "representatives"}
+
+# Dataset of this process, set once per worker so specs never carry it
+_dataset = None
+
+# A dataset file held in memory with the content type LOAD's readers dispatch on, like an upload
+class DatasetFile(io.BytesIO):
+    def __init__(self, path):
+        with open(path, "rb") as handle:
+            super().__init__(handle.read())
+        self.type = EXCEL_TYPES[0] if path.lower().endswith((".xlsx", ".xls")) else "text/csv"
+
+# Read a CSV or Excel file from disk as an upload is read (sampled encoding detection, with a full scan when decoding
+# fails), under the same disk cache key, so the app and the batch renderer parse a file only once between them
+def read_dataset(path, engine="auto", compact=False):
+    file = DatasetFile(path)
+    engine = resolve_engine(engine, file.getbuffer().nbytes)
+    key = content_hash(content_hash(file.getbuffer()).encode("ascii"), file_type=file.type, compact=compact, engine=engine, usecols=None)
+    df = DISK_CACHE.get(key)
+    if df is None:
+        df = read_upload(file, engine)
+        if df is None:
+            raise ValueError(f"{os.path.basename(path)} could not be parsed")
+        if compact:
+            df, report = compact_dtypes(df)
+            DISK_CACHE.put(key + "-compaction", report)
+        DISK_CACHE.put(key, df)
+    return stamp_fingerprint(df, key)
+
+# Read the list of plot specs from a JSON or (with PyYAML installed) YAML file
+def load_specs(path):
+    with open(path, encoding="utf-8") as handle:
+        text = handle.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ValueError("reading YAML specs needs PyYAML (pip install pyyaml); write the specs as JSON instead")
+        specs = yaml.safe_load(text)
+    else:
+        specs = json.loads(text)
+    if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+        raise ValueError("the spec file must hold a list of plot specs")
+    return specs
+
+# Problems with the specs that would only surface once the workers ran them
+def spec_errors(specs, fmt):
+    errors, names = [], set()
+    for index, spec in enumerate(specs):
+        if spec.get("plot") not in BATCH_PLOTS:
+            errors.append(f"spec {index}: unknown plot {spec.get('plot')!r}")
+        if spec.get("format", fmt) not in BATCH_FORMATS:
+            errors.append(f"spec {index}: format must be one of {', '.join(BATCH_FORMATS)}")
+        name = spec_name(index, spec)
+        if name in names:
+            errors.append(f"spec {index}: the output name {name!r} is used twice")
+        names.add(name)
+    return errors
+
+def spec_name(index, spec):
+    return str(spec.get("name", f"{index:03d}-{spec.get('plot')}"))
+
+# Frame a spec's plot draws from: a correlation or binned matrix (as the heatmap page builds them), the spec's columns,
+# or the whole dataset; matrix plots default to the numeric columns and clustermaps of many rows to representative rows
+def spec_data(dataset, spec, params):
+    plot = spec["plot"]
+    columns = spec.get("columns") or (list(dataset.select_dtypes(include=["number"]).columns) if plot in MATRIX_PLOTS else None)
+    if "correlation" in spec:
+        return correlation_matrix(project(dataset, columns), method=spec["correlation"])[0]
+    if "matrix" in spec:
+        matrix = spec["matrix"]
+        return binned_matrix(project(dataset, matrix["x"], matrix["y"], matrix.get("value")), **matrix)
+    data = project(dataset, columns) if columns else dataset
+    representatives = spec.get("representatives", CLUSTER_SAMPLE if len(data) > CLUSTER_ROWS else None)
+    if plot == "clustermap" and representatives:
+        # Representatives are normalized before they are averaged, so seaborn must not normalize again
+        data = representative_rows(data, int(representatives), params.get("metric", "euclidean"), params.pop("z_score", None), params.pop("standard_scale", None))
+    return data
+
+# Draw one spec from this process's dataset and write it, timing each stage
+def render_spec(index, spec, output, fmt, dpi):
+    name, fmt = spec_name(index, spec), spec.get("format", fmt)
+    entry = {"name": name, "plot": spec.get("plot"), "file": os.path.join(output, f"{name}.{fmt}"), "format": fmt}
+    started = time.perf_counter()
+    try:
+        params = {key: value for key, value in spec.items() if key not in SPEC_KEYS}
+        data = spec_data(_dataset, spec, params)
+        prepared = time.perf_counter()
+        plot = BATCH_PLOTS[spec["plot"]]
+        fig = draw_plot(plot, data, params.pop("figsize", None), **params)
+        drawn = time.perf_counter()
+        rendered = encode_figure(fig, fmt, dpi)
+        os.makedirs(os.path.dirname(entry["file"]) or ".", exist_ok=True)
+        with open(entry["file"], "wb") as handle:
+            handle.write(rendered.data)
+        finished = time.perf_counter()
+        entry.update(status="ok", bytes=rendered.nbytes, prepare_seconds=prepared - started, draw_seconds=drawn - prepared, encode_seconds=finished - drawn)
+    except Exception as e:
+        entry.update(status="error", error=str(e))
+    entry["seconds"] = time.perf_counter() - started
+    return entry
+
+def set_dataset(dataset):
+    global _dataset
+    _dataset = dataset
+
+# Render every spec on a spawned process pool that receives the dataset once per worker (inline for one worker),
+# reporting each plot as it finishes
+def render_specs(dataset, specs, output, fmt, dpi, workers):
+    entries = [None] * len(specs)
+    workers = max(1, min(workers, len(specs)))
+    if workers == 1:
+        set_dataset(dataset)
+        for index, spec in enumerate(specs):
+            entries[index] = report(render_spec(index, spec, output, fmt, dpi))
+        return entries, workers
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=set_dataset, initargs=(dataset,)) as pool:
+        futures = {pool.submit(render_spec, index, spec, output, fmt, dpi): index for index, spec in enumerate(specs)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                entries[index] = report(future.result())
+            except BrokenProcessPool as e:
+                entries[index] = report({"name": spec_name(index, specs[index]), "plot": specs[index].get("plot"), "status": "error", "error": f"the worker process failed ({e})", "seconds": 0.0})
+    return entries, workers
+
+def report(entry):
+    detail = f"{entry['seconds']:.2f} s" if entry["status"] == "ok" else f"failed: {entry['error']}"
+    print(f"{entry['name']} ({entry['plot']}): {detail}", file=sys.stderr)
+    return entry
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a list of plot specs for one dataset without the Streamlit app")
+    parser.add_argument("dataset", help="CSV or Excel file")
+    parser.add_argument("specs", help="JSON or YAML list of plot specs, each naming a plot type and its parameters")
+    parser.add_argument("-o", "--output", default="plots", help="directory for the images and manifest.json")
+    parser.add_argument("-f", "--format", default=PLOT_FORMAT, choices=BATCH_FORMATS, help="image format for specs that do not set one")
+    parser.add_argument("--dpi", type=int, default=PLOT_DPI, help="resolution of raster images")
+    parser.add_argument("-j", "--workers", type=int, default=BATCH_WORKERS, help="processes drawing plots in parallel")
+    parser.add_argument("--engine", default="auto", choices=CSV_ENGINES, help="CSV parse engine")
+    parser.add_argument("--compact", action="store_true", help="store low-cardinality text as categories and downcast numbers")
+    args = parser.parse_args(argv)
+    try:
+        specs = load_specs(args.specs)
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot read {args.specs}: {e}")
+    errors = spec_errors(specs, args.format)
+    if errors:
+        parser.error("\n".join(errors))
+    started = time.perf_counter()
+    try:
+        dataset = read_dataset(args.dataset, args.engine, args.compact)
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot read {args.dataset}: {e}")
+    loaded = time.perf_counter()
+    print(f"Loaded {len(dataset):,} rows x {dataset.shape[1]} columns in {loaded - started:.2f} s", file=sys.stderr)
+    os.makedirs(args.output, exist_ok=True)
+    entries, workers = render_specs(dataset, specs, args.output, args.format, args.dpi, args.workers)
+    manifest = {
+        "dataset": os.path.abspath(args.dataset), "rows": len(dataset), "columns": dataset.shape[1], "load_seconds": loaded - started,
+        "workers": workers, "format": args.format, "dpi": args.dpi, "seconds": time.perf_counter() - started, "plots": entries,
+    }
+    with open(os.path.join(args.output, "manifest.json"), "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2)
+    failed = sum(entry["status"] != "ok" for entry in entries)
+    print(f"Rendered {len(entries) - failed} of {len(entries)} plots in {manifest['seconds']:.2f} s on {workers} processes", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import pandas as pd
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Read a cache size limit (in megabytes) from the environment
+def env_megabytes(name, default):
+    try:
+        return int(float(os.environ.get(name, default)) * 1024 * 1024)
+    except ValueError:
+        return int(default * 1024 * 1024)
+
+# Estimate how much memory a cached value holds
+def estimate_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+# Hash raw bytes together with the options used to interpret them
+def content_hash(raw, **options):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(memoryview(raw))
+    digest.update(json.dumps(options, sort_keys=True, default=repr).encode("utf-8"))
+    return digest.hexdigest()
+
+# Record which loaded dataset (or projection of one) a frame holds, so it never needs rehashing
+def stamp_fingerprint(df, fingerprint):
+    df.attrs["fingerprint"] = fingerprint
+    df.attrs["shape"] = df.shape
+    df.attrs["columns"] = list(df.columns)
+    return df
+
+# Fingerprint stamped on a frame; pandas copies attrs onto derived frames, so the stamp must still match
+def stamped_fingerprint(df):
+    attrs = getattr(df, "attrs", {})
+    if attrs.get("fingerprint") and attrs.get("shape") == df.shape and attrs.get("columns") == list(df.columns):
+        return attrs["fingerprint"]
+    return None
+
+# Fingerprint any frame, hashing its contents when no valid stamp is present
+def frame_fingerprint(df):
+    fingerprint = stamped_fingerprint(df)
+    if fingerprint is not None:
+        return fingerprint
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    except TypeError:
+        return None  # Unhashable cells (lists, dicts) make the frame uncacheable
+    return content_hash(hashed, columns=[str(column) for column in df.columns], dtypes=[str(dtype) for dtype in df.dtypes])
+
+# Size-bounded least-recently-used cache shared by every Streamlit session
+class LRUCache:
+    def __init__(self, max_bytes, name="cache"):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, nbytes=None):
+        nbytes = estimate_bytes(value) if nbytes is None else nbytes
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            # Values larger than the whole budget are returned but never stored
+            if nbytes > self.max_bytes:
+                return value
+            self._items[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self._items:
+                _, (_, evicted_bytes) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute, nbytes=None):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute(), nbytes)
+        return value
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.current_bytes > self.max_bytes and self._items:
+                _, (_, evicted_bytes) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+# Arrow IPC (Feather v2) files on local disk, reloaded through a memory map instead of re-parsing
+class DiskCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return feather is not None
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.arrow")
+
+    def get(self, key):
+        path = self._path(key)
+        if not self.available or not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            # Uncompressed IPC buffers are mapped, so fixed-width columns are not copied into memory
+            table = feather.read_table(path, memory_map=True)
+            df = table.to_pandas(split_blocks=True)
+        except Exception:
+            self.misses += 1
+            return None
+        os.utime(path)  # Mark as recently used for eviction
+        self.hits += 1
+        return df
+
+    def put(self, key, df):
+        if not self.available:
+            return False
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            feather.write_feather(df, temp_path, compression="uncompressed")
+            os.replace(temp_path, path)
+        except Exception:
+            # Frames Arrow cannot represent (e.g. mixed-type object columns) are simply not cached
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".arrow"):
+                stat = os.stat(os.path.join(self.root, name))
+                entries.append({"key": name[:-len(".arrow")], "bytes": stat.st_size, "last used": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stat.st_mtime)), "mtime": stat.st_mtime})
+        return sorted(entries, key=lambda entry: entry["mtime"], reverse=True)
+
+    # Remove least recently used files until the cache fits its disk budget
+    def evict(self):
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry["bytes"] for entry in entries)
+            for entry in reversed(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._path(entry["key"]))
+                except FileNotFoundError:
+                    pass
+                total -= entry["bytes"]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for entry in self.entries():
+                try:
+                    os.remove(self._path(entry["key"]))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        entries = self.entries()
+        return {"entries": len(entries), "bytes": sum(entry["bytes"] for entry in entries), "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -1,7 +1,20 @@
 import streamlit as st
 import seaborn as sns
-import matplotlib.pyplot as plt
 import pandas as pd
+from LOAD import project
+from RENDER import new_figure, render_plot, store_plot, show_stored_plot
+from STATS import bootstrap_errorbar
+from DENSITY import BINNED_KDE_ROWS, kde_accuracy_caption
+from SUMMARY import summary_boxenplot, summary_boxplot, summary_catplot, summary_violinplot
+from FACET import FACET_ROWS, FACET_WORKERS, facet_caption, parallel_facets, reset_facet_stats
+from SWARM import SWARM_FALLBACKS, SWARM_POINTS, budget_swarmplot, fast_catplot, largest_swarm, layout_stats, reset_layout_stats
+
+# Function to split a categorical plot's variables into the estimated (numeric) axis and its grouping columns
+def numeric_axis(data, x_var, y_var, *groups):
+    if y_var is not None and pd.api.types.is_numeric_dtype(data[x_var]) and not pd.api.types.is_numeric_dtype(data[y_var]):
+        return x_var, [y_var, *groups]
+    # Otherwise seaborn estimates along y and treats x as the categories
+    return y_var, [x_var, *groups]
 
 def show_catplot(dataset):
     st.title("Seaborn Catplot Customizer")
@@ -32,8 +45,9 @@ def show_catplot(dataset):
                 row_var = st.selectbox("Row faceting variable", options=[None] + list(dataset.columns), index=0, help="Variable for row facets")
                 col_var = st.selectbox("Column faceting variable", options=[None] + list(dataset.columns), index=0, help="Variable for column facets")
                 col_wrap = st.number_input("Columns per row", min_value=1, value=3, help="Wrap column facets") if col_var else None
+                parallel = st.checkbox("Parallel facets", len(dataset) >= FACET_ROWS and FACET_WORKERS > 1, help=f"Draw and rasterize each facet in one of {FACET_WORKERS} worker processes, then composite the panels")
             else:
-                row_var, col_var, col_wrap = None, None, None
+                row_var, col_var, col_wrap, parallel = None, None, None, False
                 
             # Estimation parameters
             if kind in ["point", "bar"]:
@@ -43,8 +57,9 @@ def show_catplot(dataset):
                     errorbar_level = st.slider("Confidence level", 1, 99, 95)
                     errorbar = (errorbar, errorbar_level)
                 n_boot = st.number_input("Bootstrap samples", min_value=1, value=1000, help="Number of bootstrap samples")
+                seed = st.number_input("Bootstrap seed", min_value=0, value=0, help="Seed for bootstrap resampling; a fixed seed makes error bars reproducible and cacheable")
             else:
-                estimator, errorbar, n_boot = None, None, None
+                estimator, errorbar, n_boot, seed = None, None, None, None
                 
             # Additional parameters
             height = st.number_input("Facet height", min_value=1.0, value=5.0, step=0.5, help="Height in inches")
@@ -56,18 +71,18 @@ def show_catplot(dataset):
             if plot_button:
                 st.subheader("Generated Catplot")
                 try:
-                    g = sns.catplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,row=row_var if use_facets and row_var else None,col=col_var if use_facets and col_var else None,col_wrap=col_wrap if use_facets and col_var and col_wrap else None,kind=kind,estimator=estimator if kind in ["point", "bar"] else None,errorbar=errorbar if kind in ["point", "bar"] else None,n_boot=n_boot if kind in ["point", "bar"] else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,height=height,aspect=aspect,color=color)
-                    st.pyplot(g.fig)
-                    st.session_state['last_catplot'] = g.fig
+                    data = project(dataset, x_var, y_var, hue_var, row_var, col_var)
+                    catplot = summary_catplot if kind in ["box", "boxen", "violin"] else fast_catplot if kind == "swarm" else sns.catplot
+                    reset_facet_stats()
+                    render_plot('last_catplot', parallel_facets(catplot) if parallel else catplot, data=data,x=x_var,y=y_var,hue=hue_var if use_hue else None,row=row_var if use_facets and row_var else None,col=col_var if use_facets and col_var else None,col_wrap=col_wrap if use_facets and col_var and col_wrap else None,kind=kind,estimator=estimator if kind in ["point", "bar"] else None,errorbar=bootstrap_errorbar(data, *numeric_axis(data, x_var, y_var, hue_var, row_var, col_var), estimator, errorbar, n_boot, seed) if kind in ["point", "bar"] else None,n_boot=n_boot if kind in ["point", "bar"] else None,seed=seed,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,height=height,aspect=aspect,color=color)
+                    if parallel:
+                        st.caption(facet_caption())
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
                     
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_catplot' in st.session_state:
-            st.pyplot(st.session_state['last_catplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_catplot')
           
 def show_stripplot(dataset):
     st.title("Seaborn Stripplot Customizer")
@@ -103,18 +118,12 @@ def show_stripplot(dataset):
             if plot_button:
                 st.subheader("Generated Stripplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.stripplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,jitter=jitter,dodge=dodge,size=size,linewidth=linewidth,edgecolor=edgecolor,log_scale=log_scale,color=color,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_stripplot'] = fig
+                    render_plot('last_stripplot', sns.stripplot, data=project(dataset, x_var, y_var, hue_var),x=x_var,y=y_var,hue=hue_var if use_hue else None,jitter=jitter,dodge=dodge,size=size,linewidth=linewidth,edgecolor=edgecolor,log_scale=log_scale,color=color,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None)
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_stripplot' in st.session_state:
-            st.pyplot(st.session_state['last_stripplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_stripplot')
 def show_swarmplot(dataset):
     st.title("Seaborn Swarmplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -140,6 +149,8 @@ def show_swarmplot(dataset):
             size = st.slider("Marker size", 1, 20, 5, help="Radius of markers in points")
             linewidth = st.slider("Edge line width", 0, 5, 0, help="Width of lines around points")
             edgecolor = st.color_picker("Edge color", value="#00FFAA", help="Color of lines around points")
+            point_budget = st.number_input("Point budget per swarm", min_value=100, value=SWARM_POINTS, step=100, help="Largest swarm laid out point by point; bigger ones are drawn as a strip instead")
+            fallback = st.selectbox("Above budget", options=SWARM_FALLBACKS, index=0, help="density: jitter scaled by each group's density; strip: uniform jitter")
             # Additional parameters
             log_scale = st.checkbox("Log scale", False, help="Use logarithmic axis scaling")
             color = st.color_picker("Base color", value="#1f77b4", help="Color when hue is not used")
@@ -148,18 +159,21 @@ def show_swarmplot(dataset):
             if plot_button:
                 st.subheader("Generated Swarmplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.swarmplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,dodge=dodge,size=size,linewidth=linewidth,edgecolor=edgecolor,log_scale=log_scale,color=color,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_swarmplot'] = fig
+                    plot_data = project(dataset, x_var, y_var, hue_var)
+                    _, groups = numeric_axis(plot_data, x_var, y_var)
+                    largest = largest_swarm(plot_data, groups[0], hue_var if use_hue else None, dodge)
+                    reset_layout_stats()
+                    render_plot('last_swarmplot', budget_swarmplot, data=plot_data,x=x_var,y=y_var,hue=hue_var if use_hue else None,dodge=dodge,point_budget=point_budget,fallback=fallback,size=size,linewidth=linewidth,edgecolor=edgecolor,log_scale=log_scale,color=color,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None)
+                    if largest > point_budget:
+                        st.caption(f"The largest swarm has {largest:,} points, over the budget of {point_budget:,}; drawn as a {fallback} strip instead")
+                    else:
+                        seconds, points = layout_stats()
+                        st.caption(f"Swarm layout: {seconds:.2f} s for {len(plot_data):,} points (largest swarm {largest:,})" if points else "Swarm layout reused from the render cache")
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_swarmplot' in st.session_state:
-            st.pyplot(st.session_state['last_swarmplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_swarmplot')
 def show_boxplot(dataset):
     st.title("Seaborn Boxplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -189,6 +203,7 @@ def show_boxplot(dataset):
             whis = st.slider("Whisker length", 0.0, 5.0, 1.5, help="IQR multiplier for whiskers")
             linewidth = st.slider("Line width", 0.0, 5.0, None, help="Width of box outlines")
             fliersize = st.slider("Outlier size", 0.0, 10.0, None, help="Size of outlier markers")
+            summarize = st.checkbox("Cached group summaries", True, help="Read quartiles, whiskers and outliers from per-group summaries shared by the box, boxen and violin plots of this dataset; untick to let seaborn compute them")
             # Additional parameters
             log_scale = st.checkbox("Log scale", False, help="Use logarithmic axis scaling")
             color = st.color_picker("Base color", value="#1f77b4", help="Color when hue is not used")
@@ -197,18 +212,12 @@ def show_boxplot(dataset):
             if plot_button:
                 st.subheader("Generated Boxplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.boxplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,saturation=saturation,fill=fill,dodge=dodge if use_hue else None,width=width,gap=gap,whis=whis,linewidth=linewidth,fliersize=fliersize,log_scale=log_scale,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_boxplot'] = fig
+                    render_plot('last_boxplot', summary_boxplot if summarize else sns.boxplot, data=project(dataset, x_var, y_var, hue_var),x=x_var,y=y_var,hue=hue_var if use_hue else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,saturation=saturation,fill=fill,dodge=dodge if use_hue else None,width=width,gap=gap,whis=whis,linewidth=linewidth,fliersize=fliersize,log_scale=log_scale,color=color)
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_boxplot' in st.session_state:
-            st.pyplot(st.session_state['last_boxplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_boxplot')
 def show_violinplot(dataset):
     st.title("Seaborn Violinplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -242,6 +251,7 @@ def show_violinplot(dataset):
             gridsize = st.number_input("Grid size", min_value=10, value=100, help="Points in KDE evaluation grid")
             bw_method = st.selectbox("Bandwidth method", options=["scott", "silverman"], index=0, help="Method for KDE bandwidth")
             bw_adjust = st.slider("Bandwidth adjust", 0.1, 5.0, 1.0, help="Adjust KDE smoothing")
+            binned = st.checkbox("Binned FFT KDE", len(dataset) >= BINNED_KDE_ROWS, help="Bin the data onto the evaluation grid and convolve with the kernel by FFT instead of evaluating every point")
             density_norm = st.selectbox("Density norm", ["area", "count", "width"], index=0, help="Method to normalize violin widths")
             common_norm = st.checkbox("Common norm", False, help="Normalize density across all violins")
             # Additional parameters
@@ -252,18 +262,15 @@ def show_violinplot(dataset):
             if plot_button:
                 st.subheader("Generated Violinplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.violinplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,saturation=saturation,fill=fill,inner=inner,split=split,width=width,dodge=dodge if use_hue else None,gap=gap,linewidth=linewidth,cut=cut,gridsize=gridsize,bw_method=bw_method,bw_adjust=bw_adjust,density_norm=density_norm,common_norm=common_norm,log_scale=log_scale,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_violinplot'] = fig
+                    plot_data = project(dataset, x_var, y_var, hue_var)
+                    render_plot('last_violinplot', summary_violinplot, data=plot_data,binned=binned,x=x_var,y=y_var,hue=hue_var if use_hue else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,saturation=saturation,fill=fill,inner=inner,split=split,width=width,dodge=dodge if use_hue else None,gap=gap,linewidth=linewidth,cut=cut,gridsize=gridsize,bw_method=bw_method,bw_adjust=bw_adjust,density_norm=density_norm,common_norm=common_norm,log_scale=log_scale,color=color)
+                    if binned:
+                        st.caption(kde_accuracy_caption(plot_data[numeric_axis(plot_data, x_var, y_var)[0]], bw_method=bw_method, bw_adjust=bw_adjust, gridsize=gridsize, cut=cut, log_scale=log_scale))
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_violinplot' in st.session_state:
-            st.pyplot(st.session_state['last_violinplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_violinplot')
 def show_pointplot(dataset):
     st.title("Seaborn Pointplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -291,6 +298,7 @@ def show_pointplot(dataset):
                 errorbar_level = st.slider("Confidence level", 1, 99, 95)
                 errorbar = (errorbar, errorbar_level)
             n_boot = st.number_input("Bootstrap samples", min_value=1, value=1000, help="Number of bootstrap samples")
+            seed = st.number_input("Bootstrap seed", min_value=0, value=0, help="Seed for bootstrap resampling; a fixed seed makes error bars reproducible and cacheable")
             dodge = st.checkbox("Dodge hue levels", False, help="Separate points for different hue levels") if use_hue else False
             capsize = st.slider("Error bar cap size", 0.0, 0.5, 0.0, help="Width of caps on error bars")
             # Additional parameters
@@ -301,18 +309,13 @@ def show_pointplot(dataset):
             if plot_button:
                 st.subheader("Generated Pointplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.pointplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,estimator=estimator,errorbar=errorbar,n_boot=n_boot,dodge=dodge if use_hue else None,capsize=capsize,log_scale=log_scale,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_pointplot'] = fig
+                    data = project(dataset, x_var, y_var, hue_var)
+                    render_plot('last_pointplot', sns.pointplot, data=data,x=x_var,y=y_var,hue=hue_var if use_hue else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,estimator=estimator,errorbar=bootstrap_errorbar(data, *numeric_axis(data, x_var, y_var, hue_var), estimator, errorbar, n_boot, seed),n_boot=n_boot,seed=seed,dodge=dodge if use_hue else None,capsize=capsize,log_scale=log_scale,color=color)
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_pointplot' in st.session_state:
-            st.pyplot(st.session_state['last_pointplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_pointplot')
 def show_boxenplot(dataset):
     st.title("Seaborn Boxenplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -353,6 +356,7 @@ def show_boxenplot(dataset):
             showfliers = st.checkbox("Show outliers", True,help="Display outlier points")
             outlier_prop = st.slider("Outlier proportion", 0.001, 0.1, 0.007,help="Expected proportion of outliers (for k_depth='proportion')")
             trust_alpha = st.slider("Trust alpha", 0.01, 0.5, 0.05,help="Confidence threshold (for k_depth='trustworthy')")
+            summarize = st.checkbox("Cached group summaries", True, help="Read letter values from per-group summaries shared by the box, boxen and violin plots of this dataset; untick to let seaborn compute them")
             # Scale parameters
             log_scale = st.checkbox("Log scale", False,help="Use logarithmic axis scaling")
             native_scale = st.checkbox("Native scale", False,help="Maintain original scaling of numeric/datetime categories")
@@ -363,18 +367,13 @@ def show_boxenplot(dataset):
             if plot_button:
                 st.subheader("Generated Boxenplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.boxenplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,order=order if order else None,hue_order=hue_order if use_hue and hue_order else None,orient=orient,color=color,palette=palette if use_hue else None,saturation=saturation if use_hue else None,fill=fill,dodge=dodge if use_hue else None,width=width,gap=gap,linewidth=linewidth,linecolor=linecolor,width_method=width_method,k_depth=k_depth,outlier_prop=outlier_prop,trust_alpha=trust_alpha,showfliers=showfliers,hue_norm=hue_norm if use_hue and hue_norm else None,log_scale=log_scale,native_scale=native_scale,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_boxenplot'] = fig
+                    # Without hue, saturation holds seaborn's default (0.75): boxenplot cannot take None
+                    render_plot('last_boxenplot', summary_boxenplot if summarize else sns.boxenplot, data=project(dataset, x_var, y_var, hue_var),x=x_var,y=y_var,hue=hue_var if use_hue else None,order=order if order else None,hue_order=hue_order if use_hue and hue_order else None,orient=orient,color=color,palette=palette if use_hue else None,saturation=saturation,fill=fill,dodge=dodge if use_hue else None,width=width,gap=gap,linewidth=linewidth,linecolor=linecolor,width_method=width_method,k_depth=k_depth,outlier_prop=outlier_prop,trust_alpha=trust_alpha,showfliers=showfliers,hue_norm=hue_norm if use_hue and hue_norm else None,log_scale=log_scale,native_scale=native_scale)
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")    
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_boxenplot' in st.session_state:
-            st.pyplot(st.session_state['last_boxenplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_boxenplot')
 def show_countplot(dataset):
     st.title("Seaborn Countplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -408,15 +407,50 @@ def show_countplot(dataset):
             if plot_button:
                 st.subheader("Generated Countplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.countplot(data=dataset,x=x_var if orient in ["v","x"] else None,y=y_var if orient in ["h","y"] else None,hue=hue_var if use_hue else None,order=order if order else None,hue_order=hue_order if use_hue and hue_order else None,orient=orient,color=color,palette=palette if use_hue else None,saturation=saturation,fill=fill,hue_norm=hue_norm if use_hue and hue_norm else None,stat=stat,width=width,dodge=dodge if use_hue else None,log_scale=log_scale,native_scale=native_scale,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_countplot'] = fig
+                    render_plot('last_countplot', sns.countplot, data=project(dataset, x_var if orient in ["v","x"] else None, y_var if orient in ["h","y"] else None, hue_var),x=x_var if orient in ["v","x"] else None,y=y_var if orient in ["h","y"] else None,hue=hue_var if use_hue else None,order=order if order else None,hue_order=hue_order if use_hue and hue_order else None,orient=orient,color=color,palette=palette if use_hue else None,saturation=saturation,fill=fill,hue_norm=hue_norm if use_hue and hue_norm else None,stat=stat,width=width,dodge=dodge if use_hue else None,log_scale=log_scale,native_scale=native_scale)
+                except Exception as e:
+                    st.error(f"Error generating plot: {str(e)}")
+    with tab2:
+        st.subheader("Previously Generated Plot")
+        show_stored_plot('last_countplot')
+def show_streamed_countplot(profile):
+    st.title("Streamed Countplot")
+    tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
+    with tab1:
+        col1, col2 = st.columns([1, 1], border=True)
+        with col1:
+            st.subheader("Plot Parameters")
+            x_var = st.selectbox("X-axis variable", options=list(profile.columns), index=0, help="Column whose value counts were aggregated while streaming")
+            top_n = st.number_input("Top categories", min_value=1, value=20, help="Number of most frequent levels to draw")
+            orient = st.selectbox("Orientation", options=["v", "h"], index=0, help="Plot orientation (v: vertical, h: horizontal)")
+            stat = st.selectbox("Statistic", options=["count", "percent", "proportion"], index=0, help="Statistic to compute")
+            color = st.color_picker("Base color", value="#1f77b4", help="Color of the bars")
+            plot_button = st.button("Generate Plot", use_container_width=True, type='primary')
+        with col2:
+            if plot_button:
+                st.subheader("Generated Countplot")
+                try:
+                    column = profile.columns[x_var]
+                    counts = column.value_counts.most_common(int(top_n))
+                    heights = counts.to_numpy(dtype=float)
+                    if stat == "percent":
+                        heights = 100 * heights / column.count
+                    elif stat == "proportion":
+                        heights = heights / column.count
+                    labels = [str(level) for level in counts.index]
+                    fig, ax = new_figure()
+                    if orient == "v":
+                        ax.bar(labels, heights, color=color)
+                        ax.set(xlabel=x_var, ylabel=stat)
+                        ax.tick_params(axis="x", labelrotation=90)
+                    else:
+                        ax.barh(labels[::-1], heights[::-1], color=color)
+                        ax.set(xlabel=stat, ylabel=x_var)
+                    store_plot('last_streamed_countplot', fig)
+                    if column.value_counts.truncated:
+                        st.caption(f"Only the {column.value_counts.capacity} most frequent levels were tracked; counts are approximate")
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_countplot' in st.session_state:
-            st.pyplot(st.session_state['last_countplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_streamed_countplot')
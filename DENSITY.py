@@ -0,0 +1,401 @@
+import functools
+import math
+import os
+import threading
+import numpy as np
+import pandas as pd
+import seaborn.categorical
+import seaborn.distributions
+from scipy.signal import fftconvolve
+from scipy.stats import gaussian_kde
+from seaborn._stats.density import KDE as DensityKDE
+from seaborn._statistics import KDE as DistributionKDE
+from CACHE import LRUCache, content_hash, env_megabytes, frame_fingerprint, stamp_fingerprint
+from PATCH import patched
+from STATS import QuantileSketch
+
+# Per-bin counts shared by every session, so restyling a histogram never rescans the rows
+HISTOGRAM_CACHE = LRUCache(env_megabytes("EDA_HISTOGRAM_CACHE_MB", 64), "histogram")
+# Sketched ECDF points shared by every session
+ECDF_CACHE = LRUCache(env_megabytes("EDA_ECDF_CACHE_MB", 32), "ecdf")
+# Row count from which the ECDF plots default to quantile sketches
+SKETCH_ECDF_ROWS = int(os.environ.get("EDA_SKETCH_ECDF_ROWS", 100000))
+# Rows fed to the sketches at a time, bounding the working memory of a pass
+ECDF_CHUNK_ROWS = 1_000_000
+# Row count from which the KDE plots default to the binned FFT estimator
+BINNED_KDE_ROWS = int(os.environ.get("EDA_BINNED_KDE_ROWS", 20000))
+# Fine grid points between two evaluation points are capped so a grid never exceeds this many cells per axis
+BINNED_KDE_POINTS = 1 << 16
+BINNED_KDE_POINTS_2D = 1024
+# Kernels are truncated this many bandwidths from their centre
+KERNEL_RADIUS = 5.0
+
+# Bin edges exactly as seaborn's histplot defines them
+def histogram_edges(values, bins="auto", binwidth=None, discrete=False):
+    values = values[np.isfinite(values)]
+    start, stop = values.min(), values.max()
+    if discrete:
+        return np.arange(start - .5, stop + 1.5)
+    if binwidth is not None:
+        edges = np.arange(start, stop + binwidth, binwidth)
+        # Seaborn's guard against roundoff leaving the maximum outside the last bin
+        if edges.max() < stop or len(edges) < 2:
+            edges = np.append(edges, edges.max() + binwidth)
+        # Seaborn hands numpy the bin count and range, which spaces the edges evenly between the ends
+        return np.linspace(edges.min(), edges.max(), len(edges))
+    return np.histogram_bin_edges(values, bins)
+
+# Counts per (group, bin) in one pass; bins are half-open except the last, as in np.histogram
+def bin_counts(values, edges, codes=None, n_codes=1):
+    inside = (values >= edges[0]) & (values <= edges[-1])
+    if codes is not None:
+        inside &= codes >= 0
+    n_bins = len(edges) - 1
+    index = np.searchsorted(edges, values[inside], side="right") - 1
+    index[index == n_bins] = n_bins - 1
+    if codes is not None:
+        index += codes[inside] * n_bins
+    return np.bincount(index, minlength=n_codes * n_bins).reshape(n_codes, n_bins)
+
+# Numeric axis values in the space seaborn bins them in (log10 for log scales)
+def histogram_axis(values, log_scale=False):
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    if log_scale:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.log10(values)
+    return values
+
+# One row per non-empty (group, bin) holding the bin centre and its count, plus the shared bin edges
+def bin_histogram(data, x, by=(), bins="auto", binwidth=None, discrete=False, log_scale=False):
+    by = [column for column in dict.fromkeys(by) if column is not None and column != x]
+    values = histogram_axis(data[x], log_scale)
+    edges = histogram_edges(values, bins, binwidth, discrete)
+    if by:
+        grouped = data.groupby(by, sort=False, observed=True, dropna=True)
+        codes = grouped.ngroup().to_numpy(dtype=float, na_value=-1).astype(np.int64)
+        keys = grouped.size().index.to_frame(index=False)
+        counts = bin_counts(values, edges, codes, len(keys))
+    else:
+        keys = pd.DataFrame(index=range(1))
+        counts = bin_counts(values, edges)
+    groups, positions = np.nonzero(counts)
+    centres = (edges[:-1] + edges[1:]) / 2
+    centres = 10 ** centres if log_scale else centres
+    weight = "count"
+    while weight in data.columns:
+        weight = f"_{weight}"
+    frame = keys.iloc[groups].reset_index(drop=True)
+    frame[x] = centres[positions]
+    frame[weight] = counts[groups, positions]
+    # A list, as seaborn compares `bins` against "auto" and cannot take an array there
+    return frame, weight, edges.tolist()
+
+# Cached bin_histogram, or None for histograms seaborn must bin from the raw rows:
+# bivariate or non-numeric axes, a KDE overlay (it would be fitted to the bin centres) and per-group bins
+def histogram_bins(data, x, y=None, by=(), bins="auto", binwidth=None, discrete=False, common_bins=True, kde=False, log_scale=False):
+    by = [column for column in dict.fromkeys(by) if column is not None and column != x]
+    if y is not None or kde or (by and not common_bins):
+        return None
+    if not pd.api.types.is_numeric_dtype(data[x]) or pd.api.types.is_bool_dtype(data[x]):
+        return None
+    if not np.isfinite(histogram_axis(data[x], log_scale)).any():
+        return None
+    def compute():
+        frame, weight, edges = bin_histogram(data, x, by, bins, binwidth, discrete, log_scale)
+        return stamp_fingerprint(frame, key) if key is not None else frame, weight, edges
+    fingerprint = frame_fingerprint(data)
+    key = None if fingerprint is None else content_hash(fingerprint.encode(), x=x, by=by, bins=bins, binwidth=binwidth, discrete=discrete, log_scale=log_scale)
+    if key is None:
+        return compute()
+    return HISTOGRAM_CACHE.get_or_compute(key, compute)
+
+# Per-group quantile sketches built in one pass over the rows, a chunk at a time
+def ecdf_sketches(values, codes=None, n_codes=1, k=200, chunk_rows=ECDF_CHUNK_ROWS):
+    sketches = [QuantileSketch(k) for _ in range(n_codes)]
+    for start in range(0, len(values), chunk_rows):
+        chunk = values[start:start + chunk_rows]
+        if codes is None:
+            sketches[0].update(chunk)
+            continue
+        chunk_codes = codes[start:start + chunk_rows]
+        order = np.argsort(chunk_codes, kind="stable")
+        bounds = np.searchsorted(chunk_codes[order], np.arange(n_codes + 1))
+        for group, sketch in enumerate(sketches):
+            if bounds[group + 1] > bounds[group]:
+                sketch.update(chunk[order[bounds[group]:bounds[group + 1]]])
+    return sketches
+
+# Retained sketch items with the number of observations each one stands for, a block of rows per group
+def sketch_rows(sketches, keys, x, weight="count"):
+    parts = []
+    for group, sketch in enumerate(sketches):
+        items, weights = sketch.weighted_items()
+        part = keys.iloc[np.full(len(items), group)].reset_index(drop=True)
+        part[x] = items
+        part[weight] = weights
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+# Sketch every group of `data` so seaborn can draw its ECDF from a few thousand weighted rows
+def sketch_groups(data, x, by=(), error=0.005, log_scale=False):
+    by = [column for column in dict.fromkeys(by) if column is not None and column != x]
+    values = pd.to_numeric(data[x], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    if log_scale:
+        values = np.where(values > 0, values, np.nan)  # Seaborn drops what a log axis cannot show
+    k = QuantileSketch.k_for_error(error)
+    if by:
+        grouped = data.groupby(by, sort=False, observed=True, dropna=True)
+        keys = grouped.size().index.to_frame(index=False)
+        codes = grouped.ngroup().to_numpy(dtype=float, na_value=-1).astype(np.int64)
+        sketches = ecdf_sketches(values, codes, len(keys), k)
+    else:
+        keys = pd.DataFrame(index=range(1))
+        sketches = ecdf_sketches(values, k=k)
+    weight = "count"
+    while weight in data.columns:
+        weight = f"_{weight}"
+    return sketch_rows(sketches, keys, x, weight), weight
+
+# Cached sketch_groups, or None for axes seaborn cannot treat as a plain numeric ECDF
+def sketch_ecdf(data, x, y=None, by=(), error=0.005, log_scale=False):
+    by = [column for column in dict.fromkeys(by) if column is not None and column != x]
+    if y is not None or not pd.api.types.is_numeric_dtype(data[x]) or pd.api.types.is_bool_dtype(data[x]):
+        return None
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return sketch_groups(data, x, by, error, log_scale)
+    key = content_hash(fingerprint.encode(), x=x, by=by, error=error, log_scale=log_scale)
+    def compute():
+        frame, weight = sketch_groups(data, x, by, error, log_scale)
+        return stamp_fingerprint(frame, key), weight
+    return ECDF_CACHE.get_or_compute(key, compute)
+
+# Weights and stat that make seaborn's per-group ECDF end at each group's share of all rows (common_norm)
+def common_norm_weights(data, weights, stat):
+    if stat == "count":
+        return data, stat
+    scale = (100 if stat == "percent" else 1) / data[weights].sum()
+    return data.assign(**{weights: data[weights] * scale}), "count"
+
+# ecdfplot that can also normalize every group by the pooled row count, which seaborn's ECDF cannot
+def sketch_ecdfplot(data=None, weights=None, stat="proportion", common_norm=False, ax=None, **kwargs):
+    if not common_norm:
+        return seaborn.distributions.ecdfplot(data=data, weights=weights, stat=stat, ax=ax, **kwargs)
+    data, drawn_stat = common_norm_weights(data, weights, stat)
+    ax = seaborn.distributions.ecdfplot(data=data, weights=weights, stat=drawn_stat, ax=ax, **kwargs)
+    ax.set_ylabel(stat.capitalize())
+    return ax
+
+# displot(kind="ecdf") counterpart of sketch_ecdfplot; facets share the pooled normalization too
+def sketch_displot(data=None, weights=None, stat="proportion", common_norm=False, **kwargs):
+    if not common_norm:
+        return seaborn.distributions.displot(data=data, weights=weights, stat=stat, **kwargs)
+    data, drawn_stat = common_norm_weights(data, weights, stat)
+    grid = seaborn.distributions.displot(data=data, weights=weights, stat=drawn_stat, **kwargs)
+    grid.set_ylabels(stat.capitalize())
+    return grid
+
+# scipy's gaussian_kde bandwidth factor for `neff` effective observations; None for callable methods
+def kde_factor(neff, dims=1, bw_method="scott"):
+    if bw_method is None or bw_method == "scott":
+        return neff ** (-1 / (dims + 4))
+    if bw_method == "silverman":
+        return (neff * (dims + 2) / 4) ** (-1 / (dims + 4))
+    if np.isscalar(bw_method) and not isinstance(bw_method, str):
+        return float(bw_method)
+    return None
+
+# Kernel covariance exactly as scipy's gaussian_kde derives it, scaled by seaborn's bw_adjust; None for callable methods
+def kde_covariance(data, weights=None, bw_method="scott", bw_adjust=1):
+    data = np.atleast_2d(data)
+    dims = data.shape[0]
+    if weights is None:
+        neff = data.shape[1]
+    else:
+        weights = np.asarray(weights, dtype=float)
+        neff = weights.sum() ** 2 / (weights ** 2).sum()
+    factor = kde_factor(neff, dims, bw_method)
+    if factor is None:
+        return None
+    covariance = np.atleast_2d(np.cov(data, aweights=weights, bias=False))
+    return covariance * (factor * bw_adjust) ** 2
+
+# Fine grid refining an evaluation grid so every `step`-th point is an evaluation point
+def fine_grid(grid, bandwidth, limit):
+    spacing = (grid[-1] - grid[0]) / max(len(grid) - 1, 1)
+    step = max(1, min(math.ceil(4 * spacing / bandwidth), (limit - 1) // max(len(grid) - 1, 1)))
+    delta = spacing / step
+    radius = math.ceil(KERNEL_RADIUS * bandwidth / delta)
+    return step, delta, radius
+
+# Spread each observation over its two neighbouring grid points in proportion to proximity
+def linear_binning(values, origin, delta, size, weights=None):
+    position = (values - origin) / delta
+    inside = (position >= 0) & (position <= size - 1)
+    position = position[inside]
+    weights = np.ones(len(position)) if weights is None else weights[inside]
+    left = np.minimum(np.floor(position).astype(np.int64), size - 2)
+    right_share = (position - left) * weights
+    return np.bincount(left, weights - right_share, minlength=size) + np.bincount(left + 1, right_share, minlength=size)
+
+def cumulative_trapezoid(values, delta, axis=0):
+    values = np.moveaxis(values, axis, 0)
+    areas = np.cumsum((values[1:] + values[:-1]) / 2 * delta, axis=0)
+    return np.moveaxis(np.concatenate([np.zeros_like(values[:1]), areas]), 0, axis)
+
+# Gaussian KDE of `values` on an evenly spaced grid: bin onto a fine grid, convolve with the kernel by FFT.
+# None when the bandwidth is degenerate or too wide for the grid, so callers fall back to the exact estimate
+def binned_kde_1d(values, grid, covariance, weights=None, cumulative=False):
+    values = np.asarray(values, dtype=float)
+    bandwidth = math.sqrt(float(np.squeeze(covariance)))
+    if not np.isfinite(bandwidth) or bandwidth <= 0 or len(grid) < 2 or grid[-1] <= grid[0]:
+        return None
+    step, delta, radius = fine_grid(grid, bandwidth, BINNED_KDE_POINTS)
+    size = (len(grid) - 1) * step + 1
+    if radius > 4 * size:
+        return None
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    # Padding by the kernel radius lets observations just outside the grid still contribute
+    counts = linear_binning(values, grid[0] - radius * delta, delta, size + 2 * radius, weights)
+    offsets = np.arange(-radius, radius + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * math.sqrt(2 * math.pi))
+    total = len(values) if weights is None else weights.sum()
+    density = np.clip(fftconvolve(counts, kernel, mode="same")[radius:radius + size], 0, None) / total
+    if cumulative:
+        density = cumulative_trapezoid(density, delta)
+    return density[::step]
+
+# Bivariate version on a (grid1 x grid2) grid with the full kernel covariance; indexed [grid1, grid2]
+def binned_kde_2d(values1, values2, grid1, grid2, covariance, weights=None, cumulative=False):
+    values1, values2 = np.asarray(values1, dtype=float), np.asarray(values2, dtype=float)
+    bandwidths = np.sqrt(np.diag(covariance))
+    if not np.all(np.isfinite(bandwidths)) or np.any(bandwidths <= 0) or np.linalg.det(covariance) <= 0:
+        return None
+    if min(len(grid1), len(grid2)) < 2 or grid1[-1] <= grid1[0] or grid2[-1] <= grid2[0]:
+        return None
+    (step1, delta1, radius1), (step2, delta2, radius2) = fine_grid(grid1, bandwidths[0], BINNED_KDE_POINTS_2D), fine_grid(grid2, bandwidths[1], BINNED_KDE_POINTS_2D)
+    size1, size2 = (len(grid1) - 1) * step1 + 1, (len(grid2) - 1) * step2 + 1
+    if radius1 > 4 * size1 or radius2 > 4 * size2:
+        return None
+    shape = (size1 + 2 * radius1, size2 + 2 * radius2)
+    position1 = (values1 - (grid1[0] - radius1 * delta1)) / delta1
+    position2 = (values2 - (grid2[0] - radius2 * delta2)) / delta2
+    inside = (position1 >= 0) & (position1 <= shape[0] - 1) & (position2 >= 0) & (position2 <= shape[1] - 1)
+    position1, position2 = position1[inside], position2[inside]
+    weights = np.ones(len(values1)) if weights is None else np.asarray(weights, dtype=float)
+    total = weights.sum()
+    weights = weights[inside]
+    left1 = np.minimum(np.floor(position1).astype(np.int64), shape[0] - 2)
+    left2 = np.minimum(np.floor(position2).astype(np.int64), shape[1] - 2)
+    share1, share2 = position1 - left1, position2 - left2
+    counts = np.zeros(shape[0] * shape[1])
+    for shift1, part1 in ((0, 1 - share1), (1, share1)):
+        for shift2, part2 in ((0, 1 - share2), (1, share2)):
+            counts += np.bincount((left1 + shift1) * shape[1] + left2 + shift2, weights * part1 * part2, minlength=counts.size)
+    offsets1 = np.arange(-radius1, radius1 + 1) * delta1
+    offsets2 = np.arange(-radius2, radius2 + 1) * delta2
+    inverse = np.linalg.inv(covariance)
+    u, v = np.meshgrid(offsets1, offsets2, indexing="ij")
+    exponent = inverse[0, 0] * u * u + 2 * inverse[0, 1] * u * v + inverse[1, 1] * v * v
+    kernel = np.exp(-0.5 * exponent) / (2 * math.pi * math.sqrt(np.linalg.det(covariance)))
+    density = fftconvolve(counts.reshape(shape), kernel, mode="same")[radius1:radius1 + size1, radius2:radius2 + size2]
+    density = np.clip(density, 0, None) / total
+    if cumulative:
+        density = cumulative_trapezoid(cumulative_trapezoid(density, delta1, axis=0), delta2, axis=1)
+    return density[::step1, ::step2]
+
+# Evaluation grid seaborn would use: the data range extended by `cut` bandwidths
+def kde_support(values, bandwidth, cut, gridsize):
+    return np.linspace(values.min() - bandwidth * cut, values.max() + bandwidth * cut, gridsize)
+
+# Worst and mean deviation of the binned estimate from scipy's exact KDE on a sample, relative to the peak density
+def kde_accuracy(x, y=None, bw_method="scott", bw_adjust=1, gridsize=200, cut=3, log_scale=False, sample=2000, seed=0):
+    columns = [histogram_axis(x, log_scale)] + ([] if y is None else [histogram_axis(y, log_scale)])
+    values = np.vstack(columns)
+    values = values[:, np.all(np.isfinite(values), axis=0)]
+    if values.shape[1] > sample:
+        values = values[:, np.random.default_rng(seed).choice(values.shape[1], sample, replace=False)]
+    covariance = kde_covariance(values, None, bw_method, bw_adjust)
+    if values.shape[1] < 2 or covariance is None:
+        return None
+    bandwidths = np.sqrt(np.diag(covariance))
+    exact = gaussian_kde(values, bw_method=bw_method)
+    exact.set_bandwidth(exact.factor * bw_adjust)
+    if y is None:
+        grid = kde_support(values[0], bandwidths[0], cut, gridsize)
+        binned, truth = binned_kde_1d(values[0], grid, covariance), exact(grid)
+    else:
+        # The exact bivariate estimate costs n * gridsize**2 kernel evaluations, so it is checked on a coarser grid
+        gridsize = min(gridsize, 64)
+        grid1, grid2 = kde_support(values[0], bandwidths[0], cut, gridsize), kde_support(values[1], bandwidths[1], cut, gridsize)
+        binned = binned_kde_2d(values[0], values[1], grid1, grid2, covariance)
+        mesh1, mesh2 = np.meshgrid(grid1, grid2, indexing="ij")
+        truth = exact([mesh1.ravel(), mesh2.ravel()]).reshape(mesh1.shape)
+    if binned is None or truth.max() <= 0:
+        return None
+    error = np.abs(binned - truth) / truth.max()
+    return {"rows": values.shape[1], "max_error": float(error.max()), "mean_error": float(error.mean())}
+
+_binned_kde = threading.local()
+
+# True while the current thread draws with binned_kde; other sessions keep the exact estimator
+def binned_kde_enabled():
+    return getattr(_binned_kde, "enabled", False)
+
+# Seaborn's distribution-plot KDE (kdeplot, displot, histplot's kde) with the binned FFT evaluation swapped in
+class BinnedKDE(DistributionKDE):
+    def _eval_univariate(self, x, weights=None):
+        if binned_kde_enabled():
+            support = self.support if self.support is not None else self.define_support(x, cache=False)
+            covariance = kde_covariance(np.asarray(x, dtype=float), weights, self.bw_method, self.bw_adjust)
+            density = None if covariance is None else binned_kde_1d(x, support, covariance, weights, self.cumulative)
+            if density is not None:
+                return density, support
+        return super()._eval_univariate(x, weights)
+
+    def _eval_bivariate(self, x1, x2, weights=None):
+        if binned_kde_enabled():
+            support = self.support if self.support is not None else self.define_support(x1, x2, cache=False)
+            covariance = kde_covariance([np.asarray(x1, dtype=float), np.asarray(x2, dtype=float)], weights, self.bw_method, self.bw_adjust)
+            density = None if covariance is None else binned_kde_2d(x1, x2, support[0], support[1], covariance, weights, self.cumulative)
+            if density is not None:
+                # Seaborn returns plain densities on a meshgrid ([grid2, grid1]) but cumulative ones as [grid1, grid2]
+                return (density if self.cumulative else density.T), support
+        return super()._eval_bivariate(x1, x2, weights)
+
+# The same swap for the KDE violinplot draws its violins with
+class BinnedDensityKDE(DensityKDE):
+    def _fit_and_evaluate(self, data, orient, support):
+        if binned_kde_enabled() and len(data) >= 2 and self.gridsize is not None:
+            weights = data["weight"].to_numpy(dtype=float) if "weight" in data else None
+            covariance = kde_covariance(data[orient].to_numpy(dtype=float), weights, self.bw_method, self.bw_adjust)
+            density = None if covariance is None else binned_kde_1d(data[orient], support, covariance, weights, self.cumulative)
+            if density is not None:
+                return pd.DataFrame({orient: support, "weight": data["weight"].sum(), "density": density})
+        return super()._fit_and_evaluate(data, orient, support)
+
+# Wrap a seaborn function so it evaluates its KDEs with the binned estimator (and caches under its own name); the
+# estimator classes are swapped into seaborn only for the duration of the call
+def binned_kde(plot):
+    @functools.wraps(plot)
+    def binned(*args, **kwargs):
+        enabled = binned_kde_enabled()
+        _binned_kde.enabled = True
+        try:
+            with patched(seaborn.distributions, "KDE", BinnedKDE), patched(seaborn.categorical, "KDE", BinnedDensityKDE):
+                return plot(*args, **kwargs)
+        finally:
+            _binned_kde.enabled = enabled
+    binned.__name__ = f"binned_{plot.__name__}"
+    return binned
+
+binned_kdeplot = binned_kde(seaborn.distributions.kdeplot)
+binned_displot = binned_kde(seaborn.distributions.displot)
+binned_violinplot = binned_kde(seaborn.categorical.violinplot)
+
+# One-line accuracy note shown under a plot drawn with the binned estimator
+def kde_accuracy_caption(x, y=None, bw_method="scott", bw_adjust=1, gridsize=200, cut=3, log_scale=False):
+    accuracy = kde_accuracy(x, y, bw_method, bw_adjust, gridsize, cut, log_scale)
+    if accuracy is None:
+        return "Binned FFT KDE: accuracy could not be checked (too few or degenerate values); groups the estimator cannot bin use the exact KDE."
+    return f"Binned FFT KDE: on a {accuracy['rows']:,}-row sample it deviates from the exact KDE by at most {accuracy['max_error']:.2%} of the peak density (mean {accuracy['mean_error']:.3%})."
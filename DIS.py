@@ -1,8 +1,16 @@
 import streamlit as st
 import seaborn as sns
-import matplotlib.pyplot as plt
 import pandas as pd
+from LOAD import project
+from RENDER import new_figure, render_plot, store_plot, show_stored_plot
+from DENSITY import BINNED_KDE_ROWS, SKETCH_ECDF_ROWS, binned_displot, binned_kdeplot, histogram_bins, kde_accuracy_caption, sketch_displot, sketch_ecdf, sketch_ecdfplot, sketch_rows
+from STATS import QuantileSketch
+from FACET import FACET_ROWS, FACET_WORKERS, facet_caption, parallel_facets, reset_facet_stats
+import numpy as np
 
+# Note shown under a sketched ECDF
+def sketch_caption(data, weights, rank_error):
+    return f"Sketch ECDF: {len(data):,} retained points stand for {int(data[weights].sum()):,} rows; every value is within ±{rank_error:.2%} of its group's size."
 def show_displot(dataset):
     st.title("Seaborn Displot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -14,6 +22,12 @@ def show_displot(dataset):
             x_var = st.selectbox("X-axis variable", options=dataset.columns, index=0, help="Variable for the x-axis position")
             y_var = st.selectbox("Y-axis variable", options=[None] + list(dataset.columns), index=0, help="Variable for the y-axis position (optional)")
             kind = st.radio("Plot kind", options=["hist", "kde", "ecdf"], index=0, help="Type of distribution plot")
+            pre_bin = st.checkbox("Pre-bin counts", True, help="Count every bin once with NumPy (cached) and let seaborn draw one weighted row per bin") if kind == "hist" else False
+            binned = st.checkbox("Binned FFT KDE", len(dataset) >= BINNED_KDE_ROWS, help="Bin the data onto the evaluation grid and convolve with the kernel by FFT instead of evaluating every point") if kind == "kde" else False
+            sketch = st.checkbox("Sketch ECDF", len(dataset) >= SKETCH_ECDF_ROWS, help="Draw each group's ECDF from a mergeable quantile sketch instead of a step per observation") if kind == "ecdf" else False
+            if sketch:
+                rank_error = st.number_input("Rank error", min_value=0.0005, max_value=0.05, value=0.005, step=0.0005, format="%.4f", help="Largest error of any ECDF value, as a fraction of the group's size")
+                common_norm = st.checkbox("Common norm", False, help="Normalize every group by the total row count, so groups end at their share of the data")
             # Hue parameters
             use_hue = st.checkbox("Use hue grouping", False)
             if use_hue:
@@ -32,8 +46,9 @@ def show_displot(dataset):
                 col_wrap = st.number_input("Columns per row", min_value=1, value=3, help="Wrap column facets") if col_var else None
                 row_order = st.multiselect("Row order", options=sorted(dataset[row_var].unique()), help="Row facet order") if row_var else None
                 col_order = st.multiselect("Column order", options=sorted(dataset[col_var].unique()), help="Column facet order") if col_var else None
+                parallel = st.checkbox("Parallel facets", len(dataset) >= FACET_ROWS and FACET_WORKERS > 1, help=f"Draw and rasterize each facet in one of {FACET_WORKERS} worker processes, then composite the panels")
             else:
-                row_var, col_var, col_wrap, row_order, col_order = None, None, None, None, None
+                row_var, col_var, col_wrap, row_order, col_order, parallel = None, None, None, None, None, False
             # Additional parameters
             rug = st.checkbox("Show rug plot", False, help="Show marginal ticks for each observation")
             log_scale = st.checkbox("Log scale", False, help="Use logarithmic axis scaling")
@@ -46,17 +61,30 @@ def show_displot(dataset):
             if plot_button:
                 st.subheader("Generated Displot")
                 try:
-                    g = sns.displot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,row=row_var if use_facets and row_var else None,col=col_var if use_facets and col_var else None,col_wrap=col_wrap if use_facets and col_var and col_wrap else None,kind=kind,rug=rug,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color,row_order=row_order if use_facets and row_var and row_order else None,col_order=col_order if use_facets and col_var and col_order else None,height=height,aspect=aspect)
-                    st.pyplot(g.fig)
-                    st.session_state['last_displot'] = g.fig
+                    plot_data = project(dataset, x_var, y_var, hue_var, row_var, col_var)
+                    hist_kws = {}
+                    counts = histogram_bins(plot_data, x_var, y_var, [hue_var if use_hue else None, row_var if use_facets else None, col_var if use_facets else None], log_scale=log_scale) if pre_bin else None
+                    if counts is not None:
+                        plot_data, weights, edges = counts
+                        hist_kws = dict(weights=weights, bins=edges)
+                    sketched = sketch_ecdf(plot_data, x_var, y_var, [hue_var if use_hue else None, row_var if use_facets else None, col_var if use_facets else None], rank_error, log_scale) if sketch else None
+                    if sketched is not None:
+                        plot_data, weights = sketched
+                        hist_kws = dict(weights=weights, common_norm=common_norm)
+                    displot = binned_displot if binned else sketch_displot if sketched is not None else sns.displot
+                    reset_facet_stats()
+                    render_plot('last_displot', parallel_facets(displot) if parallel else displot, data=plot_data,x=x_var,y=y_var,hue=hue_var if use_hue else None,row=row_var if use_facets and row_var else None,col=col_var if use_facets and col_var else None,col_wrap=col_wrap if use_facets and col_var and col_wrap else None,kind=kind,rug=rug,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color,row_order=row_order if use_facets and row_var and row_order else None,col_order=col_order if use_facets and col_var and col_order else None,height=height,aspect=aspect,**hist_kws)
+                    if parallel:
+                        st.caption(facet_caption())
+                    if binned:
+                        st.caption(kde_accuracy_caption(plot_data[x_var], plot_data[y_var] if y_var else None, log_scale=log_scale))
+                    if sketched is not None:
+                        st.caption(sketch_caption(plot_data, weights, rank_error))
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_displot' in st.session_state:
-            st.pyplot(st.session_state['last_displot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_displot')
 def show_histplot(dataset):
     st.title("Seaborn Histplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -91,6 +119,7 @@ def show_histplot(dataset):
             shrink = st.slider("Shrink", 0.1, 1.0, 1.0, help="Scale width of bars")
             # KDE parameters
             kde = st.checkbox("Show KDE", False, help="Add kernel density estimate")
+            pre_bin = st.checkbox("Pre-bin counts", True, help="Count every bin once with NumPy (cached) and let seaborn draw one weighted row per bin")
             # Additional parameters
             log_scale = st.checkbox("Log scale", False, help="Use logarithmic axis scaling")
             legend = st.checkbox("Show legend", True, help="Display legend for semantic variables")
@@ -100,18 +129,21 @@ def show_histplot(dataset):
             if plot_button:
                 st.subheader("Generated Histplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.histplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,stat=stat,bins=None if bins == "auto" else (int(bins) if bins.isdigit() else bins),binwidth=binwidth if binwidth > 0 else None,discrete=discrete,cumulative=cumulative,common_bins=common_bins,common_norm=common_norm,multiple=multiple,element=element,fill=fill,shrink=shrink,kde=kde,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_histplot'] = fig
+                    plot_data = project(dataset, x_var, y_var, hue_var)
+                    bins = int(bins) if bins.isdigit() else bins
+                    binwidth = binwidth if binwidth > 0 else None
+                    weights = None
+                    counts = histogram_bins(plot_data, x_var, y_var, [hue_var if use_hue else None], bins, binwidth, discrete, common_bins, kde, log_scale) if pre_bin else None
+                    if counts is not None:
+                        # The cached edges already encode bins, binwidth and discrete
+                        plot_data, weights, bins = counts
+                        binwidth, discrete = None, False
+                    render_plot('last_histplot', sns.histplot, data=plot_data,x=x_var,y=y_var,hue=hue_var if use_hue else None,weights=weights,stat=stat,bins=bins,binwidth=binwidth,discrete=discrete,cumulative=cumulative,common_bins=common_bins,common_norm=common_norm,multiple=multiple,element=element,fill=fill,shrink=shrink,kde=kde,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color)
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_histplot' in st.session_state:
-            st.pyplot(st.session_state['last_histplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_histplot')
 def show_kdeplot(dataset):
     st.title("Seaborn KDE Plot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -143,6 +175,7 @@ def show_kdeplot(dataset):
             levels = st.number_input("Contour levels", min_value=1, value=10, help="Number of contour levels (bivariate only)")
             gridsize = st.number_input("Grid size", min_value=10, value=200, help="Points on evaluation grid")
             cut = st.number_input("Cut", min_value=0, value=3, help="Extend evaluation grid beyond data limits")
+            binned = st.checkbox("Binned FFT KDE", len(dataset) >= BINNED_KDE_ROWS, help="Bin the data onto the evaluation grid and convolve with the kernel by FFT instead of evaluating every point")
             # Additional parameters
             log_scale = st.checkbox("Log scale", False, help="Use logarithmic axis scaling")
             legend = st.checkbox("Show legend", True, help="Display legend for semantic variables")
@@ -152,18 +185,15 @@ def show_kdeplot(dataset):
             if plot_button:
                 st.subheader("Generated KDE Plot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.kdeplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,fill=fill,multiple=multiple,common_norm=common_norm,common_grid=common_grid,cumulative=cumulative,bw_method=bw_method,bw_adjust=bw_adjust,levels=levels,gridsize=gridsize,cut=cut,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_kdeplot'] = fig
+                    plot_data = project(dataset, x_var, y_var, hue_var)
+                    render_plot('last_kdeplot', binned_kdeplot if binned else sns.kdeplot, data=plot_data,x=x_var,y=y_var,hue=hue_var if use_hue else None,fill=fill,multiple=multiple,common_norm=common_norm,common_grid=common_grid,cumulative=cumulative,bw_method=bw_method,bw_adjust=bw_adjust,levels=levels,gridsize=gridsize,cut=cut,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color)
+                    if binned:
+                        st.caption(kde_accuracy_caption(plot_data[x_var], plot_data[y_var] if y_var else None, bw_method, bw_adjust, gridsize, cut, log_scale))
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_kdeplot' in st.session_state:
-            st.pyplot(st.session_state['last_kdeplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_kdeplot')
 def show_ecdfplot(dataset):
     st.title("Seaborn ECDF Plot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -187,6 +217,10 @@ def show_ecdfplot(dataset):
             # ECDF parameters
             stat = st.selectbox("Statistic", options=["proportion", "percent", "count"], index=0, help="Distribution statistic to compute")
             complementary = st.checkbox("Complementary", False, help="Plot 1 - CDF instead of CDF")
+            sketch = st.checkbox("Sketch ECDF", len(dataset) >= SKETCH_ECDF_ROWS, help="Draw each group's ECDF from a mergeable quantile sketch instead of a step per observation")
+            if sketch:
+                rank_error = st.number_input("Rank error", min_value=0.0005, max_value=0.05, value=0.005, step=0.0005, format="%.4f", help="Largest error of any ECDF value, as a fraction of the group's size")
+                common_norm = st.checkbox("Common norm", False, help="Normalize every group by the total row count, so groups end at their share of the data")
             # Additional parameters
             log_scale = st.checkbox("Log scale", False, help="Use logarithmic axis scaling")
             legend = st.checkbox("Show legend", True, help="Display legend for semantic variables")
@@ -196,18 +230,20 @@ def show_ecdfplot(dataset):
             if plot_button:
                 st.subheader("Generated ECDF Plot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.ecdfplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,stat=stat,complementary=complementary,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_ecdfplot'] = fig
+                    plot_data = project(dataset, x_var, y_var, hue_var)
+                    sketched = sketch_ecdf(plot_data, x_var, y_var, [hue_var if use_hue else None], rank_error, log_scale) if sketch else None
+                    sketch_kws = {}
+                    if sketched is not None:
+                        plot_data, weights = sketched
+                        sketch_kws = dict(weights=weights, common_norm=common_norm)
+                    render_plot('last_ecdfplot', sketch_ecdfplot if sketched is not None else sns.ecdfplot, data=plot_data,x=x_var,y=y_var,hue=hue_var if use_hue else None,stat=stat,complementary=complementary,log_scale=log_scale,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color,**sketch_kws)
+                    if sketched is not None:
+                        st.caption(sketch_caption(plot_data, weights, rank_error))
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_ecdfplot' in st.session_state:
-            st.pyplot(st.session_state['last_ecdfplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_ecdfplot')
 def show_rugplot(dataset):
     st.title("Seaborn Rugplot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -238,15 +274,90 @@ def show_rugplot(dataset):
             if plot_button:
                 st.subheader("Generated Rugplot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.rugplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,height=height,expand_margins=expand_margins,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_rugplot'] = fig
+                    render_plot('last_rugplot', sns.rugplot, data=project(dataset, x_var, y_var, hue_var),x=x_var,y=y_var,hue=hue_var if use_hue else None,height=height,expand_margins=expand_margins,legend=legend,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,color=color)
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_rugplot' in st.session_state:
-            st.pyplot(st.session_state['last_rugplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_rugplot')
+def show_streamed_histplot(profile):
+    st.title("Streamed Histogram")
+    tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
+    with tab1:
+        col1, col2 = st.columns([1, 1], border=True)
+        with col1:
+            st.subheader("Plot Parameters")
+            numeric_cols = profile.numeric_columns
+            if not numeric_cols:
+                st.warning("No numeric columns found in the streamed file")
+                return
+            x_var = st.selectbox("X-axis variable", options=numeric_cols, index=0, help="Numeric column aggregated while streaming")
+            stat = st.selectbox("Statistic", options=["count", "probability", "percent", "density"], index=0, help="Aggregate statistic to compute in each bin")
+            cumulative = st.checkbox("Cumulative", False, help="Show cumulative counts")
+            fill = st.checkbox("Fill", True, help="Fill space under histogram")
+            quantiles = st.multiselect("Quantile markers", options=[0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99], default=[0.25, 0.5, 0.75], help="Quantiles from the streaming sketch drawn as vertical lines")
+            log_scale = st.checkbox("Log count scale", False, help="Use logarithmic scaling on the count axis")
+            color = st.color_picker("Base color", value="#1f77b4", help="Color of the bars")
+            plot_button = st.button("Generate Plot", use_container_width=True, type='primary')
+        with col2:
+            if plot_button:
+                st.subheader("Generated Histogram")
+                try:
+                    column = profile.columns[x_var]
+                    edges = column.histogram.edges
+                    heights = column.histogram.counts.astype(float)
+                    if stat == "probability":
+                        heights = heights / heights.sum()
+                    elif stat == "percent":
+                        heights = 100 * heights / heights.sum()
+                    elif stat == "density":
+                        heights = heights / heights.sum() / np.diff(edges)
+                    if cumulative:
+                        heights = np.cumsum(heights * np.diff(edges)) if stat == "density" else np.cumsum(heights)
+                    fig, ax = new_figure()
+                    ax.stairs(heights, edges, fill=fill, color=color, alpha=0.75 if fill else 1.0)
+                    for q, value in zip(quantiles, column.sketch.quantile(np.array(quantiles, dtype=float))):
+                        ax.axvline(value, color="#333333", linestyle="--", linewidth=1)
+                        ax.annotate(f"q{q:g}", (value, 1), xycoords=("data", "axes fraction"), rotation=90, va="top", ha="right", fontsize=8)
+                    ax.set(xlabel=x_var, ylabel=stat.capitalize())
+                    if log_scale:
+                        ax.set_yscale("log")
+                    store_plot('last_streamed_histplot', fig)
+                    st.caption(f"{column.count:,} values streamed, {column.nulls:,} missing")
+                except Exception as e:
+                    st.error(f"Error generating plot: {str(e)}")
+    with tab2:
+        st.subheader("Previously Generated Plot")
+        show_stored_plot('last_streamed_histplot')
+def show_streamed_ecdfplot(profile):
+    st.title("Streamed ECDF")
+    tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
+    with tab1:
+        col1, col2 = st.columns([1, 1], border=True)
+        with col1:
+            st.subheader("Plot Parameters")
+            numeric_cols = profile.numeric_columns
+            if not numeric_cols:
+                st.warning("No numeric columns found in the streamed file")
+                return
+            x_var = st.selectbox("X-axis variable", options=numeric_cols, index=0, help="Numeric column sketched while streaming")
+            stat = st.selectbox("Statistic", options=["proportion", "percent", "count"], index=0, help="Distribution statistic to compute")
+            complementary = st.checkbox("Complementary", False, help="Plot 1 - CDF instead of CDF")
+            log_scale = st.checkbox("Log scale", False, help="Use logarithmic axis scaling")
+            color = st.color_picker("Base color", value="#1f77b4", help="Color of the curve")
+            plot_button = st.button("Generate Plot", use_container_width=True, type='primary')
+        with col2:
+            if plot_button:
+                st.subheader("Generated ECDF")
+                try:
+                    column = profile.columns[x_var]
+                    plot_data = sketch_rows([column.sketch], pd.DataFrame(index=range(1)), x_var)
+                    fig, ax = new_figure()
+                    sns.ecdfplot(data=plot_data, x=x_var, weights="count", stat=stat, complementary=complementary, log_scale=log_scale, color=color, ax=ax)
+                    store_plot('last_streamed_ecdfplot', fig)
+                    st.caption(f"{column.count:,} values streamed into {len(plot_data):,} sketch points; every value is within ±{QuantileSketch.rank_error(column.sketch.k):.2%} of the row count")
+                except Exception as e:
+                    st.error(f"Error generating plot: {str(e)}")
+    with tab2:
+        st.subheader("Previously Generated Plot")
+        show_stored_plot('last_streamed_ecdfplot')
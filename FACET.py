@@ -0,0 +1,423 @@
+import functools
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import seaborn
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.category import StrCategoryLocator
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+from seaborn._base import categorical_order, infer_orient, variable_type
+from seaborn._statistics import Histogram
+from DENSITY import binned_displot, sketch_displot
+from FIT import analytic_lmplot, grouped_lmplot
+from RENDER import PLOT_DPI
+from STATS import BootstrapErrorbar
+from SUMMARY import summary_catplot
+from SWARM import fast_catplot
+
+# Processes that draw facets, and the row count above which the UIs offer the parallel path by default
+FACET_WORKERS = int(os.environ.get("EDA_FACET_WORKERS", os.cpu_count() or 1))
+FACET_ROWS = int(os.environ.get("EDA_FACET_ROWS", 200000))
+# Blank space around each panel while it is rasterized, and between panels in the composite, in inches
+PANEL_MARGIN = 1.5
+PANEL_PAD = 0.1
+# Figure-level functions a worker can draw, by name, with the seaborn function whose arguments they take
+FACET_PLOTS = {plot.__name__: (plot, family) for plot, family in [
+    (seaborn.relplot, "relplot"), (seaborn.displot, "displot"), (binned_displot, "displot"), (sketch_displot, "displot"),
+    (seaborn.catplot, "catplot"), (summary_catplot, "catplot"), (fast_catplot, "catplot"), (seaborn.lmplot, "lmplot"), (analytic_lmplot, "lmplot"), (grouped_lmplot, "lmplot"),
+]}
+# Semantic variables whose colours, sizes or markers have to agree across panels
+FACET_SEMANTICS = {"relplot": ["hue", "size", "style"], "displot": ["hue"], "catplot": ["hue"], "lmplot": ["hue"]}
+# Histogram statistics that seaborn normalizes over every facet at once when common_norm is on
+NORMALIZED_STATS = ["density", "probability", "proportion", "percent"]
+
+_facets = threading.local()
+_pool = None
+_pool_lock = threading.Lock()
+
+# Panels, processes and seconds of the last grid the current thread drew, and why it fell back to seaborn if it did
+def facet_stats():
+    return getattr(_facets, "stats", None)
+
+def reset_facet_stats():
+    _facets.stats = None
+
+# Long-lived worker processes; spawned rather than forked, since the Streamlit server runs threads of its own
+def facet_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(FACET_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def reset_facet_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+# Whether tasks go to the pool: only when there is more than one worker and more than one task
+def pooled(tasks):
+    return FACET_WORKERS > 1 and len(tasks) > 1
+
+# Run function(*task) for every task, in the pool when it is worth it
+def run_tasks(function, tasks):
+    if not pooled(tasks):
+        return [function(*task) for task in tasks]
+    futures = [facet_pool().submit(function, *task) for task in tasks]
+    return [future.result() for future in futures]
+
+# Why a grid has to be drawn by seaborn itself, or None when the parallel path reproduces it
+def facet_support(family, kwargs):
+    facet_kws = kwargs.get("facet_kws") or {}
+    for share in ("sharex", "sharey"):
+        if not isinstance(kwargs.get(share, facet_kws.get(share, True)), bool):
+            return "axes shared by row or column"
+    if kwargs.get("margin_titles") or facet_kws.get("margin_titles"):
+        return "margin titles"
+    if family == "displot":
+        if kwargs.get("x") is not None and kwargs.get("y") is not None:
+            return "bivariate distributions"
+        if kwargs.get("multiple") == "fill":
+            return "filled distributions"
+        if kwargs.get("kind", "hist") == "hist" and np.ndim(kwargs.get("bins", "auto")) == 0 and (kwargs.get("log_scale") or kwargs.get("discrete") or kwargs.get("binwidth") is not None):
+            return "histogram bins that depend on the log scale or bin width"
+    if family == "lmplot" and not kwargs.get("truncate", True):
+        return "regression lines extended to the shared axis limits"
+    return None
+
+# Orders and norms computed from the whole dataset, so every panel maps its semantics like the full grid does
+def shared_semantics(family, data, kwargs):
+    shared = {}
+    for semantic in FACET_SEMANTICS[family]:
+        column = kwargs.get(semantic)
+        if column is None:
+            continue
+        values = data[column]
+        if family != "lmplot" and semantic != "style" and variable_type(values) == "numeric":
+            if kwargs.get(f"{semantic}_norm") is None and values.notna().any():
+                shared[f"{semantic}_norm"] = (float(values.min()), float(values.max()))
+        elif not kwargs.get(f"{semantic}_order"):
+            shared[f"{semantic}_order"] = categorical_order(values)
+    if family == "catplot" and not kwargs.get("native_scale") and not kwargs.get("order"):
+        x, y = kwargs.get("x"), kwargs.get("y")
+        orient = infer_orient(data[x] if x is not None else None, data[y] if y is not None else None, kwargs.get("orient"), require_numeric=False)
+        categorical = x if orient == "x" else y
+        if categorical is not None:
+            shared["order"] = categorical_order(data[categorical])
+    if family == "displot" and kwargs.get("kind", "hist") == "hist" and np.ndim(kwargs.get("bins", "auto")) == 0 and kwargs.get("common_bins", True):
+        # Seaborn bins every facet on edges found from all of the data
+        variable = kwargs.get("x") if kwargs.get("x") is not None else kwargs.get("y")
+        values = data[variable].to_numpy(dtype=float, na_value=np.nan)
+        weights = data[kwargs["weights"]].to_numpy(dtype=float, na_value=np.nan) if isinstance(kwargs.get("weights"), str) else None
+        keep = np.isfinite(values) if weights is None else np.isfinite(values) & np.isfinite(weights)
+        if keep.any():
+            histogram = Histogram(bins=kwargs.get("bins", "auto"), binrange=kwargs.get("binrange"))
+            bins = histogram.define_bin_params(values[keep], weights=None if weights is None else weights[keep])
+            shared["bins"] = bins["bins"] if "range" not in bins else np.linspace(*bins["range"], bins["bins"] + 1)
+    return shared
+
+# Factor that rescales one panel's normalized distribution to its share of the whole dataset, as seaborn's common_norm does
+def common_norm_factor(name, family, panel, data, kwargs):
+    if family != "displot":
+        return 1.0
+    kind = kwargs.get("kind", "hist")
+    if name == sketch_displot.__name__:
+        normalized = kwargs.get("common_norm", False)
+    elif kind == "hist":
+        normalized = kwargs.get("stat", "count") in NORMALIZED_STATS and kwargs.get("common_norm", True)
+    else:
+        normalized = kind == "kde" and kwargs.get("common_norm", True)
+    if not normalized:
+        return 1.0
+    weights = kwargs.get("weights")
+    if isinstance(weights, str):
+        return float(panel[weights].sum() / data[weights].sum())
+    return len(panel) / len(data)
+
+# Scale every data-space artist of a univariate distribution along its value axis
+def scale_values(ax, axis, factor):
+    column = 1 if axis == "y" else 0
+    for line in ax.lines:
+        xy = [np.asarray(values, dtype=float) for values in line.get_data()]
+        xy[column] = xy[column] * factor
+        line.set_data(*xy)
+    for patch in ax.patches:
+        if isinstance(patch, Rectangle) and patch.get_data_transform() == ax.transData:
+            if axis == "y":
+                patch.set_y(patch.get_y() * factor)
+                patch.set_height(patch.get_height() * factor)
+            else:
+                patch.set_x(patch.get_x() * factor)
+                patch.set_width(patch.get_width() * factor)
+    for collection in ax.collections:
+        # Rugs are drawn partly in axes coordinates and keep their length
+        if collection.get_transform() != ax.transData:
+            continue
+        for path in collection.get_paths():
+            path.vertices[:, column] *= factor
+    interval = np.asarray(ax.dataLim.intervaly if axis == "y" else ax.dataLim.intervalx) * factor
+    if axis == "y":
+        ax.dataLim.intervaly = interval
+    else:
+        ax.dataLim.intervalx = interval
+    ax.autoscale_view()
+
+# View and data limits of one axis, and whether matplotlib chose them
+def axis_limits(ax, axis):
+    view = ax.get_xlim() if axis == "x" else ax.get_ylim()
+    data = ax.dataLim.intervalx if axis == "x" else ax.dataLim.intervaly
+    sticky = [value for artist in ax.lines + ax.patches + ax.collections + ax.images for value in getattr(artist.sticky_edges, axis)]
+    return {
+        "view": tuple(map(float, view)), "data": tuple(map(float, data)), "sticky": [float(value) for value in sticky if np.isfinite(value)],
+        "auto": bool(ax.get_autoscalex_on() if axis == "x" else ax.get_autoscaley_on()),
+        "log": (ax.get_xscale() if axis == "x" else ax.get_yscale()) == "log",
+    }
+
+# Limits a shared axis would get from every panel's data: the union of the data, with matplotlib's margins stopped
+# at the nearest sticky edge (a histogram's zero, say), as autoscaling does; limits seaborn set itself are joined
+def shared_limits(limits, margin):
+    limits = [limit for limit in limits if limit is not None and np.all(np.isfinite(limit["data"]))]
+    if not limits:
+        return None
+    inverted = limits[0]["view"][0] > limits[0]["view"][1]
+    views = np.sort(np.array([limit["view"] for limit in limits]), axis=1)
+    lo, hi = views[:, 0].min(), views[:, 1].max()
+    if all(limit["auto"] for limit in limits):
+        forward, inverse = (np.log10, lambda value: 10 ** value) if limits[0]["log"] else (lambda value: value, lambda value: value)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            data = forward(np.array([limit["data"] for limit in limits]))
+            sticky = forward(np.array([value for limit in limits for value in limit["sticky"]], dtype=float))
+        sticky = sticky[np.isfinite(sticky)]
+        low, high = data[:, 0].min(), data[:, 1].max()
+        if np.isfinite(low) and np.isfinite(high) and high > low:
+            tolerance = 1e-9 * (high - low)
+            below, above = sticky[sticky <= low + tolerance], sticky[sticky >= high - tolerance]
+            lo = inverse(max(low - margin * (high - low), below.max() if len(below) else -np.inf))
+            hi = inverse(min(high + margin * (high - low), above.min() if len(above) else np.inf))
+    return (hi, lo) if inverted else (lo, hi)
+
+# Draw one facet with the figure-level function alone; returns the figure, its axis labels and its limits
+def draw_panel(name, data, kwargs, scale=1.0):
+    plot, family = FACET_PLOTS[name]
+    if len(data):
+        figure = plot(data=data, **kwargs).figure
+        plt.close(figure)
+    else:
+        figure = Figure()
+        figure.subplots()
+    ax = figure.axes[0]
+    if scale != 1.0:
+        scale_values(ax, "x" if kwargs.get("x") is None else "y", scale)
+    limits = {axis: axis_limits(ax, axis) for axis in "xy"} if len(data) else {"x": None, "y": None}
+    if family == "catplot":
+        # Seaborn fixes a categorical axis at -0.5 to n - 0.5 but leaves autoscaling on
+        for axis in "xy":
+            if limits[axis] is not None and isinstance(getattr(ax, f"{axis}axis").get_major_locator(), StrCategoryLocator):
+                limits[axis]["auto"] = False
+    return figure, (ax.get_xlabel(), ax.get_ylabel()), limits
+
+# A worker's first pass over a facet: only its labels and limits go back, the figure stays behind
+def panel_limits(name, data, kwargs, scale=1.0):
+    _, labels, limits = draw_panel(name, data, kwargs, scale)
+    return labels, limits
+
+# Give a panel the grid's limits, title and labels, and rasterize it around a fixed-size axes box; `panel` is a
+# figure drawn in this process or the draw_panel task to redraw it from. Returns the pixels covering the axes and
+# its decorations, with the axes' top-left corner within them
+def rasterize_panel(panel, xlim, ylim, title, labels, bottom, left, share, size, dpi):
+    figure = panel if isinstance(panel, Figure) else draw_panel(*panel)[0]
+    ax = figure.axes[0]
+    if xlim is not None:
+        ax.set_xlim(*xlim)
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+    ax.set_title(title, fontsize=mpl.rcParams["axes.labelsize"])
+    ax.set_xlabel(labels[0] if bottom else "")
+    ax.set_ylabel(labels[1] if left else "")
+    if share[0] and not bottom:
+        ax.tick_params(axis="x", labelbottom=False)
+        ax.xaxis.offsetText.set_visible(False)
+    if share[1] and not left:
+        ax.tick_params(axis="y", labelleft=False)
+        ax.yaxis.offsetText.set_visible(False)
+    figure.set_layout_engine("none")
+    width, height = size[0] + 2 * PANEL_MARGIN, size[1] + 2 * PANEL_MARGIN
+    figure.set_size_inches(width, height)
+    figure.set_dpi(dpi)
+    ax.set_position([PANEL_MARGIN / width, PANEL_MARGIN / height, size[0] / width, size[1] / height])
+    canvas = FigureCanvasAgg(figure)
+    canvas.draw()
+    renderer = canvas.get_renderer()
+    pixels = np.asarray(canvas.buffer_rgba())
+    rows, columns = pixels.shape[:2]
+    extent, box = ax.get_tightbbox(renderer), ax.get_window_extent(renderer)
+    x0, x1 = max(int(np.floor(extent.x0)), 0), min(int(np.ceil(extent.x1)), columns)
+    y0, y1 = max(int(np.floor(rows - extent.y1)), 0), min(int(np.ceil(rows - extent.y0)), rows)
+    origin = (int(round(box.x0)) - x0, int(round(rows - box.y1)) - y0)
+    return pixels[y0:y1, x0:x1, :3].copy(), origin
+
+# Draw the grid's legend on its own from a few rows per level and return its pixels, or None without a legend
+def draw_legend(name, data, kwargs, dpi):
+    plot, _ = FACET_PLOTS[name]
+    figure = plot(data=data, **kwargs).figure
+    plt.close(figure)
+    legend = figure.legends[0] if figure.legends else None
+    if legend is None:
+        return None
+    figure.set_dpi(dpi)
+    canvas = FigureCanvasAgg(figure)
+    canvas.draw()
+    pixels = np.asarray(canvas.buffer_rgba())
+    box = legend.get_window_extent(canvas.get_renderer())
+    rows = pixels.shape[0]
+    return pixels[max(int(rows - box.y1), 0):int(np.ceil(rows - box.y0)), max(int(box.x0), 0):int(np.ceil(box.x1)), :3].copy()
+
+# Numeric semantics with more levels than seaborn lists one by one; their "auto" legends show a few brief ticks
+def brief_semantics(family, data, kwargs):
+    return [semantic for semantic in FACET_SEMANTICS[family] if family in ("relplot", "catplot") and semantic != "style" and kwargs.get(semantic) is not None
+            and variable_type(data[kwargs[semantic]]) == "numeric" and data[kwargs[semantic]].nunique() > 6]
+
+# Rows that give the legend every level of a semantic, or just the extremes of one drawn with brief ticks
+def legend_rows(family, data, kwargs):
+    brief = brief_semantics(family, data, kwargs)
+    rows = []
+    for semantic in FACET_SEMANTICS[family]:
+        column = kwargs.get(semantic)
+        if column is None:
+            continue
+        if semantic in brief:
+            rows += [data[column].idxmin(), data[column].idxmax()]
+        elif family != "lmplot" and semantic != "style" and variable_type(data[column]) == "numeric":
+            rows += list(data[column].drop_duplicates().index)
+        else:
+            rows += list(data.groupby(column, observed=True, sort=False).head(3).index)
+    return data.loc[list(dict.fromkeys(rows))]
+
+# Paste the panels onto one canvas: every axes box the same size, each column and row as wide and tall as its
+# decorations need, and the legend centred on the right
+def composite(panels, positions, bottoms, nrow, ncol, legend, dpi):
+    pad = int(round(PANEL_PAD * dpi))
+    box_w = max(panel[2][0] for panel in panels)
+    box_h = max(panel[2][1] for panel in panels)
+    lefts, rights, tops, belows = np.zeros(ncol, int), np.zeros(ncol, int), np.zeros(nrow, int), np.zeros(nrow, int)
+    for (pixels, (ox, oy), _), (r, c), bottom in zip(panels, positions, bottoms):
+        lefts[c], rights[c] = max(lefts[c], ox), max(rights[c], pixels.shape[1] - ox - box_w)
+        tops[r] = max(tops[r], oy)
+        # A wrapped panel with nothing below it hangs its labels into the empty slot
+        if not bottom or r == nrow - 1:
+            belows[r] = max(belows[r], pixels.shape[0] - oy - box_h)
+    xs = np.cumsum(np.r_[0, (lefts + box_w + rights + pad)[:-1]]) + lefts
+    ys = np.cumsum(np.r_[0, (tops + box_h + belows + pad)[:-1]]) + tops
+    width, height = int(xs[-1] + box_w + rights[-1]), int(ys[-1] + box_h + belows[-1])
+    for (pixels, (ox, oy), _), (r, c) in zip(panels, positions):
+        height = max(height, int(ys[r] - oy + pixels.shape[0]))
+    legend_w = 0 if legend is None else legend.shape[1] + pad
+    canvas = np.full((max(height, 0 if legend is None else legend.shape[0]), width + legend_w, 3), 255, dtype=np.uint8)
+    for (pixels, (ox, oy), _), (r, c) in zip(panels, positions):
+        top, left = int(ys[r] - oy), int(xs[c] - ox)
+        canvas[top:top + pixels.shape[0], left:left + pixels.shape[1]] = pixels
+    if legend is not None:
+        top = (canvas.shape[0] - legend.shape[0]) // 2
+        canvas[top:top + legend.shape[0], width + pad:width + pad + legend.shape[1]] = legend
+    return canvas
+
+# Draw a faceted figure-level plot one panel per task: the data is split by facet once, the pool draws every panel
+# with the whole dataset's semantic mappings and sends back its limits, then redraws it with the shared limits and
+# sends back its pixels (figures never cross the process boundary), and the panels are composited into one image
+# with a single legend
+def facet_grid(name, data, row=None, col=None, col_wrap=None, row_order=None, col_order=None, height=5, aspect=1, legend="auto", **kwargs):
+    started = time.perf_counter()
+    plot, family = FACET_PLOTS[name]
+    rows = categorical_order(data[row], row_order or None) if row is not None else [None]
+    cols = categorical_order(data[col], col_order or None) if col is not None else [None]
+    if col_wrap and row is None and col is not None:
+        ncol = min(int(col_wrap), len(cols))
+        nrow = -(-len(cols) // ncol)
+        keys = [(None, level) for level in cols]
+        positions = [(i // ncol, i % ncol) for i in range(len(cols))]
+        bottoms = [i + ncol >= len(cols) for i in range(len(cols))]
+    else:
+        nrow, ncol = len(rows), len(cols)
+        keys = [(r, c) for r in rows for c in cols]
+        positions = [(i // ncol, i % ncol) for i in range(len(keys))]
+        bottoms = [r == nrow - 1 for r, _ in positions]
+    by = [var for var in (row, col) if var is not None]
+    groups = {key if isinstance(key, tuple) else (key,): frame for key, frame in data.groupby(by, observed=True, sort=False, dropna=True)}
+    panel_kws = {**kwargs, **shared_semantics(family, data, kwargs), "height": height, "aspect": aspect}
+    tasks, titles = [], []
+    for r, c in keys:
+        panel = groups.get(tuple(level for level, var in ((r, row), (c, col)) if var is not None), data.iloc[:0])
+        restricted = {key: value.restricted(panel) if isinstance(value, BootstrapErrorbar) else value for key, value in panel_kws.items()}
+        tasks.append((name, panel, {**restricted, "legend": False}, common_norm_factor(name, family, panel, data, kwargs)))
+        titles.append(" | ".join(f"{var} = {level}" for level, var in ((r, row), (c, col)) if var is not None))
+    if pooled(tasks):
+        panels, drawn = tasks, run_tasks(panel_limits, tasks)
+    else:
+        # In this process each figure is drawn once and rasterized as it is
+        panels, drawn = zip(*[(figure, (labels, limits)) for figure, labels, limits in (draw_panel(*task) for task in tasks)])
+    labels = next((panel_labels for panel_labels, limits in drawn if limits["x"] is not None), ("", ""))
+    facet_kws = kwargs.get("facet_kws") or {}
+    share = tuple(kwargs.get(f"share{axis}", facet_kws.get(f"share{axis}", True)) for axis in "xy")
+    shared = [shared_limits([limits[axis] for _, limits in drawn], mpl.rcParams[f"axes.{axis}margin"]) if sharing else None for axis, sharing in zip("xy", share)]
+    size = (max(height * aspect - 0.6, 0.5), max(height - 0.6, 0.5))
+    rasterized = run_tasks(rasterize_panel, [
+        (panel, shared[0], shared[1], title, labels, bottom, c == 0, share, size, PLOT_DPI)
+        for panel, title, bottom, (_, c) in zip(panels, titles, bottoms, positions)
+    ])
+    legend_image = None
+    if legend is not False and any(kwargs.get(semantic) is not None for semantic in FACET_SEMANTICS[family]):
+        legend_kws = {**panel_kws, "legend": "brief" if legend == "auto" and brief_semantics(family, data, kwargs) else legend}
+        if family == "lmplot":
+            legend_kws["ci"] = None
+        legend_image = draw_legend(name, legend_rows(family, data, kwargs), legend_kws, PLOT_DPI)
+    box = (int(round(size[0] * PLOT_DPI)), int(round(size[1] * PLOT_DPI)))
+    canvas = composite([(pixels, origin, box) for pixels, origin in rasterized], positions, bottoms, nrow, ncol, legend_image, PLOT_DPI)
+    figure = Figure(figsize=(canvas.shape[1] / PLOT_DPI, canvas.shape[0] / PLOT_DPI), dpi=PLOT_DPI)
+    ax = figure.add_axes([0, 0, 1, 1])
+    ax.imshow(canvas, interpolation="none")
+    ax.set_axis_off()
+    _facets.stats = {"panels": len(tasks), "workers": min(FACET_WORKERS, len(tasks)), "seconds": time.perf_counter() - started, "fallback": None}
+    return figure
+
+# Wrap a figure-level seaborn function so faceted grids are drawn panel by panel in worker processes (and it caches
+# under its own name); grids the parallel path cannot reproduce are drawn by the function itself
+def parallel_facets(plot):
+    @functools.wraps(plot)
+    def parallel(data=None, row=None, col=None, **kwargs):
+        name = plot.__name__
+        if row is None and col is None:
+            reason = "there are no facets"
+        elif name not in FACET_PLOTS:
+            reason = f"{name} has no parallel renderer"
+        else:
+            unsupported = facet_support(FACET_PLOTS[name][1], kwargs)
+            reason = unsupported and f"the parallel renderer does not reproduce {unsupported}"
+        if reason is None:
+            try:
+                return facet_grid(name, data, row=row, col=col, **kwargs)
+            except (BrokenProcessPool, pickle.PicklingError) as error:
+                reset_facet_pool()
+                reason = f"the worker processes failed ({error})"
+        _facets.stats = {"panels": 0, "workers": 1, "seconds": 0.0, "fallback": reason}
+        return plot(data=data, row=row, col=col, **kwargs)
+    parallel.__name__ = f"parallel_{plot.__name__}"
+    return parallel
+
+# One-line note on how the last faceted grid was drawn
+def facet_caption():
+    stats = facet_stats()
+    if stats is None:
+        return "Facets reused from the render cache"
+    if stats["fallback"]:
+        return f"Drawn by seaborn in one process: {stats['fallback']}"
+    return f"Drew {stats['panels']:,} facets on {stats['workers']:,} processes in {stats['seconds']:.2f} s"
@@ -0,0 +1,398 @@
+import functools
+import os
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+import seaborn.regression
+from scipy import stats
+from seaborn.regression import _RegressionPlotter
+from CACHE import LRUCache, content_hash, env_megabytes, frame_fingerprint
+from PATCH import patched
+from STATS import values_digest
+
+CI_METHODS = ["analytic", "bootstrap"]
+# Per-group least-squares fits shared by every session
+FIT_CACHE = LRUCache(env_megabytes("EDA_FIT_CACHE_MB", 16), "fit")
+# Binned LOWESS: points the smoother is fitted at, and bins the data is summed into before each pass
+LOWESS_ANCHORS = int(os.environ.get("EDA_LOWESS_ANCHORS", 512))
+LOWESS_BINS = int(os.environ.get("EDA_LOWESS_BINS", 4096))
+# Largest condition number of a group's X'X that the grouped normal equations are trusted to solve
+FIT_CONDITION = float(os.environ.get("EDA_FIT_CONDITION", 1e10))
+
+# Least-squares polynomial fit of y on x: coefficients in the scaled basis plus what the prediction variance needs.
+# x is centred and scaled before the Vandermonde matrix is built, and the fit goes through QR, so high orders stay stable
+class PolynomialFit:
+    def __init__(self, x, y, order=1):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        self.order = int(order)
+        self.centre = x.mean() if len(x) else 0.0
+        spread = x.std() if len(x) else 0.0
+        self.scale = spread if spread > 0 else 1.0
+        q, self.r = np.linalg.qr(self.design(x))
+        self.beta = np.linalg.lstsq(self.r, q.T @ y, rcond=None)[0]
+        residuals = y - self.design(x) @ self.beta
+        self.dof = len(y) - (self.order + 1)
+        self.variance = residuals @ residuals / self.dof if self.dof > 0 else np.nan
+
+    def design(self, x):
+        return np.vander((np.asarray(x, dtype=float) - self.centre) / self.scale, self.order + 1, increasing=True)
+
+    def predict(self, grid):
+        return self.design(grid) @ self.beta
+
+    # Two-sided `level`% confidence band of the fitted mean: yhat +- t * sqrt(s^2 g' (X'X)^-1 g)
+    def band(self, grid, level=95):
+        yhat = self.predict(grid)
+        if not self.dof > 0 or not np.isfinite(self.variance):
+            return None
+        with np.errstate(all="ignore"):
+            leverage = np.linalg.lstsq(self.r.T, self.design(grid).T, rcond=None)[0]
+        half = stats.t.ppf(0.5 + level / 200, self.dof) * np.sqrt(self.variance * np.einsum("ij,ij->j", leverage, leverage))
+        return np.vstack([yhat - half, yhat + half])
+
+# One group's polynomial fit from its sufficient statistics; predicts and bands like PolynomialFit.
+# Without an inverse (a group left to seaborn) it has no band
+class GroupFit:
+    def __init__(self, centre, scale, offset, beta, inverse, variance, dof):
+        self.order = len(beta) - 1
+        self.centre, self.scale, self.offset = centre, scale, offset
+        self.beta, self.inverse, self.variance, self.dof = beta, inverse, variance, dof
+
+    def design(self, x):
+        return np.vander((np.asarray(x, dtype=float) - self.centre) / self.scale, self.order + 1, increasing=True)
+
+    def predict(self, grid):
+        return self.design(grid) @ self.beta + self.offset
+
+    def band(self, grid, level=95):
+        yhat = self.predict(grid)
+        if self.inverse is None or not self.dof > 0 or not np.isfinite(self.variance):
+            return None
+        design = self.design(grid)
+        leverage = np.clip(np.einsum("ij,jk,ik->i", design, self.inverse, design), 0, None)
+        half = stats.t.ppf(0.5 + level / 200, self.dof) * np.sqrt(self.variance * leverage)
+        return np.vstack([yhat - half, yhat + half])
+
+    # Coefficients of the fitted polynomial in x itself, constant term first
+    def coefficients(self):
+        polynomial = np.polynomial.Polynomial(self.beta)(np.polynomial.Polynomial([-self.centre / self.scale, 1 / self.scale]))
+        coefficients = np.pad(polynomial.coef, (0, self.order + 1 - len(polynomial.coef)))
+        coefficients[0] += self.offset
+        return coefficients
+
+# Fits of every group of the `by` columns, found by the digest of a group's x then y values in row order
+class GroupedFits:
+    def __init__(self, fits, digests, keys, counts, r_squared):
+        self.fits, self.keys, self.counts, self.r_squared = fits, keys, counts, r_squared
+        self.by_digest = dict(zip(digests, fits))
+        self.lengths = set(counts.tolist())
+        self.nbytes = 1024 * len(fits)
+
+    def find(self, x, y):
+        if len(x) not in self.lengths:
+            return None
+        return self.by_digest.get(values_digest(np.concatenate([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])))
+
+    # One row per group: its keys, size, coefficients in x, residual standard deviation and R squared
+    def table(self):
+        fits = self.fits
+        table = self.keys.copy()
+        table["n"] = self.counts
+        for power in range(fits[0].order + 1 if fits else 0):
+            table["intercept" if power == 0 else "x" if power == 1 else f"x^{power}"] = [fit.coefficients()[power] for fit in fits]
+        table["residual sd"] = [np.sqrt(fit.variance) for fit in fits]
+        table["r2"] = self.r_squared
+        return table
+
+# Seaborn's own fit of one group (np.polyfit on x itself), for groups the grouped pass cannot solve reliably;
+# it has no band, so the plotter lets seaborn draw these groups
+def polyfit_group(x, y, order):
+    dof = len(x) - (order + 1)
+    if not len(x):
+        return GroupFit(0.0, 1.0, 0.0, np.full(order + 1, np.nan), None, np.nan, dof), np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        coefficients = np.polyfit(x, y, order)
+    residuals = y - np.polyval(coefficients, x)
+    rss, tss = residuals @ residuals, np.sum((y - y.mean()) ** 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return GroupFit(0.0, 1.0, 0.0, coefficients[::-1], None, rss / dof if dof > 0 else np.nan, dof), 1 - rss / tss
+
+# Least-squares polynomial fits of y on x for every group in one vectorized pass: per-group power sums give each
+# group's X'X (a Hankel matrix of sum(u^(i+j))) and X'y, and all groups are solved as one stack. Each group is
+# centred and scaled by its own mean and standard deviation, which keeps the power sums well conditioned; groups
+# whose X'X is still ill-conditioned (too few distinct x values for the order) are fitted by seaborn instead
+def fit_groups(data, x, y, by=(), order=1):
+    order = int(order)
+    xs = pd.to_numeric(data[x], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    ys = pd.to_numeric(data[y], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    if by:
+        grouped = data.groupby(list(by), sort=False, observed=True, dropna=True)
+        codes = grouped.ngroup().to_numpy(dtype=float, na_value=-1).astype(np.int64)
+        keys = grouped.size().index.to_frame(index=False)
+    else:
+        codes, keys = np.zeros(len(xs), dtype=np.int64), pd.DataFrame(index=range(1))
+    keep = (codes >= 0) & np.isfinite(xs) & np.isfinite(ys)
+    xs, ys, codes = xs[keep], ys[keep], codes[keep]
+    n_groups = len(keys)
+    counts = np.bincount(codes, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centre = np.nan_to_num(np.bincount(codes, xs, minlength=n_groups) / counts)
+        offset = np.nan_to_num(np.bincount(codes, ys, minlength=n_groups) / counts)
+        deviations = xs - centre[codes]
+        spread = np.sqrt(np.bincount(codes, deviations * deviations, minlength=n_groups) / counts)
+    scale = np.where(spread > 0, spread, 1.0)
+    u, centred = deviations / scale[codes], ys - offset[codes]
+    powers = np.ones_like(u)
+    moments, cross = [], []
+    for power in range(2 * order + 1):
+        moments.append(np.bincount(codes, powers, minlength=n_groups))
+        if power <= order:
+            cross.append(np.bincount(codes, powers * centred, minlength=n_groups))
+        powers = powers * u
+    moments, cross = np.stack(moments, axis=1), np.stack(cross, axis=1)
+    squares = np.bincount(codes, centred * centred, minlength=n_groups)
+    index = np.add.outer(np.arange(order + 1), np.arange(order + 1))
+    xtx = moments[:, index]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stable = (counts > order) & (np.linalg.cond(xtx) < FIT_CONDITION)
+    inverse = np.full_like(xtx, np.nan)
+    inverse[stable] = np.linalg.inv(xtx[stable])
+    beta = np.einsum("gij,gj->gi", inverse, cross)
+    dof = counts - (order + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rss = np.clip(squares - np.einsum("gi,gi->g", beta, cross), 0, None)
+        variance = np.where(dof > 0, rss / dof, np.nan)
+        r_squared = 1 - rss / (squares - cross[:, 0] ** 2 / counts)
+    order_rows = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order_rows], np.arange(n_groups + 1))
+    fits, digests = [], []
+    for group in range(n_groups):
+        rows = order_rows[bounds[group]:bounds[group + 1]]
+        digests.append(values_digest(np.concatenate([xs[rows], ys[rows]])))
+        if stable[group]:
+            fits.append(GroupFit(centre[group], scale[group], offset[group], beta[group], inverse[group], variance[group], dof[group]))
+        else:
+            fit, r_squared[group] = polyfit_group(xs[rows], ys[rows], order)
+            fits.append(fit)
+    return GroupedFits(fits, digests, keys, counts, r_squared)
+
+# Cached fit_groups
+def grouped_fits(data, x, y, by=(), order=1):
+    by = [column for column in dict.fromkeys(by) if column is not None]
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return fit_groups(data, x, y, by, order)
+    key = content_hash(fingerprint.encode(), x=x, y=y, by=by, order=int(order))
+    return FIT_CACHE.get_or_compute(key, lambda: fit_groups(data, x, y, by, order))
+
+# Half-width of each anchor's neighbourhood: the distance to the farthest of its k nearest values in sorted xs.
+# The k nearest always form a contiguous window, whose start is found for every anchor at once by binary search
+def knn_bandwidth(xs, anchors, k):
+    n = len(xs)
+    lo = np.clip(np.searchsorted(xs, anchors) - k, 0, n - k)
+    hi = np.clip(np.searchsorted(xs, anchors), 0, n - k)
+    while np.any(lo < hi):
+        mid = (lo + hi) // 2
+        # Sliding the window right pays off while its next value is nearer than its first
+        slide = (mid + k < n) & (anchors - xs[mid] > xs[np.minimum(mid + k, n - 1)] - anchors)
+        lo, hi = np.where(slide, mid + 1, lo), np.where(slide, hi, mid)
+    return np.maximum(anchors - xs[lo], xs[lo + k - 1] - anchors)
+
+# Tricube weight of every (anchor, centre) pair for the anchors' bandwidths
+def tricube(anchors, bandwidths, centres):
+    distance = np.abs(centres[None, :] - anchors[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = np.where(distance == 0, 0.0, distance / bandwidths[:, None])
+    return (1 - np.clip(scaled, 0, 1) ** 3) ** 3
+
+# Local linear fit at every anchor from kernel-weighted sums of (w, wx, wx^2, wy, wxy), shifted to the anchor first
+def local_linear(anchors, sums):
+    s0, sx, sxx, sy, sxy = sums.T
+    s1 = sx - anchors * s0
+    s2 = sxx - 2 * anchors * sx + anchors ** 2 * s0
+    t1 = sxy - anchors * sy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        det = s0 * s2 - s1 ** 2
+        # A window of tied x values has no slope, only a weighted mean
+        return np.where(det > 1e-10 * s0 * s2, (s2 * sy - s1 * t1) / det, sy / s0)
+
+# LOWESS curve at its anchors; values in between are interpolated
+class LowessFit:
+    def __init__(self, anchors, fitted):
+        self.anchors, self.fitted = anchors, fitted
+        self.nbytes = anchors.nbytes + fitted.nbytes
+
+    def predict(self, x):
+        return np.interp(np.asarray(x, dtype=float), self.anchors, self.fitted)
+
+# LOWESS with statsmodels' definition (tricube weights over the frac * n nearest values, local linear fits,
+# `it` bisquare robustness passes) computed in two stages: the curve is fitted only at a bounded set of anchors,
+# from per-bin sums of the sorted data, and interpolated in between, including for the residuals that set the
+# robustness weights. Each pass costs O(n + anchors * bins). anchors=None and bins=None give the exact smoother
+def smooth_lowess(x, y, frac=2 / 3, it=3, anchors=LOWESS_ANCHORS, bins=LOWESS_BINS):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    order = np.argsort(x[keep], kind="stable")
+    xs, ys = x[keep][order], y[keep][order]
+    n = len(xs)
+    if n == 0:
+        return LowessFit(np.array([]), np.array([]))
+    # Centring keeps the per-bin power sums well conditioned
+    centre = (xs[0] + xs[-1]) / 2
+    xs = xs - centre
+    k = min(max(int(frac * n + 1e-10), 2), n)
+    if anchors is None or n <= anchors:
+        points = np.unique(xs)
+    else:
+        # Half the anchors follow the data's quantiles, half are evenly spaced so sparse stretches are covered too
+        ranks = np.linspace(0, n - 1, anchors // 2).round().astype(np.int64)
+        points = np.unique(np.concatenate([xs[ranks], np.linspace(xs[0], xs[-1], anchors - anchors // 2)]))
+    bandwidths = knn_bandwidth(xs, points, k)
+    if bins is None or n <= bins or xs[-1] == xs[0]:
+        codes, centres = np.arange(n), xs
+    else:
+        codes = np.minimum(((xs - xs[0]) * (bins / (xs[-1] - xs[0]))).astype(np.int64), bins - 1)
+        occupied = np.bincount(codes, minlength=bins) > 0
+        codes = (np.cumsum(occupied) - 1)[codes]
+        # Each bin stands at the mean of its values, which keeps the kernel weights close to the per-value ones
+        centres = np.bincount(codes, xs) / np.bincount(codes)
+    kernel = tricube(points, bandwidths, centres)
+    weights = np.ones(n)
+    for iteration in range(it + 1):
+        wx, wy = weights * xs, weights * ys
+        sums = np.stack([np.bincount(codes, values, minlength=len(centres)) for values in (weights, wx, wx * xs, wy, wy * xs)], axis=1)
+        fitted = local_linear(points, kernel @ sums)
+        valid = np.isfinite(fitted)
+        if iteration == it:
+            break
+        residuals = ys - np.interp(xs, points[valid], fitted[valid])
+        scale = np.median(np.abs(residuals))
+        if not scale > 0:
+            break
+        weights = np.clip(1 - (residuals / (6 * scale)) ** 2, 0, None) ** 2
+    return LowessFit(points[valid] + centre, fitted[valid])
+
+# Cached smooth_lowess, keyed by the digest of the x then y values
+def lowess_fit(x, y, frac=2 / 3, it=3):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    key = content_hash(values_digest(np.concatenate([x, y])).encode(), frac=frac, it=it, anchors=LOWESS_ANCHORS, bins=LOWESS_BINS)
+    return FIT_CACHE.get_or_compute(key, lambda: smooth_lowess(x, y, frac, it))
+
+# Binned LOWESS against the exact smoother on a sample. The sample is binned as coarsely as the full data would be
+# binned relative to its own size at most, so the reported error errs on the pessimistic side
+def lowess_accuracy(x, y, frac=2 / 3, it=3, sample=2000, seed=0):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    keep = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(keep) > sample:
+        keep = np.random.default_rng(seed).choice(keep, sample, replace=False)
+    x, y = x[keep], y[keep]
+    spread = y.std() if len(y) > 1 else 0.0
+    if not spread > 0 or np.ptp(x) == 0:
+        return None
+    anchors, bins = min(LOWESS_ANCHORS, len(x) // 4), min(LOWESS_BINS, len(x) // 4)
+    exact = smooth_lowess(x, y, frac, it, anchors=None, bins=None)
+    binned = smooth_lowess(x, y, frac, it, anchors, bins)
+    error = np.abs(binned.predict(exact.anchors) - exact.fitted) / spread
+    return {"rows": len(x), "anchors": anchors, "bins": bins, "max_error": float(error.max()), "mean_error": float(error.mean())}
+
+# One-line accuracy note shown under a plot drawn with the binned smoother
+def lowess_accuracy_caption(x, y, frac=2 / 3, it=3):
+    accuracy = lowess_accuracy(x, y, frac, it)
+    if accuracy is None:
+        return "Binned LOWESS: accuracy could not be checked (too few or constant values)."
+    return f"Binned LOWESS: on a {accuracy['rows']:,}-row sample ({accuracy['anchors']:,} anchors, {accuracy['bins']:,} bins) it deviates from the exact smoother by at most {accuracy['max_error']:.2%} of the standard deviation of y (mean {accuracy['mean_error']:.3%})."
+
+_analytic = threading.local()
+
+# True while the current thread draws with analytic_ci; other sessions keep seaborn's bootstrap
+def analytic_ci_enabled():
+    return getattr(_analytic, "enabled", False)
+
+_lowess = threading.local()
+
+# True while the current thread draws with binned_lowess; other sessions keep statsmodels' smoother
+def binned_lowess_enabled():
+    return getattr(_lowess, "enabled", False)
+
+# Seaborn's regression plotter with the ordinary and polynomial least-squares bands computed in closed form.
+# Logistic, lowess, robust, log-x and unit-resampled fits keep seaborn's own path, except that lowess
+# uses the binned smoother (which needs no statsmodels) while binned_lowess is on
+class AnalyticRegressionPlotter(_RegressionPlotter):
+    def _check_statsmodels(self):
+        lowess = self.lowess
+        self.lowess = lowess and not binned_lowess_enabled()
+        try:
+            super()._check_statsmodels()
+        finally:
+            self.lowess = lowess
+
+    def fit_lowess(self):
+        if not binned_lowess_enabled():
+            return super().fit_lowess()
+        fit = lowess_fit(self.x, self.y)
+        return fit.anchors, fit.fitted
+
+    def fit_regression(self, ax=None, x_range=None, grid=None):
+        if not analytic_ci_enabled() or self.ci is None or self.units is not None or self.logistic or self.lowess or self.robust or self.logx:
+            return super().fit_regression(ax, x_range, grid)
+        fits = getattr(_analytic, "fits", None)
+        fit = fits.find(self.x, self.y) if fits is not None else None
+        # Groups the grouped pass could not solve reliably are fitted by seaborn
+        if fit is not None and fit.order == self.order and fit.inverse is None:
+            return super().fit_regression(ax, x_range, grid)
+        if grid is None:
+            if self.truncate:
+                x_min, x_max = self.x_range
+            else:
+                x_min, x_max = x_range if ax is None else ax.get_xlim()
+            grid = np.linspace(x_min, x_max, 100)
+        if fit is None or fit.order != self.order:
+            fit = PolynomialFit(self.x, self.y, self.order)
+        return grid, fit.predict(grid), fit.band(grid, self.ci)
+
+# Wrap a seaborn regression function so its confidence bands are analytic (and it caches under its own name);
+# the plotter is swapped in only for the duration of the call
+def analytic_ci(plot):
+    @functools.wraps(plot)
+    def analytic(*args, **kwargs):
+        enabled = analytic_ci_enabled()
+        _analytic.enabled = True
+        try:
+            with patched(seaborn.regression, "_RegressionPlotter", AnalyticRegressionPlotter):
+                return plot(*args, **kwargs)
+        finally:
+            _analytic.enabled = enabled
+    analytic.__name__ = f"analytic_{plot.__name__}"
+    return analytic
+
+analytic_regplot = analytic_ci(seaborn.regression.regplot)
+analytic_lmplot = analytic_ci(seaborn.regression.lmplot)
+
+# Wrap a seaborn regression function so lowess=True uses the binned smoother (and it caches under its own name);
+# the plotter is swapped in only for the duration of the call
+def binned_lowess(plot):
+    @functools.wraps(plot)
+    def binned(*args, **kwargs):
+        enabled = binned_lowess_enabled()
+        _lowess.enabled = True
+        try:
+            with patched(seaborn.regression, "_RegressionPlotter", AnalyticRegressionPlotter):
+                return plot(*args, **kwargs)
+        finally:
+            _lowess.enabled = enabled
+    binned.__name__ = f"lowess_{plot.__name__}"
+    return binned
+
+lowess_regplot = binned_lowess(seaborn.regression.regplot)
+lowess_residplot = binned_lowess(seaborn.regression.residplot)
+
+# lmplot whose per-facet regressions all come from one grouped fit of every (hue, row, col) group
+def grouped_lmplot(data=None, x=None, y=None, hue=None, col=None, row=None, order=1, **kwargs):
+    fits = getattr(_analytic, "fits", None)
+    _analytic.fits = grouped_fits(data, x, y, [hue, row, col], order)
+    try:
+        return analytic_lmplot(data=data, x=x, y=y, hue=hue, col=col, row=row, order=order, **kwargs)
+    finally:
+        _analytic.fits = fits
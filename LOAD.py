@@ -0,0 +1,537 @@
+import html
+import io
+import os
+import re
+import threading
+import time
+import warnings
+import zipfile
+from collections import namedtuple
+from xml.etree import ElementTree
+import streamlit as st
+import pandas as pd
+import numpy as np
+import chardet
+from CACHE import DiskCache, LRUCache, content_hash, env_megabytes, feather, stamp_fingerprint, stamped_fingerprint
+from STATS import QuantileSketch, StreamingHistogram, ValueCounter
+
+# Parsed datasets shared across reruns and sessions, keyed by upload content
+DATASET_CACHE_BYTES = env_megabytes("EDA_DATASET_CACHE_MB", 1024)
+DATASET_CACHE = LRUCache(DATASET_CACHE_BYTES, name="datasets")
+# Parsed datasets kept on disk across restarts and sessions
+DISK_CACHE = DiskCache(os.environ.get("EDA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "statistical-eda")), env_megabytes("EDA_DISK_CACHE_MB", 4096))
+
+EXCEL_TYPES = ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel")
+
+# Outcome of an encoding detection, including how much work it took
+EncodingResult = namedtuple("EncodingResult", ["encoding", "confidence", "bytes_examined", "seconds", "mode"])
+
+# Function to pick the byte ranges inspected by sampled detection: a prefix plus evenly spaced windows
+def sample_windows(size, prefix_bytes, window_bytes, windows):
+    if size <= prefix_bytes + windows * window_bytes:
+        return [(0, size)]
+    spans = [(0, prefix_bytes)]
+    step = (size - prefix_bytes) // windows
+    for i in range(windows):
+        start = prefix_bytes + i * step + (step - window_bytes) // 2
+        spans.append((start, start + window_bytes))
+    return spans
+
+# Function to detect file encoding
+def detect_encoding(file, mode="sampled", prefix_bytes=64 * 1024, window_bytes=16 * 1024, windows=4, min_confidence=0.95):
+    start_time = time.perf_counter()
+    raw_data = file.getbuffer()
+    if mode == "full":
+        spans = [(0, len(raw_data))]
+    else:
+        spans = sample_windows(len(raw_data), prefix_bytes, window_bytes, windows)
+    sample = bytearray()
+    result = {"encoding": None, "confidence": 0.0}
+    for start, end in spans:
+        sample += raw_data[start:end]
+        result = chardet.detect(sample)
+        # Pure ASCII so far says nothing about the rest of the file, so keep sampling
+        if result["encoding"] not in (None, "ascii") and result["confidence"] >= min_confidence:
+            break
+    del raw_data
+    encoding = result["encoding"]
+    # ASCII is a subset of UTF-8, which also survives non-ASCII rows the samples missed
+    if encoding is None or encoding == "ascii":
+        encoding = "utf-8"
+    return EncodingResult(encoding, result["confidence"], len(sample), time.perf_counter() - start_time, mode)
+
+# Uploads at least this large are parsed with the multithreaded Arrow engine when the engine is "auto"
+AUTO_ENGINE_BYTES = 32 * 1024 * 1024
+CSV_ENGINES = ["auto", "c", "pyarrow"]
+
+# Function to resolve the "auto" engine from the upload size
+def resolve_engine(engine, size):
+    if engine == "auto":
+        return "pyarrow" if feather is not None and size >= AUTO_ENGINE_BYTES else "c"
+    return engine
+
+# Function to read uploaded file into a DataFrame
+def read_file(file, encoding, engine="c", usecols=None, nrows=None):
+    try:
+        file.seek(0)
+        if file.type in EXCEL_TYPES:
+            df = pd.read_excel(file, usecols=usecols, nrows=nrows)
+        elif engine == "pyarrow" and nrows is None:
+            # Arrow parses on all cores and keeps its columnar buffers as pandas ArrowDtype columns
+            df = pd.read_csv(file, encoding=encoding, engine="pyarrow", dtype_backend="pyarrow", usecols=usecols)
+        else:
+            df = pd.read_csv(file, encoding=encoding, usecols=usecols, nrows=nrows)
+        return df
+    except UnicodeDecodeError:
+        # Let the caller retry with an encoding from a full scan
+        raise
+    except Exception as e:
+        st.error(f"Error reading file: {e}")
+        return None
+
+# Function to read only the column names of an upload, once per file
+def read_columns(file):
+    headers = st.session_state.setdefault('upload_columns', {})
+    if file.file_id not in headers:
+        headers[file.file_id] = read_header(file)
+    return headers[file.file_id]
+
+def read_header(file):
+    try:
+        if file.type in EXCEL_TYPES:
+            file.seek(0)
+            return list(pd.read_excel(file, nrows=0).columns)
+        def parse(encoding):
+            file.seek(0)
+            return list(pd.read_csv(file, encoding=encoding, nrows=0).columns)
+        return parse_with_detection(file, parse)
+    except Exception:
+        return []
+
+# Function to run a parser with the sampled encoding, falling back to a full scan only when decoding fails
+def parse_with_detection(file, parse):
+    detection = detect_encoding(file)
+    try:
+        result = parse(detection.encoding)
+    except UnicodeDecodeError:
+        failed_encoding = detection.encoding
+        detection = detect_encoding(file, mode="full")
+        # A full scan that repeats the failing guess leaves latin-1, which decodes any byte
+        if detection.encoding == failed_encoding:
+            detection = detection._replace(encoding="latin-1")
+        result = parse(detection.encoding)
+    st.session_state['encoding_detection'] = detection
+    return result
+
+# Function to parse an upload into a DataFrame
+def read_upload(file, engine="c", usecols=None, nrows=None):
+    if file.type in EXCEL_TYPES:
+        return read_file(file, None, usecols=usecols, nrows=nrows)
+    try:
+        return parse_with_detection(file, lambda encoding: read_file(file, encoding, engine, usecols, nrows))
+    except UnicodeDecodeError as e:
+        st.error(f"Error reading file: {e}")
+        return None
+
+# Function to hash an upload once per file and combine the digest with the read options
+def upload_key(file, **read_options):
+    hashes = st.session_state.setdefault('upload_hashes', {})
+    if file.file_id not in hashes:
+        hashes[file.file_id] = content_hash(file.getbuffer())
+    return content_hash(hashes[file.file_id].encode("ascii"), **read_options)
+
+# Function to pick the smallest nullable integer dtype that holds a range of values
+def nullable_int_dtype(low, high):
+    for dtype in ("Int8", "Int16", "Int32", "Int64"):
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None
+
+# Function to convert one column to a cheaper dtype without losing information
+def compact_column(series, max_category_ratio=0.5, max_categories=1000, parse_dates=True):
+    # Arrow-backed columns are already stored compactly in columnar buffers
+    if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, (pd.CategoricalDtype, pd.ArrowDtype)):
+        return series
+    if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy()
+        finite = values[~np.isnan(values)]
+        if len(finite) and np.all(np.isfinite(finite)) and np.all(finite == np.round(finite)):
+            dtype = nullable_int_dtype(finite.min(), finite.max())
+            if dtype is not None:
+                # Integral floats with gaps become nullable integers; without gaps, plain integers
+                if len(finite) == len(values):
+                    return pd.to_numeric(series.astype("int64"), downcast="integer")
+                return series.astype(dtype)
+        narrowed = series.astype("float32")
+        if np.array_equal(narrowed.to_numpy(dtype="float64"), values, equal_nan=True):
+            return narrowed
+        return series
+    if not (series.dtype == object or pd.api.types.is_string_dtype(series.dtype)):
+        return series
+    non_null = series.dropna()
+    if len(non_null) == 0:
+        return series
+    if parse_dates:
+        sample = non_null.iloc[:1000]
+        with warnings.catch_warnings():
+            # Text that is not a date makes pandas fall back to per-element parsing and warn
+            warnings.simplefilter("ignore", UserWarning)
+            if sample.map(lambda value: isinstance(value, str)).all() and pd.to_datetime(sample, errors="coerce").notna().all():
+                parsed = pd.to_datetime(series, errors="coerce")
+                if parsed.notna().sum() == len(non_null):
+                    return parsed
+    distinct = non_null.nunique()
+    if distinct <= max_categories and distinct <= max_category_ratio * len(series):
+        return series.astype("category")
+    return series
+
+# Function to shrink column dtypes, returning the new frame and a per-column memory report
+def compact_dtypes(df, max_category_ratio=0.5, max_categories=1000, parse_dates=True):
+    columns = {}
+    report = []
+    for name in df.columns:
+        before = df[name]
+        after = compact_column(before, max_category_ratio, max_categories, parse_dates)
+        columns[name] = after
+        report.append({"column": name, "dtype before": str(before.dtype), "dtype after": str(after.dtype), "bytes before": int(before.memory_usage(index=False, deep=True)), "bytes after": int(after.memory_usage(index=False, deep=True))})
+    compacted = pd.DataFrame(columns, index=df.index)
+    compacted.attrs = df.attrs
+    return compacted, pd.DataFrame(report)
+
+# Function to return the parsed DataFrame for an upload, parsing only when neither cache has it
+def load_dataset(file, compact=False, engine="c", usecols=None):
+    engine = resolve_engine(engine, file.size)
+    usecols = list(usecols) if usecols else None
+    key = upload_key(file, file_type=file.type, compact=compact, engine=engine, usecols=tuple(usecols) if usecols else None)
+    report_key = key + "-compaction"
+    df = DATASET_CACHE.get(key)
+    if df is None:
+        df = DISK_CACHE.get(key)
+        if df is not None:
+            if compact:
+                DATASET_CACHE.put(report_key, DISK_CACHE.get(report_key))
+        else:
+            df = read_upload(file, engine, usecols)
+            if df is None:
+                return None
+            if compact:
+                df, report = compact_dtypes(df)
+                DATASET_CACHE.put(report_key, report)
+                DISK_CACHE.put(report_key, report)
+            DISK_CACHE.put(key, df)
+        DATASET_CACHE.put(key, df)
+    if compact:
+        st.session_state['compaction_report'] = DATASET_CACHE.get(report_key)
+    return stamp_fingerprint(df, key)
+
+# Built-in spreadsheet number formats that display dates or times
+EXCEL_DATE_FORMATS = set(range(14, 23)) | set(range(27, 37)) | set(range(45, 48)) | set(range(50, 59))
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_CELL = re.compile(rb'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+
+# Function to turn a zero-based column index into spreadsheet letters (0 -> A, 26 -> AA)
+def excel_letter(index):
+    letters = b""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = bytes([65 + remainder]) + letters
+    return letters
+
+# Reads selected columns of the first worksheet of an .xlsx straight from its XML, skipping every other cell
+class XlsxColumnReader:
+    def __init__(self, raw):
+        self.raw = raw
+        with zipfile.ZipFile(io.BytesIO(raw)) as archive:
+            self.sheet_path = self._first_sheet(archive)
+            self.shared_strings = self._shared_strings(archive)
+            self.date_styles = self._date_styles(archive)
+            sheet = archive.read(self.sheet_path)
+        # Cells without an explicit reference or with prefixed tags are left to pandas
+        if b'<c r="' not in sheet:
+            raise ValueError("Unsupported worksheet layout")
+        first_row = re.search(rb'<row r="(\d+)"[^>]*>(.*?)</row>', sheet, re.S)
+        last_row = sheet.rfind(b'<row r="')
+        self.header_row = int(first_row.group(1))
+        self.last_row = int(re.match(rb'<row r="(\d+)"', sheet[last_row:]).group(1))
+        self.letters = {}
+        for letter, _, attrs, body in XLSX_CELL.findall(first_row.group(2)):
+            self.letters[self._value(attrs, body)] = letter
+        # Blank, duplicated or gapped headers get renamed by pandas, so those sheets are left to it
+        expected = [excel_letter(index) for index in range(len(self.letters))]
+        if None in self.letters or list(self.letters.values()) != expected:
+            raise ValueError("Unsupported header row")
+
+    @property
+    def columns(self):
+        return list(self.letters)
+
+    def _first_sheet(self, archive):
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        sheet = workbook.find(f"{XLSX_NS}sheets/{XLSX_NS}sheet")
+        rel_id = sheet.get("{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id")
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        for rel in rels:
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target").lstrip("/")
+                return target if target.startswith("xl/") else f"xl/{target}"
+        return "xl/worksheets/sheet1.xml"
+
+    def _shared_strings(self, archive):
+        if "xl/sharedStrings.xml" not in archive.namelist():
+            return []
+        root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+        return ["".join(text.text or "" for text in item.iter(f"{XLSX_NS}t")) for item in root.iter(f"{XLSX_NS}si")]
+
+    def _date_styles(self, archive):
+        if "xl/styles.xml" not in archive.namelist():
+            return set()
+        root = ElementTree.fromstring(archive.read("xl/styles.xml"))
+        custom = set()
+        for fmt in root.iter(f"{XLSX_NS}numFmt"):
+            code = re.sub(r'"[^"]*"|\[[^\]]*\]', "", fmt.get("formatCode", "")).lower()
+            if any(token in code for token in ("y", "d", "h", "ss")) or re.search(r"(^|[^a-z])m+([^a-z]|$)", code):
+                custom.add(int(fmt.get("numFmtId")))
+        cell_xfs = root.find(f"{XLSX_NS}cellXfs")
+        if cell_xfs is None:
+            return set()
+        return {index for index, xf in enumerate(cell_xfs) if int(xf.get("numFmtId", 0)) in EXCEL_DATE_FORMATS | custom}
+
+    def _value(self, attrs, body):
+        kind = re.search(rb'\bt="(\w+)"', attrs)
+        kind = kind.group(1) if kind else b"n"
+        if kind == b"inlineStr":
+            # Empty strings read as missing, matching pandas' default na_values
+            return html.unescape("".join(text.decode("utf-8") for text in re.findall(rb"<t[^>]*>(.*?)</t>", body or b"", re.S))) or None
+        raw_value = re.search(rb"<v>(.*?)</v>", body or b"", re.S)
+        if raw_value is None:
+            return None
+        raw_value = raw_value.group(1)
+        if kind == b"s":
+            return self.shared_strings[int(raw_value)] or None
+        if kind in (b"str", b"d"):
+            return html.unescape(raw_value.decode("utf-8")) or None
+        if kind == b"b":
+            return raw_value == b"1"
+        if kind == b"e":
+            return None
+        number = float(raw_value)
+        style = re.search(rb'\bs="(\d+)"', attrs)
+        if style and int(style.group(1)) in self.date_styles:
+            # Serial dates are rounded to milliseconds, as openpyxl does
+            day, fraction = divmod(number, 1)
+            return pd.Timestamp("1899-12-30") + pd.Timedelta(days=day, milliseconds=round(fraction * 86400000))
+        return int(number) if number.is_integer() and b"." not in raw_value and b"E" not in raw_value.upper() else number
+
+    # Leading rows of every column, parsed from the start of the sheet only
+    def sample(self, rows):
+        with zipfile.ZipFile(io.BytesIO(self.raw)) as archive:
+            with archive.open(self.sheet_path) as handle:
+                head = b""
+                marker = f'<row r="{self.header_row + rows + 1}"'.encode("ascii")
+                while marker not in head and len(head) < 64 * 1024 * 1024:
+                    chunk = handle.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    head += chunk
+        end = head.find(marker)
+        head = head if end < 0 else head[:end]
+        names = {letter: name for name, letter in self.letters.items()}
+        data = {name: [None] * rows for name in self.letters}
+        for letter, row, attrs, body in XLSX_CELL.findall(head):
+            position = int(row) - self.header_row - 1
+            if letter in names and 0 <= position < rows:
+                data[names[letter]][position] = self._value(attrs, body)
+        rows = min(rows, self.last_row - self.header_row)
+        return pd.DataFrame({name: pd.Series(values[:rows], dtype=object).infer_objects() for name, values in data.items()})
+
+    def read(self, columns):
+        with zipfile.ZipFile(io.BytesIO(self.raw)) as archive:
+            sheet = archive.read(self.sheet_path)
+        rows = self.last_row - self.header_row
+        data = {}
+        for name in columns:
+            # One anchored pattern per column lets the regex engine skip straight past unrelated cells
+            pattern = re.compile(rb'<c r="' + self.letters[name] + rb'(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+            values = [None] * rows
+            for row, attrs, body in pattern.findall(sheet):
+                position = int(row) - self.header_row - 1
+                if 0 <= position < rows:
+                    values[position] = self._value(attrs, body)
+            data[name] = pd.Series(values, dtype=object).infer_objects()
+        return pd.DataFrame(data)
+
+# Stand-in for a DataFrame that reads each column from the upload only when a plot first needs it
+class LazyDataset:
+    def __init__(self, read_columns, columns, sample, fingerprint=None):
+        self.columns = pd.Index(columns)
+        self.fingerprint = fingerprint
+        self._read_columns = read_columns
+        self._sample = sample
+        self._loaded = pd.DataFrame()
+        self._lock = threading.Lock()
+
+    @property
+    def loaded_columns(self):
+        return list(self._loaded.columns)
+
+    @property
+    def dtypes(self):
+        return self._sample.dtypes
+
+    @property
+    def nbytes(self):
+        return int(self._loaded.memory_usage(index=True, deep=True).sum() + self._sample.memory_usage(index=True, deep=True).sum())
+
+    def select(self, columns):
+        columns = list(dict.fromkeys(columns))
+        with self._lock:
+            missing = [name for name in columns if name not in self._loaded.columns]
+            if missing:
+                frame = self._read_columns(missing)
+                self._loaded = frame if len(self._loaded.columns) == 0 else pd.concat([self._loaded, frame], axis=1)
+            return self._loaded[columns]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.select([key])[key]
+        return self.select(list(key))
+
+    def __len__(self):
+        return len(self.select(self.columns[:1]))
+
+    def head(self, n=5):
+        return self._sample.head(n)
+
+    # Column types are inferred from the leading sample rows
+    def select_dtypes(self, include=None, exclude=None):
+        return self._sample.select_dtypes(include=include, exclude=exclude)
+
+# Function to narrow a dataset to the columns a plot uses, reading them first if the dataset is lazy
+def project(dataset, *columns):
+    names = []
+    for column in columns:
+        if column is None:
+            continue
+        if isinstance(column, str):
+            names.append(column)
+        else:
+            names.extend(column)
+    names = list(dict.fromkeys(names))
+    if isinstance(dataset, LazyDataset):
+        frame, fingerprint = dataset.select(names), dataset.fingerprint
+    else:
+        frame, fingerprint = dataset[names], stamped_fingerprint(dataset)
+    if fingerprint is None:
+        return frame
+    return stamp_fingerprint(frame, content_hash(fingerprint.encode(), columns=names))
+
+# Function to return a lazily loaded dataset for an upload; columns are parsed as plots request them
+def load_lazy(file, compact=False, engine="c", sample_rows=200):
+    engine = resolve_engine(engine, file.size)
+    key = upload_key(file, file_type=file.type, compact=compact, engine=engine, lazy=True)
+    dataset = DATASET_CACHE.get(key)
+    if dataset is None:
+        reader = None
+        if file.type == EXCEL_TYPES[0]:
+            try:
+                reader = XlsxColumnReader(file.getvalue())
+            except Exception:
+                reader = None
+        sample = reader.sample(sample_rows) if reader is not None else read_upload(file, "c", nrows=sample_rows)
+        if sample is None:
+            return None
+        def read_columns(columns):
+            if reader is not None:
+                frame = reader.read(columns)
+            else:
+                frame = read_upload(file, engine, columns)
+            if frame is None:
+                raise ValueError(f"Could not read columns {columns}")
+            return compact_dtypes(frame)[0] if compact else frame
+        dataset = LazyDataset(read_columns, list(sample.columns), sample, fingerprint=key)
+    st.session_state.pop('compaction_report', None)
+    # Re-inserting refreshes the cache's size accounting as more columns get loaded
+    DATASET_CACHE.put(key, dataset)
+    return dataset
+
+# Running aggregates for one column of a streamed CSV
+class ColumnProfile:
+    def __init__(self, name, bins=64, sketch_k=200, max_categories=1000):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.numeric = True
+        self.min = None
+        self.max = None
+        self.histogram = StreamingHistogram(bins)
+        self.sketch = QuantileSketch(sketch_k)
+        self.value_counts = ValueCounter(max_categories)
+
+    def update(self, series):
+        non_null = series.dropna()
+        self.count += len(non_null)
+        self.nulls += len(series) - len(non_null)
+        self.value_counts.update(non_null)
+        # A column stops being numeric as soon as one chunk holds anything else
+        if self.numeric and not (pd.api.types.is_numeric_dtype(non_null) and not pd.api.types.is_bool_dtype(non_null)):
+            self.numeric = len(non_null) == 0
+        if self.numeric and len(non_null):
+            values = non_null.to_numpy(dtype=float)
+            self.min = values.min() if self.min is None else min(self.min, values.min())
+            self.max = values.max() if self.max is None else max(self.max, values.max())
+            self.histogram.update(values)
+            self.sketch.update(values)
+        return self
+
+# Aggregates for every column of a CSV read in a single streaming pass
+class DatasetProfile:
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+    @property
+    def numeric_columns(self):
+        return [name for name, column in self.columns.items() if column.numeric and column.count]
+
+    @property
+    def nbytes(self):
+        return sum(column.histogram.counts.nbytes + column.sketch.nbytes + column.value_counts.counts.memory_usage(deep=True) for column in self.columns.values())
+
+    def summary(self):
+        rows = []
+        for name, column in self.columns.items():
+            median = column.sketch.quantile(0.5) if column.numeric and column.count else None
+            rows.append({"column": name, "count": column.count, "nulls": column.nulls, "numeric": column.numeric, "min": column.min, "median": median, "max": column.max, "distinct (top)": len(column.value_counts.counts)})
+        return pd.DataFrame(rows)
+
+# Function to build per-column aggregates from a CSV in bounded memory, one chunk at a time
+def stream_profile(source, encoding=None, chunksize=100_000, bins=64, sketch_k=200, max_categories=1000):
+    columns = {}
+    rows = 0
+    for chunk in pd.read_csv(source, encoding=encoding, chunksize=chunksize):
+        rows += len(chunk)
+        for name in chunk.columns:
+            if name not in columns:
+                columns[name] = ColumnProfile(name, bins, sketch_k, max_categories)
+            columns[name].update(chunk[name])
+    return DatasetProfile(rows, columns)
+
+# Function to return the streamed profile for an upload, streaming only on a cache miss
+def load_profile(file, chunksize=100_000):
+    key = upload_key(file, file_type=file.type, mode="stream", chunksize=chunksize)
+    profile = DATASET_CACHE.get(key)
+    if profile is None:
+        def parse(encoding):
+            file.seek(0)
+            return stream_profile(file, encoding, chunksize)
+        try:
+            profile = parse_with_detection(file, parse)
+        except Exception as e:
+            st.error(f"Error reading file: {e}")
+            return None
+        DATASET_CACHE.put(key, profile, profile.nbytes)
+    return profile
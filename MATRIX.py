@@ -0,0 +1,212 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import seaborn.matrix
+from scipy import special
+from scipy.cluster import hierarchy
+from scipy.spatial.distance import cdist
+from scipy.stats import rankdata
+from CACHE import LRUCache, content_hash, env_megabytes, frame_fingerprint, stamp_fingerprint
+
+CORRELATION_METHODS = ["pearson", "spearman", "kendall"]
+# Correlation and pairwise-count matrices shared by every session, so heatmap and clustermap reuse one computation
+CORRELATION_CACHE = LRUCache(env_megabytes("EDA_CORRELATION_CACHE_MB", 128), "correlation")
+CORRELATION_WORKERS = int(os.environ.get("EDA_CORRELATION_WORKERS", os.cpu_count() or 1))
+# Linkage matrices and representative-row frames of clustermaps, so cosmetic changes only redraw
+LINKAGE_CACHE = LRUCache(env_megabytes("EDA_LINKAGE_CACHE_MB", 64), "linkage")
+# Row count above which the raw-data clustermap defaults to clustering representative rows
+CLUSTER_ROWS = int(os.environ.get("EDA_CLUSTER_ROWS", 5000))
+CLUSTER_SAMPLE = 1000
+# Columns per block of the blocked paths; one block pair is one task for the thread pool
+CORRELATION_BLOCK = 256
+# Standard error factors of Fisher's z for each method (Fieller, Hartley and Pearson 1957)
+FISHER_VARIANCE = {"pearson": (1.0, 3), "spearman": (1.06, 3), "kendall": (0.437, 4)}
+
+# Upper-triangle block pairs of k columns
+def column_blocks(k, size=CORRELATION_BLOCK):
+    starts = range(0, k, size)
+    return [(slice(i, min(i + size, k)), slice(j, min(j + size, k))) for i in starts for j in starts if j >= i]
+
+# Run one task per block pair on the thread pool (numpy's matrix products release the GIL) and assemble the matrix
+def blocked(compute, k, workers=None):
+    result = np.empty((k, k))
+    blocks = column_blocks(k)
+    workers = min(workers or CORRELATION_WORKERS, len(blocks))
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            parts = list(pool.map(lambda block: compute(*block), blocks))
+    else:
+        parts = [compute(*block) for block in blocks]
+    for (rows, cols), part in zip(blocks, parts):
+        result[rows, cols] = part
+        result[cols, rows] = part.T
+    return result
+
+# Pearson correlation of complete columns: one centred matrix product
+def complete_pearson(values):
+    centred = values - values.mean(axis=0)
+    scale = np.sqrt(np.einsum("ij,ij->j", centred, centred))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (centred.T @ centred) / np.outer(scale, scale)
+
+# Pairwise-complete Pearson correlation from masked matrix products: every sum a pair needs, over the rows
+# where both columns are present, is a product of the zero-filled values (or their squares) with the mask
+def masked_pearson(values, present, workers=None):
+    # Centring on each column's own mean first keeps the one-pass sums from cancelling
+    filled = np.where(present, values - np.nanmean(values, axis=0), 0.0)
+    squares = filled * filled
+    mask = present.astype(float)
+    def compute(rows, cols):
+        count = mask[:, rows].T @ mask[:, cols]
+        sum_x, sum_y = filled[:, rows].T @ mask[:, cols], mask[:, rows].T @ filled[:, cols]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = filled[:, rows].T @ filled[:, cols] - sum_x * sum_y / count
+            variance_x = squares[:, rows].T @ mask[:, cols] - sum_x * sum_x / count
+            variance_y = mask[:, rows].T @ squares[:, cols] - sum_y * sum_y / count
+            return covariance / np.sqrt(variance_x * variance_y)
+    return blocked(compute, values.shape[1], workers)
+
+# Spearman with missing values and Kendall need pandas' per-pair ranking; it runs block pair by block pair
+def pandas_correlation(frame, method, workers=None):
+    def compute(rows, cols):
+        index = np.arange(frame.shape[1])
+        columns = np.union1d(index[rows], index[cols])
+        matrix = frame.iloc[:, columns].corr(method=method).to_numpy()
+        return matrix[np.ix_(np.searchsorted(columns, index[rows]), np.searchsorted(columns, index[cols]))]
+    return blocked(compute, frame.shape[1], workers)
+
+# Correlation matrix and pairwise non-null counts of the numeric columns of `data`
+def compute_correlation(data, method="pearson", min_periods=1, workers=None):
+    values = data.to_numpy(dtype=float, na_value=np.nan)
+    present = ~np.isnan(values)
+    complete = bool(present.all())
+    mask = present.astype(float)
+    counts = np.full((values.shape[1], values.shape[1]), float(len(values))) if complete else mask.T @ mask
+    if method == "pearson":
+        corr = complete_pearson(values) if complete else masked_pearson(values, present, workers)
+    elif method == "spearman" and complete:
+        corr = complete_pearson(rankdata(values, axis=0))
+    else:
+        corr = pandas_correlation(pd.DataFrame(values), method, workers)
+    corr = np.clip(corr, -1, 1)
+    # Like pandas: a column correlates perfectly with itself unless it is constant, and sparse pairs are undefined
+    diagonal = np.diagonal(corr).copy()
+    np.fill_diagonal(corr, np.where(np.isnan(diagonal), np.nan, 1.0))
+    corr[counts < max(min_periods, 1)] = np.nan
+    return pd.DataFrame(corr, index=data.columns, columns=data.columns), pd.DataFrame(counts.astype(np.int64), index=data.columns, columns=data.columns)
+
+# Cached compute_correlation: (correlation, pairwise counts), stamped so plots never rehash them
+def correlation_matrix(data, method="pearson", min_periods=1):
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return compute_correlation(data, method, min_periods)
+    key = content_hash(fingerprint.encode(), columns=list(data.columns), method=method, min_periods=min_periods)
+    def compute():
+        corr, counts = compute_correlation(data, method, min_periods)
+        return stamp_fingerprint(corr, key), stamp_fingerprint(counts, content_hash(key.encode(), part="counts"))
+    return CORRELATION_CACHE.get_or_compute(key, compute, nbytes=16 * data.shape[1] ** 2)
+
+# Two-sided p-values of every correlation in closed form: Student's t for Pearson and Spearman (as scipy's
+# pearsonr and spearmanr), the normal approximation without tie correction for Kendall
+def correlation_pvalues(corr, counts, method="pearson"):
+    r = corr.to_numpy(dtype=float)
+    n = counts.to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if method == "kendall":
+            z = 3 * r * np.sqrt(n * (n - 1)) / np.sqrt(2 * (2 * n + 5))
+            p = special.erfc(np.abs(z) / np.sqrt(2))
+        else:
+            df = n - 2
+            # P(|T| > t) for t = r * sqrt(df / (1 - r^2)) is the incomplete beta function at df / (df + t^2) = 1 - r^2
+            p = special.betainc(df / 2, 0.5, np.clip(1 - r * r, 0, 1))
+            p[df <= 0] = np.nan
+    p[np.isnan(r)] = np.nan
+    return pd.DataFrame(p, index=corr.index, columns=corr.columns)
+
+# Fisher-z confidence bounds of every correlation at `level`
+def correlation_intervals(corr, counts, method="pearson", level=0.95):
+    factor, offset = FISHER_VARIANCE[method]
+    r = corr.to_numpy(dtype=float)
+    n = counts.to_numpy(dtype=float)
+    critical = special.ndtri(0.5 + level / 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.arctanh(np.clip(r, -1, 1))
+        spread = critical * np.sqrt(factor / (n - offset))
+        spread[n <= offset] = np.nan
+        lower, upper = np.tanh(z - spread), np.tanh(z + spread)
+    return pd.DataFrame(lower, index=corr.index, columns=corr.columns), pd.DataFrame(upper, index=corr.index, columns=corr.columns)
+
+SIGNIFICANCE_VIEWS = ["correlation", "p-value", "ci lower", "ci upper"]
+
+# The heatmap's companion matrix: correlations, p-values or confidence bounds, with the cells whose p-value
+# exceeds `alpha` blanked (seaborn leaves NaN cells empty) when alpha is given
+def significance_view(corr, counts, method="pearson", view="correlation", level=0.95, alpha=None):
+    pvalues = correlation_pvalues(corr, counts, method) if view == "p-value" or alpha is not None else None
+    if view == "p-value":
+        matrix = pvalues
+    elif view in ("ci lower", "ci upper"):
+        matrix = correlation_intervals(corr, counts, method, level)[view == "ci upper"]
+    else:
+        matrix = corr.copy()
+    if alpha is not None:
+        matrix = matrix.mask(~(pvalues <= alpha))
+    fingerprint = frame_fingerprint(corr)
+    if fingerprint is None:
+        return matrix
+    return stamp_fingerprint(matrix, content_hash(fingerprint.encode(), method=method, view=view, level=level, alpha=alpha))
+
+# The matrix clustermap clusters: seaborn's z-scoring or standard scaling applied to `data`
+def clustermap_data(data, z_score=None, standard_scale=None):
+    if z_score is not None:
+        return seaborn.matrix.ClusterGrid.z_score(data, z_score)
+    if standard_scale is not None:
+        return seaborn.matrix.ClusterGrid.standard_scale(data, standard_scale)
+    return data
+
+# Linkage of the rows (axis 0) or columns (axis 1) of `data` after normalization, computed as seaborn does
+# and cached under everything it depends on
+def linkage_matrix(data, axis=0, method="average", metric="euclidean", z_score=None, standard_scale=None):
+    def compute():
+        values = clustermap_data(data, z_score, standard_scale).to_numpy()
+        return hierarchy.linkage(values if axis == 0 else values.T, method=method, metric=metric)
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return compute()
+    key = content_hash(fingerprint.encode(), axis=axis, method=method, metric=metric, z_score=z_score, standard_scale=standard_scale)
+    return LINKAGE_CACHE.get_or_compute(key, compute)
+
+# clustermap drawn with cached linkages; takes the same arguments as seaborn's
+def linked_clustermap(data=None, method="average", metric="euclidean", z_score=None, standard_scale=None, row_cluster=True, col_cluster=True, **kwargs):
+    linkages = {
+        "row_linkage": linkage_matrix(data, 0, method, metric, z_score, standard_scale) if row_cluster else None,
+        "col_linkage": linkage_matrix(data, 1, method, metric, z_score, standard_scale) if col_cluster else None,
+    }
+    return seaborn.matrix.clustermap(data, method=method, metric=metric, z_score=z_score, standard_scale=standard_scale,
+                                     row_cluster=row_cluster, col_cluster=col_cluster, **linkages, **kwargs)
+
+# Rows too many to cluster pairwise, reduced to `n_samples` sampled representatives: every row joins its nearest
+# representative under `metric` (chunk by chunk, never forming the full distance matrix) and each group is drawn
+# as its mean row, labelled with its size. Normalization happens first, on the full rows
+def representative_rows(data, n_samples=CLUSTER_SAMPLE, metric="euclidean", z_score=None, standard_scale=None, seed=0):
+    def compute():
+        normalized = clustermap_data(data, z_score, standard_scale)
+        values = normalized.to_numpy(dtype=float)
+        rng = np.random.default_rng(seed)
+        samples = np.sort(rng.choice(len(values), min(n_samples, len(values)), replace=False))
+        representatives = values[samples]
+        labels = np.empty(len(values), dtype=np.int64)
+        chunk = max(1, (1 << 22) // len(samples))
+        for start in range(0, len(values), chunk):
+            labels[start:start + chunk] = cdist(values[start:start + chunk], representatives, metric=metric).argmin(axis=1)
+        sizes = np.bincount(labels, minlength=len(samples))
+        sums = np.stack([np.bincount(labels, values[:, column], minlength=len(samples)) for column in range(values.shape[1])], axis=1)
+        used = sizes > 0
+        index = [f"{label} ({size:,} rows)" for label, size in zip(normalized.index[samples][used], sizes[used])]
+        frame = pd.DataFrame(sums[used] / sizes[used, None], index=index, columns=normalized.columns)
+        return stamp_fingerprint(frame, key) if key is not None else frame
+    fingerprint = frame_fingerprint(data)
+    key = None if fingerprint is None else content_hash(fingerprint.encode(), n_samples=n_samples, metric=metric, z_score=z_score, standard_scale=standard_scale, seed=seed)
+    if key is None:
+        return compute()
+    return LINKAGE_CACHE.get_or_compute(key, compute)
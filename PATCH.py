@@ -0,0 +1,41 @@
+import threading
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+# (module name, attribute) -> (original value, {replacement: blocks using it})
+_patches = {}
+
+# The replacement to install among those in use: a class that extends all the others, else the first one requested
+def _installed(replacements):
+    for candidate in replacements:
+        if all(candidate is other or (isinstance(candidate, type) and isinstance(other, type) and issubclass(candidate, other)) for other in replacements):
+            return candidate
+    return next(iter(replacements))
+
+# Replace owner.name (a private seaborn or matplotlib hook, looked up when a plot is drawn) with `replacement`
+# while the block runs. Overlapping blocks, from nested wrappers or other threads, share one installation, and the
+# original is back once the last of them exits. Other threads draw with the replacement meanwhile, so it must
+# behave like the original unless the calling thread has switched it on
+@contextmanager
+def patched(owner, name, replacement):
+    key = (owner.__name__, name)
+    with _lock:
+        if key not in _patches:
+            if not hasattr(owner, name):
+                raise AttributeError(f"{owner.__name__}.{name} does not exist in this version, so it cannot be patched")
+            _patches[key] = (getattr(owner, name), {})
+        original, users = _patches[key]
+        users[replacement] = users.get(replacement, 0) + 1
+        setattr(owner, name, _installed(users))
+    try:
+        yield
+    finally:
+        with _lock:
+            users[replacement] -= 1
+            if not users[replacement]:
+                del users[replacement]
+            if users:
+                setattr(owner, name, _installed(users))
+            else:
+                setattr(owner, name, original)
+                del _patches[key]
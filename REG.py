@@ -1,7 +1,12 @@
 import streamlit as st
 import seaborn as sns
-import matplotlib.pyplot as plt
 import pandas as pd
+from LOAD import project
+from RENDER import render_plot, show_stored_plot
+from STATS import BIN2D_AGGREGATIONS, binned_matrix
+from FIT import CI_METHODS, PolynomialFit, analytic_regplot, grouped_fits, grouped_lmplot, lowess_accuracy_caption, lowess_regplot, lowess_residplot
+from FACET import FACET_ROWS, FACET_WORKERS, facet_caption, parallel_facets, reset_facet_stats
+from MATRIX import CLUSTER_ROWS, CLUSTER_SAMPLE, CORRELATION_METHODS, SIGNIFICANCE_VIEWS, correlation_matrix, linked_clustermap, representative_rows, significance_view
 
 def show_lmplot(dataset):
     st.title("Seaborn LMPlot Customizer")
@@ -33,12 +38,17 @@ def show_lmplot(dataset):
                 row_var = st.selectbox("Row variable", options=dataset.columns, help="Variable for row faceting")
                 row_order = st.multiselect("Row order", options=sorted(dataset[row_var].unique()) if use_row and row_var in dataset.columns else [], help="Order of rows")
             else:
-                row_var, row_order = None, None           
+                row_var, row_order = None, None
+            if use_col or use_row:
+                parallel = st.checkbox("Parallel facets", len(dataset) >= FACET_ROWS and FACET_WORKERS > 1, help=f"Draw and rasterize each facet in one of {FACET_WORKERS} worker processes, then composite the panels")
+            else:
+                parallel = False
             # Regression parameters
             st.subheader("Regression Parameters")
             fit_reg = st.checkbox("Fit regression", True, help="Estimate and plot regression model")
             if fit_reg:
                 ci = st.slider("Confidence interval", 0, 100, 95, help="Size of confidence interval for regression")
+                ci_method = st.selectbox("CI method", options=CI_METHODS, index=0, help="Closed-form least-squares band, or seaborn's bootstrap of the fit")
                 order = st.number_input("Polynomial order", min_value=1, value=1, help="Degree of polynomial regression")
                 logistic = st.checkbox("Logistic regression", False, help="Fit logistic regression model")
                 lowess = st.checkbox("LOWESS regression", False, help="Fit locally weighted regression")
@@ -63,17 +73,21 @@ def show_lmplot(dataset):
             if plot_button:
                 st.subheader("Generated LMPlot")
                 try:
-                    g = sns.lmplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,col=col_var if use_col else None,row=row_var if use_row else None,palette=palette if use_hue else None,col_wrap=col_wrap,height=height,aspect=aspect,markers=markers,hue_order=hue_order if use_hue and hue_order else None,col_order=col_order if use_col and col_order else None,row_order=row_order if use_row and row_order else None,legend=legend,x_estimator=x_estimator if scatter and x_estimator else None,x_bins=x_bins if scatter and x_bins else None,scatter=scatter,fit_reg=fit_reg,ci=ci if fit_reg else None,order=order if fit_reg else None,logistic=logistic if fit_reg else False,lowess=lowess if fit_reg else False,robust=robust if fit_reg else False,logx=logx if fit_reg else False,truncate=truncate if fit_reg else True,x_jitter=x_jitter if scatter else None,y_jitter=y_jitter if scatter else None)
-                    st.pyplot(g)
-                    st.session_state['last_lmplot'] = g
+                    data = project(dataset, x_var, y_var, hue_var, col_var, row_var)
+                    # Plain least-squares fits of every (hue, row, col) group come from one grouped pass
+                    grouped = fit_reg and ci_method == "analytic" and not (logistic or lowess or robust or logx)
+                    lmplot = grouped_lmplot if grouped else sns.lmplot
+                    reset_facet_stats()
+                    render_plot('last_lmplot', parallel_facets(lmplot) if parallel else lmplot, data=data,x=x_var,y=y_var,hue=hue_var if use_hue else None,col=col_var if use_col else None,row=row_var if use_row else None,palette=palette if use_hue else None,col_wrap=col_wrap,height=height,aspect=aspect,markers=markers,hue_order=hue_order if use_hue and hue_order else None,col_order=col_order if use_col and col_order else None,row_order=row_order if use_row and row_order else None,legend=legend,x_estimator=x_estimator if scatter and x_estimator else None,x_bins=x_bins if scatter and x_bins else None,scatter=scatter,fit_reg=fit_reg,ci=ci if fit_reg else None,order=order if fit_reg else None,logistic=logistic if fit_reg else False,lowess=lowess if fit_reg else False,robust=robust if fit_reg else False,logx=logx if fit_reg else False,truncate=truncate if fit_reg else True,x_jitter=x_jitter if scatter else None,y_jitter=y_jitter if scatter else None)
+                    if parallel:
+                        st.caption(facet_caption())
+                    if grouped:
+                        st.dataframe(grouped_fits(data, x_var, y_var, [hue_var if use_hue else None, row_var if use_row else None, col_var if use_col else None], order).table(), hide_index=True)
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_lmplot' in st.session_state:
-            st.pyplot(st.session_state['last_lmplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_lmplot')
 def show_regplot(dataset):
     st.title("Seaborn RegPlot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -98,10 +112,13 @@ def show_regplot(dataset):
             fit_reg = st.checkbox("Fit regression", True, help="Estimate and plot regression model")
             if fit_reg:
                 ci = st.slider("Confidence interval", 0, 100, 95, help="Size of confidence interval for regression")
+                ci_method = st.selectbox("CI method", options=CI_METHODS, index=0, help="Closed-form least-squares band, or seaborn's bootstrap of the fit")
                 n_boot = st.number_input("Bootstrap samples", min_value=1, value=1000, help="Number of bootstrap resamples")
+                seed = st.number_input("Bootstrap seed", min_value=0, value=0, help="Seed for bootstrap resampling; a fixed seed makes error bars reproducible and cacheable")
                 order = st.number_input("Polynomial order", min_value=1, value=1, help="Degree of polynomial regression")
                 logistic = st.checkbox("Logistic regression", False, help="Fit logistic regression model")
                 lowess = st.checkbox("LOWESS regression", False, help="Fit locally weighted regression")
+                binned = st.checkbox("Binned LOWESS", True, help="Fit the smoother at a bounded set of anchors from binned sums and interpolate; needs no statsmodels") if lowess else False
                 robust = st.checkbox("Robust regression", False, help="Fit robust to outliers regression")
                 logx = st.checkbox("Log-x regression", False, help="Fit y~log(x) regression")
                 truncate = st.checkbox("Truncate regression", True, help="Limit regression to data range")
@@ -111,18 +128,17 @@ def show_regplot(dataset):
             if plot_button:
                 st.subheader("Generated RegPlot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.regplot(data=dataset,x=x_var,y=y_var,x_estimator=x_estimator if scatter and x_estimator else None,x_bins=x_bins if scatter and x_bins else None,scatter=scatter,fit_reg=fit_reg,ci=ci if fit_reg else None,n_boot=n_boot if fit_reg else None,order=order if fit_reg else None,logistic=logistic if fit_reg else False,lowess=lowess if fit_reg else False,robust=robust if fit_reg else False,logx=logx if fit_reg else False,truncate=truncate if fit_reg else True,dropna=dropna,x_jitter=x_jitter if scatter else None,y_jitter=y_jitter if scatter else None,color=color if scatter else None,marker=marker if scatter else None,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_regplot'] = fig
+                    binned = fit_reg and binned
+                    data = project(dataset, x_var, y_var)
+                    render_plot('last_regplot', lowess_regplot if binned else analytic_regplot if fit_reg and ci_method == "analytic" else sns.regplot, data=data,x=x_var,y=y_var,x_estimator=x_estimator if scatter and x_estimator else None,x_bins=x_bins if scatter and x_bins else None,scatter=scatter,fit_reg=fit_reg,ci=ci if fit_reg else None,n_boot=n_boot if fit_reg else None,seed=seed if fit_reg else None,order=order if fit_reg else 1,logistic=logistic if fit_reg else False,lowess=lowess if fit_reg else False,robust=robust if fit_reg else False,logx=logx if fit_reg else False,truncate=truncate if fit_reg else True,dropna=dropna if fit_reg else True,x_jitter=x_jitter if scatter else None,y_jitter=y_jitter if scatter else None,color=color if scatter else None,marker=marker if scatter else None)
+                    if binned:
+                        values = data[[x_var, y_var]].apply(pd.to_numeric, errors="coerce").dropna()
+                        st.caption(lowess_accuracy_caption(values[x_var], values[y_var]))
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}") 
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_regplot' in st.session_state:
-            st.pyplot(st.session_state['last_regplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_regplot')
 def show_residplot(dataset):
     st.title("Seaborn ResidPlot Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -135,6 +151,7 @@ def show_residplot(dataset):
             # Residual plot parameters
             st.subheader("Residual Plot Parameters")
             lowess = st.checkbox("LOWESS smoother", False, help="Fit a lowess smoother to residuals")
+            binned = st.checkbox("Binned LOWESS", True, help="Fit the smoother at a bounded set of anchors from binned sums and interpolate; needs no statsmodels") if lowess else False
             order = st.number_input("Polynomial order", min_value=1, value=1, help="Order of polynomial regression for residuals")
             robust = st.checkbox("Robust regression", False, help="Use robust linear regression")
             dropna = st.checkbox("Drop NA values", True, help="Remove missing values before fitting")
@@ -156,18 +173,18 @@ def show_residplot(dataset):
             if plot_button:
                 st.subheader("Generated ResidPlot")
                 try:
-                    fig, ax = plt.subplots()
-                    sns.residplot(data=dataset,x=x_var,y=y_var,x_partial=x_partial if use_x_partial else None,y_partial=y_partial if use_y_partial else None,lowess=lowess,order=order,robust=robust,dropna=dropna,color=color,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_residplot'] = fig
+                    data = project(dataset, x_var, y_var, x_partial, y_partial)
+                    render_plot('last_residplot', lowess_residplot if binned else sns.residplot, data=data,x=x_var,y=y_var,x_partial=x_partial if use_x_partial else None,y_partial=y_partial if use_y_partial else None,lowess=lowess,order=order,robust=robust,dropna=dropna,color=color)
+                    # The accuracy check smooths the residuals of the same polynomial fit; partialled-out fits are not reproduced
+                    if binned and not (use_x_partial or use_y_partial):
+                        values = data[[x_var, y_var]].apply(pd.to_numeric, errors="coerce").dropna()
+                        residuals = values[y_var] - PolynomialFit(values[x_var], values[y_var], order).predict(values[x_var])
+                        st.caption(lowess_accuracy_caption(values[x_var], residuals))
                 except Exception as e:
                     st.error(f"Error generating plot: {str(e)}")    
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_residplot' in st.session_state:
-            st.pyplot(st.session_state['last_residplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_residplot')
 def show_heatmap(dataset):
     st.title("Seaborn Heatmap Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -186,9 +203,23 @@ def show_heatmap(dataset):
             if not use_corr:
                 x_var = st.selectbox("X-axis variable", options=numeric_cols, index=0)
                 y_var = st.selectbox("Y-axis variable", options=numeric_cols, index=1)
-                data = dataset.pivot_table(index=y_var, columns=x_var, aggfunc='size', fill_value=0)
+                aggregation = st.selectbox("Aggregation", options=BIN2D_AGGREGATIONS, index=0, help="Statistic of each (x, y) cell")
+                value_var = st.selectbox("Value variable", options=numeric_cols, index=min(2, len(numeric_cols) - 1), help="Variable aggregated in each cell") if aggregation != "count" else None
+                quantile = st.slider("Quantile", 0.0, 1.0, 0.5, help="Quantile of the values in each cell") if aggregation == "quantile" else 0.5
+                x_bins = st.text_input("X-axis bins", value="auto", help="Number of bins, or 'auto'; axes with no more distinct values than that keep one cell per value")
+                y_bins = st.text_input("Y-axis bins", value="auto", help="Number of bins, or 'auto'; axes with no more distinct values than that keep one cell per value")
+                x_bins = int(x_bins) if x_bins.isdigit() else "auto"
+                y_bins = int(y_bins) if y_bins.isdigit() else "auto"
+                data = binned_matrix(project(dataset, x_var, y_var, value_var), x_var, y_var, value_var, x_bins, y_bins, aggregation, quantile)
             else:
-                data = dataset[numeric_cols].corr()
+                method = st.selectbox("Correlation method", options=CORRELATION_METHODS, index=0, help="Pairwise-complete correlation of every pair of numeric columns")
+                corr, counts = correlation_matrix(project(dataset, numeric_cols), method=method)
+                # Significance parameters
+                view = st.selectbox("Matrix shown", options=SIGNIFICANCE_VIEWS, index=0, help="Correlations, their two-sided p-values or Fisher-z confidence bounds")
+                level = st.slider("Confidence level", 0.80, 0.99, 0.95, help="Coverage of the confidence bounds")
+                mask_insignificant = st.checkbox("Hide non-significant cells", False, help="Blank cells whose p-value exceeds the significance level")
+                alpha = st.number_input("Significance level", min_value=0.0001, max_value=0.5, value=0.05, format="%.4f") if mask_insignificant else None
+                data = significance_view(corr, counts, method, view, level, alpha)
             # Color parameters
             st.subheader("Color Parameters")
             cmap = st.selectbox("Colormap", options=["viridis", "coolwarm", "Spectral", "YlOrRd", "Blues"], index=1)
@@ -221,18 +252,14 @@ def show_heatmap(dataset):
             if plot_button:
                 st.subheader("Generated Heatmap")
                 try:
-                    fig, ax = plt.subplots(figsize=(10, 8))
-                    sns.heatmap(data=data,vmin=vmin,vmax=vmax,cmap=cmap,center=center,robust=robust,annot=annot,fmt=fmt,annot_kws=annot_kws,linewidths=linewidths,linecolor=linecolor,cbar=cbar,square=square,xticklabels=xticklabels,yticklabels=yticklabels,ax=ax)
-                    st.pyplot(fig)
-                    st.session_state['last_heatmap'] = fig
+                    render_plot('last_heatmap', sns.heatmap, figsize=(10, 8), data=data,vmin=vmin,vmax=vmax,cmap=cmap,center=center,robust=robust,annot=annot,fmt=fmt,annot_kws=annot_kws,linewidths=linewidths,linecolor=linecolor,cbar=cbar,square=square,xticklabels=xticklabels,yticklabels=yticklabels)
+                    if use_corr:
+                        st.caption(f"{method.capitalize()} correlations over pairwise-complete rows: {int(counts.values.min()):,} to {int(counts.values.max()):,} rows per pair.")
                 except Exception as e:
                     st.error(f"Error generating heatmap: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Heatmap")
-        if 'last_heatmap' in st.session_state:
-            st.pyplot(st.session_state['last_heatmap'])
-        else:
-            st.info("No heatmap generated yet. Please create one in the 'Implement Plots' tab.")
+        show_stored_plot('last_heatmap')
 def show_clustermap(dataset):
     st.title("Seaborn ClusterMap Customizer")
     tab1, tab2 = st.tabs(["Implement Plots", "See Plots"])
@@ -249,9 +276,13 @@ def show_clustermap(dataset):
             st.subheader("Data Parameters")
             use_corr = st.checkbox("Use correlation matrix", True, help="Plot correlation matrix of numeric columns")
             if not use_corr:
-                data = dataset[numeric_cols]
+                data = project(dataset, numeric_cols)
+                represent = st.checkbox("Cluster representative rows", len(dataset) > CLUSTER_ROWS, help="Assign every row to the nearest of a sample of rows and cluster the sample's group means instead of all rows")
+                n_samples = st.number_input("Representative rows", min_value=10, value=CLUSTER_SAMPLE, help="Rows sampled as group representatives") if represent else None
             else:
-                data = dataset[numeric_cols].corr()
+                corr_method = st.selectbox("Correlation method", options=CORRELATION_METHODS, index=0, help="Pairwise-complete correlation of every pair of numeric columns")
+                data = correlation_matrix(project(dataset, numeric_cols), method=corr_method)[0]
+                represent = False
             # Clustering parameters
             st.subheader("Clustering Parameters")
             row_cluster = st.checkbox("Cluster rows", True)
@@ -288,14 +319,13 @@ def show_clustermap(dataset):
             if plot_button:
                 st.subheader("Generated ClusterMap")
                 try:
-                    g = sns.clustermap(data=data,method=method,metric=metric,z_score=z_score if z_score is not None else None,standard_scale=standard_scale if standard_scale is not None else None,figsize=(figsize, figsize),row_cluster=row_cluster,col_cluster=col_cluster,cmap=cmap,center=center,robust=robust,annot=annot,fmt=fmt,annot_kws=annot_kws,linewidths=linewidths,linecolor=linecolor,cbar=cbar)
-                    st.pyplot(g.fig)
-                    st.session_state['last_clustermap'] = g.fig
+                    # Representatives are normalized before they are averaged, so seaborn must not normalize again
+                    plot_data, z_score, standard_scale = (representative_rows(data, n_samples, metric, z_score, standard_scale), None, None) if represent else (data, z_score, standard_scale)
+                    render_plot('last_clustermap', linked_clustermap, data=plot_data,method=method,metric=metric,z_score=z_score if z_score is not None else None,standard_scale=standard_scale if standard_scale is not None else None,figsize=(figsize, figsize),row_cluster=row_cluster,col_cluster=col_cluster,cmap=cmap,center=center,robust=robust,annot=annot,fmt=fmt,annot_kws=annot_kws,linewidths=linewidths,linecolor=linecolor,cbar=cbar)
+                    if represent:
+                        st.caption(f"{len(data):,} rows assigned to {len(plot_data):,} sampled representatives by {metric} distance; each row of the map is one group's mean.")
                 except Exception as e:
                     st.error(f"Error generating clustermap: {str(e)}")
     with tab2:
         st.subheader("Previously Generated ClusterMap")
-        if 'last_clustermap' in st.session_state:
-            st.pyplot(st.session_state['last_clustermap'])
-        else:
-            st.info("No clustermap generated yet. Please create one in the 'Implement Plots' tab.")
+        show_stored_plot('last_clustermap')
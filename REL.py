@@ -1,7 +1,145 @@
+import os
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import numpy as np
 import pandas as pd
+from matplotlib.colors import LogNorm, Normalize
+from matplotlib.patches import Patch
+from LOAD import project
+from RENDER import render_plot, show_stored_plot
+from FACET import FACET_ROWS, FACET_WORKERS, facet_caption, parallel_facets, reset_facet_stats
+from STATS import LINE_ESTIMATORS, bootstrap_errorbar, downsample_lines, line_aggregate, line_rows, rasterize, zoomed_rows
+
+RASTER_ROWS = int(os.environ.get("EDA_RASTER_ROWS", 250_000))
+RASTER_MODES = ["auto", "on", "off"]
+RASTER_AGGREGATIONS = ["auto", "count", "mean", "categories"]
+MAX_RASTER_CATEGORIES = 24
+
+# Rasterized mode replaces per-point markers once a plot has more rows than the threshold
+def use_raster(mode, rows):
+    return mode == "on" or (mode == "auto" and rows > RASTER_ROWS)
+
+# Resolve "auto" aggregation from the hue column: mean for numbers, colour blending for categories
+def raster_aggregation(how, hue_values):
+    if how != "auto":
+        return how
+    if hue_values is None:
+        return "count"
+    if pd.api.types.is_numeric_dtype(hue_values) and not pd.api.types.is_bool_dtype(hue_values):
+        return "mean"
+    return "categories"
+
+# Hue levels to blend; without an explicit order the rarest levels are folded into "Other"
+def raster_hue_levels(values, hue_order=None):
+    if hue_order:
+        return values, list(hue_order)
+    levels = list(values.value_counts().index)
+    folded = len(levels) > MAX_RASTER_CATEGORIES
+    levels = levels[:MAX_RASTER_CATEGORIES - 1] if folded else levels
+    try:
+        levels = sorted(levels)
+    except TypeError:
+        pass
+    if not folded:
+        return values, levels
+    return values.astype(object).where(values.isin(levels) | values.isna(), "Other"), levels + ["Other"]
+
+# Function to pick a zoom range on a numeric or datetime x axis; None while the full range is selected
+def zoom_range(values, label):
+    values = values.dropna()
+    if pd.api.types.is_datetime64_any_dtype(values) and len(values):
+        low, high = values.min().to_pydatetime(), values.max().to_pydatetime()
+        step = max((high - low) / 1000, pd.Timedelta(seconds=1).to_pytimedelta())
+    elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values) and len(values):
+        low, high = (value.item() if hasattr(value, "item") else value for value in (values.min(), values.max()))
+        step = 1 if isinstance(low, int) else (high - low) / 1000
+    else:
+        return None
+    if low == high:
+        return None
+    selected = st.slider(f"Zoom range ({label})", min_value=low, max_value=high, value=(low, high), step=step, help="Only this part of the x axis is drawn; narrower ranges use finer levels of the pyramid")
+    return None if tuple(selected) == (low, high) else tuple(selected)
+
+# Function to place a column on a float axis; datetimes become Matplotlib date numbers
+def raster_axis(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return mdates.date2num(values.to_numpy(dtype="datetime64[ns]"))
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+# Scatterplot drawn as an image of per-pixel aggregates instead of one marker per row
+def rasterized_scatterplot(data, x, y, hue=None, how="auto", palette=None, hue_order=None, hue_norm=None, x_range=None, y_range=None, count_max=None, legend=True, ax=None):
+    ax = ax if ax is not None else plt.gca()
+    # One grid cell per screen pixel of the axes at the figure's dpi
+    bbox = ax.get_window_extent()
+    width, height = max(int(bbox.width), 1), max(int(bbox.height), 1)
+    xs, ys = raster_axis(data[x]), raster_axis(data[y])
+    hue_values = data[hue] if hue else None
+    how = raster_aggregation(how, hue_values)
+    if hue_values is None and how != "count":
+        raise ValueError(f"'{how}' aggregation needs a hue variable")
+    if how == "mean":
+        raster = rasterize(xs, ys, width, height, x_range, y_range, values=hue_values)
+        means = np.divide(raster.sums, raster.counts, out=np.full(raster.counts.shape, np.nan), where=raster.counts > 0)
+        image = ax.imshow(np.ma.masked_invalid(means), origin="lower", extent=raster.extent, aspect="auto", interpolation="nearest", cmap=palette or "viridis", norm=Normalize(*hue_norm) if hue_norm else None)
+        if legend:
+            ax.figure.colorbar(image, ax=ax, label=f"mean {hue}")
+    elif how == "categories":
+        values, levels = raster_hue_levels(hue_values, hue_order)
+        codes = pd.Categorical(values, categories=levels).codes
+        raster = rasterize(xs, ys, width, height, x_range, y_range, codes=codes, n_codes=len(levels))
+        colors = np.array(sns.color_palette(palette, len(levels)))
+        # Each pixel mixes the level colours by their share of its points; opacity grows with log density
+        totals = raster.counts
+        rgb = np.tensordot(raster.categories, colors, axes=(0, 0)) / np.maximum(totals, 1)[..., None]
+        alpha = np.where(totals > 0, 0.3 + 0.7 * np.log1p(totals) / np.log1p(max(totals.max(), 1)), 0.0)
+        ax.imshow(np.dstack([rgb, alpha]), origin="lower", extent=raster.extent, aspect="auto", interpolation="nearest")
+        if legend:
+            ax.legend(handles=[Patch(color=color, label=str(level)) for level, color in zip(levels, colors)], title=hue)
+    else:
+        raster = rasterize(xs, ys, width, height, x_range, y_range)
+        image = ax.imshow(np.ma.masked_equal(raster.counts, 0), origin="lower", extent=raster.extent, aspect="auto", interpolation="nearest", cmap=palette or "viridis", norm=LogNorm(vmin=1, vmax=count_max or max(raster.counts.max(), 1)))
+        if legend:
+            ax.figure.colorbar(image, ax=ax, label="count")
+    ax.set(xlabel=x, ylabel=y, xlim=raster.extent[:2], ylim=raster.extent[2:])
+    if pd.api.types.is_datetime64_any_dtype(data[x]):
+        ax.xaxis_date()
+    if pd.api.types.is_datetime64_any_dtype(data[y]):
+        ax.yaxis_date()
+    return ax
+
+# Faceted rasterized scatterplot sharing axis ranges, colour scales and hue levels across facets
+def rasterized_relplot(data, x, y, hue=None, how="auto", row=None, col=None, col_wrap=None, row_order=None, col_order=None, palette=None, hue_order=None, hue_norm=None, height=5, aspect=1, legend=True):
+    hue_values = data[hue] if hue else None
+    how = raster_aggregation(how, hue_values)
+    x_values, y_values = raster_axis(data[x]), raster_axis(data[y])
+    x_range, y_range = (np.nanmin(x_values), np.nanmax(x_values)), (np.nanmin(y_values), np.nanmax(y_values))
+    if how == "mean":
+        hue_norm = hue_norm or (float(hue_values.min()), float(hue_values.max()))
+    elif how == "categories":
+        values, hue_order = raster_hue_levels(hue_values, hue_order)
+        data = data.assign(**{hue: values})
+    g = sns.FacetGrid(data, row=row, col=col, col_wrap=col_wrap, row_order=row_order or None, col_order=col_order or None, height=height, aspect=aspect)
+    count_max = None
+    if how == "count":
+        # The densest pixel of the pooled data bounds every facet, so all facets share one colour scale
+        bbox = g.axes.flat[0].get_window_extent()
+        count_max = max(rasterize(x_values, y_values, max(int(bbox.width), 1), max(int(bbox.height), 1), x_range, y_range).counts.max(), 1)
+    for (row_i, col_j, _), subset in g.facet_data():
+        if len(subset):
+            rasterized_scatterplot(subset, x, y, hue=hue, how=how, palette=palette, hue_order=hue_order, hue_norm=hue_norm, x_range=x_range, y_range=y_range, count_max=count_max, legend=False, ax=g.facet_axis(row_i, col_j))
+    g.set_axis_labels(x, y)
+    g.set_titles()
+    if legend:
+        if how == "categories":
+            colors = sns.color_palette(palette, len(hue_order))
+            g.add_legend(legend_data={str(level): Patch(color=color) for level, color in zip(hue_order, colors)}, title=hue)
+        else:
+            images = [image for ax in g.axes.flat for image in ax.images]
+            if images:
+                g.figure.colorbar(images[0], ax=list(g.axes.flat), label="count" if how == "count" else f"mean {hue}")
+    return g
 
 def show_scatterplot(dataset):
     st.title("Seaborn Scatterplot Customizer")
@@ -45,25 +183,59 @@ def show_scatterplot(dataset):
                 style_var,markers,style_order = None,True,None         
             # Legend and other parameters
             legend_type = st.selectbox("Legend type",options=["auto", "brief", "full", False],index=0,help="How to draw the legend. 'brief' shows sample values, 'full' shows all")          
+            # Large data parameters
+            raster_mode = st.selectbox("Large data mode", options=RASTER_MODES, index=0, help=f"Bin points onto a pixel grid instead of drawing one marker each; 'auto' switches on above {RASTER_ROWS:,} rows")
+            raster_how = st.selectbox("Raster aggregation", options=RASTER_AGGREGATIONS, index=0, help="Points per pixel, mean of a numeric hue, or blended colours of hue categories; 'auto' picks from the hue")
             plot_button = st.button("Generate Plot",use_container_width=True,type='primary'),        
             with col2:
                 if plot_button:
                     st.subheader("Generated Scatterplot")    
                     try:
                         # Create the plot
-                        fig, ax = plt.subplots()
-                        sns.scatterplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,size=size_var if use_size else None,style=style_var if use_style else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,sizes=sizes if use_size else None,size_order=size_order if use_size and size_order else None,size_norm=size_norm if use_size and size_norm else None,markers=markers if use_style else True,style_order=style_order if use_style and style_order else None,legend=legend_type,ax=ax)                    
-                        st.pyplot(fig)        
-                        # Store the plot in session state for the See Plots tab
-                        st.session_state['last_plot'] = fig                 
+                        if use_raster(raster_mode, len(dataset)):
+                            render_plot('last_plot', rasterized_scatterplot, data=project(dataset, x_var, y_var, hue_var), x=x_var, y=y_var, hue=hue_var, how=raster_how, palette=palette, hue_order=hue_order or None, hue_norm=hue_norm, legend=legend_type is not False)
+                            st.caption(f"Rasterized {len(dataset):,} rows onto a pixel grid; size and style grouping are not drawn")
+                        else:
+                            render_plot('last_plot', sns.scatterplot, data=project(dataset, x_var, y_var, hue_var, size_var, style_var),x=x_var,y=y_var,hue=hue_var if use_hue else None,size=size_var if use_size else None,style=style_var if use_style else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,sizes=sizes if use_size else None,size_order=size_order if use_size and size_order else None,size_norm=size_norm if use_size and size_norm else None,markers=markers if use_style else True,style_order=style_order if use_style and style_order else None,legend=legend_type)        
                     except Exception as e:
                         st.error(f"Error generating plot: {str(e)}")  
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_plot' in st.session_state:
-            st.pyplot(st.session_state['last_plot'])
+        show_stored_plot('last_plot')
+
+# What the lineplot page hands seaborn: the rows, or each pre-aggregated point as three rows, downsampled inside the
+# zoom range when max_vertices is set; returns them with the estimator and errorbar that draw them, and a note on how
+# the rows were reduced (None when they were not)
+def line_plot_data(data, x, y, by, units=None, estimator="mean", errorbar=("ci", 95), n_boot=1000, seed=0, pre_aggregate=True, zoom=None, max_vertices=None):
+    plot_data, plot_estimator, plot_errorbar, note = data, estimator, bootstrap_errorbar(data, y, [x, *by], estimator, errorbar, n_boot, seed), None
+    # Units draw one line per sampling unit, so there is nothing to aggregate
+    if pre_aggregate and estimator in LINE_ESTIMATORS and not units:
+        summary = line_aggregate(data, x, y, by, estimator, errorbar, n_boot, seed)
+        points = len(summary)
+        if max_vertices:
+            sampled = downsample_lines(summary, x, y, by, zoom, max_vertices)
+            summary = sampled if sampled is not None else zoomed_rows(summary, x, zoom)
+        rows = line_rows(summary, y)
+        if rows is not None:
+            plot_data, plot_estimator, plot_errorbar = rows, "median", ("pi", 100) if errorbar else None
+            note = f"Aggregated {len(data):,} rows into {points:,} points, {len(summary):,} drawn"
+    elif max_vertices:
+        sampled = downsample_lines(data, x, y, [*by, units], zoom, max_vertices)
+        if sampled is not None:
+            plot_data = sampled
+            note = f"Drew {len(sampled):,} of {len(data):,} vertices"
         else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+            # Seaborn has to aggregate repeated x values, so only the zoom range can be applied
+            plot_data = zoomed_rows(data, x, zoom)
+            note = f"Not downsampled: some lines repeat x values, so all {len(plot_data):,} rows {'in the zoom range ' if zoom else ''}were drawn"
+    return plot_data, plot_estimator, plot_errorbar, note
+
+# Lineplot drawn as the lineplot page draws it by default, for callers outside the app
+def aggregated_lineplot(data=None, x=None, y=None, hue=None, size=None, style=None, units=None, estimator="mean", errorbar=("ci", 95), n_boot=1000, seed=0, pre_aggregate=True, zoom=None, max_vertices=2000, **kwargs):
+    errorbar = tuple(errorbar) if isinstance(errorbar, list) else errorbar
+    data = project(data, x, y, hue, size, style, units)
+    plot_data, plot_estimator, plot_errorbar, _ = line_plot_data(data, x, y, [hue, size, style], units, estimator, errorbar, n_boot, seed, pre_aggregate, zoom, max_vertices)
+    return sns.lineplot(data=plot_data, x=x, y=y, hue=hue, size=size, style=style, units=units, estimator=plot_estimator, errorbar=plot_errorbar, n_boot=n_boot, seed=seed, **kwargs)
 
 def show_lineplot(dataset):
     st.title("Seaborn Lineplot Customizer")
@@ -114,6 +286,15 @@ def show_lineplot(dataset):
                 errorbar_level = st.slider("Confidence interval level", 1, 99, 95, help="Confidence level for error bars (1-99)")
                 errorbar = (errorbar, errorbar_level)
             n_boot = st.number_input("Number of bootstraps", min_value=1, value=1000, help="Number of bootstraps for confidence interval calculation")
+            seed = st.number_input("Bootstrap seed", min_value=0, value=0, help="Seed for bootstrap resampling; a fixed seed makes error bars reproducible and cacheable")
+            pre_aggregate = st.checkbox("Pre-aggregate", value=True, help="Summarize each (x, hue, size, style) group in one pass and plot the summary; it is reused while only styling options change")
+            # Downsampling parameters
+            downsample = st.checkbox("Downsample long series", value=True, help="Draw each line with at most this many vertices, picked by Largest-Triangle-Three-Buckets from a precomputed resolution pyramid")
+            if downsample:
+                max_vertices = st.number_input("Max vertices per line", min_value=100, value=2000, step=100, help="Upper bound on the vertices drawn for each line inside the zoom range")
+                zoom = zoom_range(dataset[x_var], x_var)
+            else:
+                max_vertices, zoom = None, None
             sort = st.checkbox("Sort lines", value=True, help="Sort data by x and y variables before plotting")
             err_style = st.radio("Error style", options=['band', 'bars'], index=0, help="Style for drawing confidence intervals")
             legend_type = st.selectbox("Legend type", options=["auto", "brief", "full", False], index=0, help="How to draw the legend")          
@@ -123,19 +304,16 @@ def show_lineplot(dataset):
                     st.subheader("Generated Lineplot")    
                     try:
                         # Create the plot
-                        fig, ax = plt.subplots()
-                        sns.lineplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,size=size_var if use_size else None,style=style_var if use_style else None,units=units_var if units_var else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,sizes=sizes if use_size else None,size_order=size_order if use_size and size_order else None,size_norm=size_norm if use_size and size_norm else None,dashes=dashes if use_style else True,markers=markers if use_style else None,style_order=style_order if use_style and style_order else None,estimator=estimator,errorbar=errorbar,n_boot=n_boot,sort=sort,err_style=err_style,legend=legend_type,ax=ax)                    
-                        st.pyplot(fig)        
-                        # Store the plot in session state for the See Plots tab
-                        st.session_state['last_lineplot'] = fig                 
+                        data = project(dataset, x_var, y_var, hue_var, size_var, style_var, units_var)
+                        plot_data, plot_estimator, plot_errorbar, note = line_plot_data(data, x_var, y_var, [hue_var, size_var, style_var], units_var, estimator, errorbar, n_boot, seed, pre_aggregate, zoom, max_vertices)
+                        if note:
+                            st.caption(note)
+                        render_plot('last_lineplot', sns.lineplot, data=plot_data,x=x_var,y=y_var,hue=hue_var if use_hue else None,size=size_var if use_size else None,style=style_var if use_style else None,units=units_var if units_var else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,sizes=sizes if use_size else None,size_order=size_order if use_size and size_order else None,size_norm=size_norm if use_size and size_norm else None,dashes=dashes if use_style else True,markers=markers if use_style else None,style_order=style_order if use_style and style_order else None,estimator=plot_estimator,errorbar=plot_errorbar,n_boot=n_boot,seed=seed,sort=sort,err_style=err_style,legend=legend_type)        
                     except Exception as e:
                         st.error(f"Error generating plot: {str(e)}")  
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_lineplot' in st.session_state:
-            st.pyplot(st.session_state['last_lineplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_lineplot')
 
 def show_relplot(dataset):
     st.title("Seaborn Relplot Customizer")
@@ -188,26 +366,50 @@ def show_relplot(dataset):
                 col_wrap = st.number_input("Columns per row", min_value=1, value=3, help="Wrap column facets at this width") if col_var else None
                 row_order = st.multiselect("Row order", options=sorted(dataset[row_var].unique()), help="Order to organize the rows of the grid") if row_var else None
                 col_order = st.multiselect("Column order", options=sorted(dataset[col_var].unique()), help="Order to organize the columns of the grid") if col_var else None
+                parallel = st.checkbox("Parallel facets", len(dataset) >= FACET_ROWS and FACET_WORKERS > 1, help=f"Draw and rasterize each facet in one of {FACET_WORKERS} worker processes, then composite the panels")
             else:
-                row_var, col_var, col_wrap, row_order, col_order = None, None, None, None, None
+                row_var, col_var, col_wrap, row_order, col_order, parallel = None, None, None, None, None, False
             # Additional parameters
             units_var = st.selectbox("Units variable (optional)", options=[None] + list(dataset.columns), index=0, help="Grouping variable identifying sampling units (no legend entry)")
             height = st.number_input("Facet height (inches)", min_value=1.0, value=5.0, step=0.5, help="Height of each facet in inches")
             aspect = st.number_input("Facet aspect ratio", min_value=0.1, value=1.0, step=0.1, help="Aspect ratio of each facet (width = aspect * height)")
             legend_type = st.selectbox("Legend type", options=["auto", "brief", "full", False], index=0, help="How to draw the legend")
+            # Large data parameters
+            if kind == "scatter":
+                raster_mode = st.selectbox("Large data mode", options=RASTER_MODES, index=0, help=f"Bin points onto a pixel grid instead of drawing one marker each; 'auto' switches on above {RASTER_ROWS:,} rows")
+                raster_how = st.selectbox("Raster aggregation", options=RASTER_AGGREGATIONS, index=0, help="Points per pixel, mean of a numeric hue, or blended colours of hue categories; 'auto' picks from the hue")
+            else:
+                raster_mode, raster_how = "off", None
+            # Downsampling parameters
+            if kind == "line":
+                downsample = st.checkbox("Downsample long series", value=True, help="Draw each line with at most this many vertices, picked by Largest-Triangle-Three-Buckets from a precomputed resolution pyramid")
+                max_vertices = st.number_input("Max vertices per line", min_value=100, value=2000, step=100, help="Upper bound on the vertices drawn for each line inside the zoom range") if downsample else None
+                zoom = zoom_range(dataset[x_var], x_var)
+            else:
+                downsample, max_vertices, zoom = False, None, None
             plot_button = st.button("Generate Plot", use_container_width=True, type='primary')
             with col2:
                 if plot_button:
                     st.subheader("Generated Relplot")
                     try:
-                        g = sns.relplot(data=dataset,x=x_var,y=y_var,hue=hue_var if use_hue else None,size=size_var if use_size else None,style=style_var if use_style else None,units=units_var if units_var else None,row=row_var if use_facets and row_var else None,col=col_var if use_facets and col_var else None,col_wrap=col_wrap if use_facets and col_var and col_wrap else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,sizes=sizes if use_size else None,size_order=size_order if use_size and size_order else None,size_norm=size_norm if use_size and size_norm else None,markers=markers if use_style else None,dashes=dashes if use_style and kind == "line" else None,style_order=style_order if use_style and style_order else None,kind=kind,height=height,aspect=aspect,legend=legend_type)
-                        st.pyplot(g.fig)
-                        st.session_state['last_relplot'] = g.fig
+                        if use_raster(raster_mode, len(dataset)):
+                            render_plot('last_relplot', rasterized_relplot, data=project(dataset, x_var, y_var, hue_var, row_var, col_var), x=x_var, y=y_var, hue=hue_var, how=raster_how, row=row_var if use_facets and row_var else None, col=col_var if use_facets and col_var else None, col_wrap=col_wrap if use_facets and col_var and col_wrap else None, row_order=row_order or None, col_order=col_order or None, palette=palette, hue_order=hue_order or None, hue_norm=hue_norm, height=height, aspect=aspect, legend=legend_type is not False)
+                            st.caption(f"Rasterized {len(dataset):,} rows onto a pixel grid; size, style and units are not drawn")
+                        else:
+                            data = project(dataset, x_var, y_var, hue_var, size_var, style_var, units_var, row_var, col_var)
+                            sampled = downsample_lines(data, x_var, y_var, [hue_var, size_var, style_var, units_var, row_var, col_var], zoom, max_vertices) if downsample else None
+                            if sampled is not None:
+                                st.caption(f"Drew {len(sampled):,} of {len(data):,} vertices")
+                                data = sampled
+                            else:
+                                # Not downsampled (switched off, or lines repeat x values): only the zoom range applies
+                                data = zoomed_rows(data, x_var, zoom)
+                            reset_facet_stats()
+                            render_plot('last_relplot', parallel_facets(sns.relplot) if parallel else sns.relplot, data=data,x=x_var,y=y_var,hue=hue_var if use_hue else None,size=size_var if use_size else None,style=style_var if use_style else None,units=units_var if units_var else None,row=row_var if use_facets and row_var else None,col=col_var if use_facets and col_var else None,col_wrap=col_wrap if use_facets and col_var and col_wrap else None,palette=palette if use_hue else None,hue_order=hue_order if use_hue and hue_order else None,hue_norm=hue_norm if use_hue and hue_norm else None,sizes=sizes if use_size else None,size_order=size_order if use_size and size_order else None,size_norm=size_norm if use_size and size_norm else None,markers=markers if use_style else None,dashes=dashes if use_style and kind == "line" else None,style_order=style_order if use_style and style_order else None,kind=kind,height=height,aspect=aspect,legend=legend_type)
+                            if parallel:
+                                st.caption(facet_caption())
                     except Exception as e:
                         st.error(f"Error generating plot: {str(e)}")
     with tab2:
         st.subheader("Previously Generated Plot")
-        if 'last_relplot' in st.session_state:
-            st.pyplot(st.session_state['last_relplot'])
-        else:
-            st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
+        show_stored_plot('last_relplot')
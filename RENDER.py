@@ -0,0 +1,107 @@
+import inspect
+import io
+import os
+from collections import OrderedDict, namedtuple
+import streamlit as st
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from CACHE import LRUCache, content_hash, env_megabytes, frame_fingerprint
+
+PLOT_FORMATS = ["png", "svg"]
+PLOT_FORMAT = os.environ.get("EDA_PLOT_FORMAT", "png").lower()
+if PLOT_FORMAT not in PLOT_FORMATS:
+    PLOT_FORMAT = "png"
+PLOT_DPI = int(os.environ.get("EDA_PLOT_DPI", 200))
+SESSION_PLOT_BYTES = env_megabytes("EDA_SESSION_PLOT_MB", 32)
+RENDER_CACHE_BYTES = env_megabytes("EDA_RENDER_CACHE_MB", 256)
+# Encoded images shared by every session, keyed by dataset, plot function and parameters
+RENDER_CACHE = LRUCache(RENDER_CACHE_BYTES, "render")
+
+RenderedPlot = namedtuple("RenderedPlot", ["data", "format", "nbytes"])
+
+# Figure for axes-level plots that is never registered with pyplot, so nothing global keeps it alive
+def new_figure(**kwargs):
+    fig = Figure(**kwargs)
+    return fig, fig.subplots()
+
+# Encode a figure (or seaborn grid) to image bytes once and close it straight away
+def encode_figure(fig, fmt=PLOT_FORMAT, dpi=PLOT_DPI):
+    fig = getattr(fig, "figure", fig)
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return RenderedPlot(buffer.getvalue(), fmt, buffer.getbuffer().nbytes)
+
+def show_rendered(plot):
+    if plot.format == "svg":
+        st.image(plot.data.decode("utf-8"), width="stretch")
+    else:
+        st.image(plot.data, width="stretch")
+
+# Rendered plots of this session, oldest first; only encoded bytes are kept
+def session_plots():
+    if 'rendered_plots' not in st.session_state:
+        st.session_state['rendered_plots'] = OrderedDict()
+    return st.session_state['rendered_plots']
+
+def session_plot_bytes():
+    return sum(plot.nbytes for plot in session_plots().values())
+
+# Remember a rendered plot under the session's memory budget
+def remember_plot(key, plot):
+    plots = session_plots()
+    plots.pop(key, None)
+    plots[key] = plot
+    total = session_plot_bytes()
+    # Evict the least recently shown plots, but always keep the one just drawn
+    while total > SESSION_PLOT_BYTES and len(plots) > 1:
+        _, evicted = plots.popitem(last=False)
+        total -= evicted.nbytes
+    return plot
+
+# Encode, close, display and remember a figure
+def store_plot(key, fig):
+    plot = remember_plot(key, encode_figure(fig))
+    show_rendered(plot)
+    return plot
+
+# Cache key for a seaborn call; None when the data cannot be fingerprinted
+def plot_key(name, data, **kwargs):
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return None
+    return content_hash(fingerprint.encode(), plot=name, kwargs=kwargs, format=PLOT_FORMAT, dpi=PLOT_DPI)
+
+# Draw a seaborn plot on a figure of its own: axes-level plots get a new figure, figure-level plots (clustermap
+# takes a figsize of its own) make theirs
+def draw_plot(plot, data, figsize=None, **kwargs):
+    if "ax" in inspect.signature(plot).parameters:
+        fig, ax = new_figure(figsize=figsize)
+        plot(data=data, ax=ax, **kwargs)
+        return fig
+    if figsize is not None:
+        kwargs["figsize"] = figsize
+    return plot(data=data, **kwargs)
+
+# Draw a seaborn plot (axes- or figure-level) unless the same dataset and parameters were already rendered
+def render_plot(key, plot, data, figsize=None, **kwargs):
+    cache_key = plot_key(plot.__name__, data, figsize=figsize, **kwargs)
+    rendered = RENDER_CACHE.get(cache_key) if cache_key is not None else None
+    if rendered is None:
+        rendered = encode_figure(draw_plot(plot, data, figsize, **kwargs))
+        if cache_key is not None:
+            RENDER_CACHE.put(cache_key, rendered, rendered.nbytes)
+    remember_plot(key, rendered)
+    show_rendered(rendered)
+    return rendered
+
+# Show a previously stored plot in a "See Plots" tab without redrawing it
+def show_stored_plot(key):
+    plots = session_plots()
+    if key in plots:
+        plots.move_to_end(key)
+        show_rendered(plots[key])
+    else:
+        st.info("No plot generated yet. Please create a plot in the 'Implement Plots' tab.")
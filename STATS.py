@@ -0,0 +1,578 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from CACHE import LRUCache, content_hash, env_megabytes, frame_fingerprint, stamp_fingerprint
+
+# Mergeable KLL-style quantile sketch: level h holds items standing in for 2**h observations
+class QuantileSketch:
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = np.random.default_rng(seed)
+
+    # Approximate normalized rank error of a sketch with parameter k
+    @staticmethod
+    def rank_error(k):
+        return 2.296 / k ** 0.9723
+
+    # Smallest k whose rank error stays within eps
+    @staticmethod
+    def k_for_error(eps):
+        return max(8, int(math.ceil((2.296 / eps) ** (1 / 0.9723))))
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd leftover stays behind so total weight is preserved exactly
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:len(items) - len(keep)]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def copy(self):
+        sketch = QuantileSketch(self.k)
+        sketch.n, sketch.min, sketch.max = self.n, self.min, self.max
+        sketch.levels = [items.copy() for items in self.levels]
+        return sketch
+
+    # Sorted retained items with the number of observations each one represents
+    def weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind="mergesort")
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan)
+        items, weights = self.weighted_items()
+        ranks = np.cumsum(weights) / weights.sum()
+        positions = np.searchsorted(ranks, np.clip(q, 0, 1), side="left")
+        return items[np.minimum(positions, len(items) - 1)]
+
+    def cdf(self, x):
+        if self.n == 0:
+            return np.zeros(np.shape(x))
+        items, weights = self.weighted_items()
+        cumulative = np.concatenate([[0.0], np.cumsum(weights)]) / weights.sum()
+        return cumulative[np.searchsorted(items, x, side="right")]
+
+    @property
+    def nbytes(self):
+        return sum(items.nbytes for items in self.levels)
+
+# Fixed-size histogram whose range doubles (merging bin pairs) whenever new data falls outside it
+class StreamingHistogram:
+    def __init__(self, bins=64):
+        self.bins = bins + bins % 2
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.start = None
+        self.width = None
+
+    @property
+    def edges(self):
+        if self.start is None:
+            return np.empty(0)
+        return self.start + self.width * np.arange(self.bins + 1)
+
+    def _grow(self, downward):
+        merged = self.counts.reshape(-1, 2).sum(axis=1)
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        if downward:
+            self.counts[self.bins // 2:] = merged
+            self.start -= self.width * self.bins
+        else:
+            self.counts[:self.bins // 2] = merged
+        self.width *= 2
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        low, high = values.min(), values.max()
+        if self.start is None:
+            self.start = low
+            self.width = (high - low) / self.bins if high > low else max(abs(low), 1.0) * 1e-6
+        while low < self.start:
+            self._grow(downward=True)
+        while high > self.start + self.width * self.bins:
+            self._grow(downward=False)
+        positions = np.minimum(((values - self.start) / self.width).astype(np.int64), self.bins - 1)
+        self.counts += np.bincount(positions, minlength=self.bins)
+        return self
+
+# Value counts bounded to the most frequent levels; dropped mass is tracked in `other`
+class ValueCounter:
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype="int64")
+        self.other = 0
+        self.truncated = False
+
+    def update(self, values):
+        chunk_counts = pd.Series(values).value_counts(dropna=True)
+        self.counts = self.counts.add(chunk_counts, fill_value=0).astype("int64")
+        if len(self.counts) > self.capacity:
+            self.counts = self.counts.sort_values(ascending=False)
+            self.other += int(self.counts.iloc[self.capacity:].sum())
+            self.counts = self.counts.iloc[:self.capacity]
+            self.truncated = True
+        return self
+
+    def most_common(self, n=None):
+        counts = self.counts.sort_values(ascending=False)
+        return counts if n is None else counts.iloc[:n]
+
+Raster = namedtuple("Raster", ["counts", "sums", "categories", "extent"])
+
+# Bin points onto a height x width pixel grid: per-pixel counts, plus value sums or per-category counts
+def rasterize(x, y, width, height, x_range=None, y_range=None, values=None, codes=None, n_codes=0):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    if values is not None:
+        values = np.asarray(values, dtype=float)
+        keep &= np.isfinite(values)
+    if codes is not None:
+        codes = np.asarray(codes)
+        keep &= codes >= 0
+    if x_range is None:
+        x_range = (x[keep].min(), x[keep].max()) if keep.any() else (0.0, 1.0)
+    if y_range is None:
+        y_range = (y[keep].min(), y[keep].max()) if keep.any() else (0.0, 1.0)
+    (x0, x1), (y0, y1) = x_range, y_range
+    # Degenerate ranges still get one pixel's worth of width
+    x1 = x1 if x1 > x0 else x0 + 1.0
+    y1 = y1 if y1 > y0 else y0 + 1.0
+    keep &= (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+    columns = np.minimum(((x[keep] - x0) / (x1 - x0) * width).astype(np.int64), width - 1)
+    rows = np.minimum(((y[keep] - y0) / (y1 - y0) * height).astype(np.int64), height - 1)
+    pixels = rows * width + columns
+    size = width * height
+    counts = np.bincount(pixels, minlength=size).reshape(height, width)
+    sums = np.bincount(pixels, weights=values[keep], minlength=size).reshape(height, width) if values is not None else None
+    categories = None
+    if codes is not None:
+        categories = np.bincount(codes[keep].astype(np.int64) * size + pixels, minlength=n_codes * size).reshape(n_codes, height, width)
+    return Raster(counts, sums, categories, (x0, x1, y0, y1))
+
+BIN2D_AGGREGATIONS = ["count", "sum", "mean", "quantile"]
+# Bins per axis that an automatic binning never exceeds
+BIN2D_MAX_BINS = 100
+# Binned 2D matrices shared by every session
+BIN2D_CACHE = LRUCache(env_megabytes("EDA_BIN2D_CACHE_MB", 32), "bin2d")
+
+# Bin code of every value and a label per bin: the distinct values themselves when there are at most as many
+# as bins allowed (so low-cardinality axes stay exact), otherwise equal-width bins labelled by their centres
+def axis_bins(values, bins="auto", max_bins=BIN2D_MAX_BINS):
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return np.full(len(values), -1, dtype=np.int64), []
+    limit = bins if isinstance(bins, int) else max_bins
+    # A sample with more distinct values than allowed settles it without hashing every row
+    sample = finite[::max(1, len(finite) // 10000)]
+    levels = pd.unique(finite) if len(pd.unique(sample)) <= limit else sample
+    if len(levels) <= limit:
+        levels = np.sort(levels)
+        codes = np.searchsorted(levels, values)
+        codes[~np.isfinite(values)] = -1
+        return codes.astype(np.int64), [f"{level:g}" for level in levels]
+    edges = np.histogram_bin_edges(finite, bins)
+    if len(edges) - 1 > max_bins and not isinstance(bins, int):
+        edges = np.linspace(edges[0], edges[-1], max_bins + 1)
+    # Edges are evenly spaced, so the bin follows arithmetically; the last bin is closed as in np.histogram
+    with np.errstate(invalid="ignore"):
+        codes = np.clip(np.floor((values - edges[0]) / (edges[-1] - edges[0]) * (len(edges) - 1)), 0, len(edges) - 2)
+    codes[~np.isfinite(values)] = -1
+    return codes.astype(np.int64), [f"{centre:.3g}" for centre in (edges[:-1] + edges[1:]) / 2]
+
+# Per-cell quantile of values already sorted within cells, interpolated like np.quantile
+def cell_quantiles(sorted_values, counts, q):
+    starts = np.cumsum(counts) - counts
+    filled = counts > 0
+    position = starts[filled] + q * (counts[filled] - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, starts[filled] + counts[filled] - 1)
+    result = np.full(len(counts), np.nan)
+    result[filled] = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+    return result
+
+# Aggregate `values` (or count rows) over a y-by-x grid of bins in one pass; a DataFrame indexed by the y bins
+# with a column per x bin, as pivot_table lays it out. Empty cells count 0 (count, sum) or are NaN (mean, quantile)
+def bin2d(x, y, values=None, x_bins="auto", y_bins="auto", aggregation="count", q=0.5):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_codes, x_labels = axis_bins(x, x_bins)
+    y_codes, y_labels = axis_bins(y, y_bins)
+    keep = (x_codes >= 0) & (y_codes >= 0)
+    if aggregation != "count":
+        values = np.asarray(values, dtype=float)
+        keep &= np.isfinite(values)
+    cells = y_codes[keep] * len(x_labels) + x_codes[keep]
+    size = len(x_labels) * len(y_labels)
+    counts = np.bincount(cells, minlength=size)
+    if aggregation == "count":
+        matrix = counts
+    elif aggregation == "quantile":
+        kept = values[keep]
+        order = np.lexsort((kept, cells))
+        matrix = cell_quantiles(kept[order], counts, q)
+    else:
+        matrix = np.bincount(cells, weights=values[keep], minlength=size)
+        if aggregation == "mean":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                matrix = matrix / counts
+    return pd.DataFrame(matrix.reshape(len(y_labels), len(x_labels)), index=pd.Index(y_labels), columns=pd.Index(x_labels))
+
+# Cached bin2d of two columns of `data`, named after them like a pivot table
+def binned_matrix(data, x, y, value=None, x_bins="auto", y_bins="auto", aggregation="count", q=0.5):
+    def compute():
+        column = lambda name: pd.to_numeric(data[name], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        matrix = bin2d(column(x), column(y), column(value) if aggregation != "count" else None, x_bins, y_bins, aggregation, q)
+        matrix.index.name, matrix.columns.name = y, x
+        return stamp_fingerprint(matrix, key) if key is not None else matrix
+    fingerprint = frame_fingerprint(data)
+    key = None if fingerprint is None else content_hash(fingerprint.encode(), x=x, y=y, value=value, x_bins=x_bins, y_bins=y_bins, aggregation=aggregation, q=q)
+    if key is None:
+        return compute()
+    return BIN2D_CACHE.get_or_compute(key, compute)
+
+BOOTSTRAP_WORKERS = int(os.environ.get("EDA_BOOTSTRAP_WORKERS", os.cpu_count() or 1))
+BOOTSTRAP_BATCH_BYTES = 64 * 1024 * 1024
+# Below this many resampled values in total a process pool costs more than it saves
+BOOTSTRAP_PARALLEL_DRAWS = 20_000_000
+BOOTSTRAP_ESTIMATORS = {"mean": np.mean, "median": np.median, "sum": np.sum, "min": np.min, "max": np.max}
+# Intervals shared by every session, keyed by group contents and bootstrap settings
+BOOTSTRAP_CACHE = LRUCache(env_megabytes("EDA_BOOTSTRAP_CACHE_MB", 16), "bootstrap")
+
+# Order-independent digest of a group's values (they are sorted before hashing)
+def values_digest(values):
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=float).tobytes(), digest_size=16).hexdigest()
+
+# Percentile bootstrap interval of one sorted group, resampled in batches of whole index matrices
+def bootstrap_interval(values, digest, estimator="mean", n_boot=1000, level=95, seed=0):
+    if len(values) == 0:
+        return (np.nan, np.nan)
+    # Each group draws from its own stream, so results do not depend on which other groups exist
+    rng = np.random.default_rng(np.random.SeedSequence([seed, int(digest[:16], 16)]))
+    reduce = BOOTSTRAP_ESTIMATORS[estimator]
+    estimates = np.empty(n_boot)
+    rows = max(1, BOOTSTRAP_BATCH_BYTES // (16 * len(values)))
+    for start in range(0, n_boot, rows):
+        stop = min(start + rows, n_boot)
+        estimates[start:stop] = reduce(values[rng.integers(0, len(values), size=(stop - start, len(values)))], axis=1)
+    edge = (100 - level) / 2
+    low, high = np.nanpercentile(estimates, [edge, 100 - edge])
+    return (float(low), float(high))
+
+def _bootstrap_jobs(jobs, estimator, n_boot, level, seed):
+    return [(digest, bootstrap_interval(values, digest, estimator, n_boot, level, seed)) for digest, values in jobs]
+
+_bootstrap_pool = None
+_bootstrap_pool_lock = threading.Lock()
+
+# Long-lived bootstrap workers, started on first use so their start-up is paid once; spawned rather than forked,
+# since the Streamlit server runs threads of its own
+def bootstrap_pool():
+    global _bootstrap_pool
+    with _bootstrap_pool_lock:
+        if _bootstrap_pool is None:
+            _bootstrap_pool = ProcessPoolExecutor(BOOTSTRAP_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _bootstrap_pool
+
+def reset_bootstrap_pool():
+    global _bootstrap_pool
+    with _bootstrap_pool_lock:
+        if _bootstrap_pool is not None:
+            _bootstrap_pool.shutdown(wait=False, cancel_futures=True)
+        _bootstrap_pool = None
+
+# Bootstrap (digest, sorted values) jobs, spreading large workloads over the worker pool
+def bootstrap_intervals(jobs, estimator="mean", n_boot=1000, level=95, seed=0, workers=None):
+    workers = min(BOOTSTRAP_WORKERS if workers is None else workers, BOOTSTRAP_WORKERS)
+    draws = sum(len(values) for _, values in jobs) * n_boot
+    if workers < 2 or len(jobs) < 2 or draws <= BOOTSTRAP_PARALLEL_DRAWS:
+        return dict(_bootstrap_jobs(jobs, estimator, n_boot, level, seed))
+    # Largest groups first, dealt round-robin so workers get similar amounts of work
+    jobs = sorted(jobs, key=lambda job: len(job[1]), reverse=True)
+    chunks = [jobs[index::workers] for index in range(min(workers, len(jobs)))]
+    try:
+        results = list(bootstrap_pool().map(_bootstrap_jobs, chunks, repeat(estimator), repeat(n_boot), repeat(level), repeat(seed)))
+    except BrokenProcessPool:
+        # Each group draws from its own stream, so the intervals are the same when computed here instead
+        reset_bootstrap_pool()
+        return dict(_bootstrap_jobs(jobs, estimator, n_boot, level, seed))
+    return dict(pair for chunk in results for pair in chunk)
+
+# Sorted, NaN-free values of `value` for every group of the `by` columns, in groupby order
+def grouped_values(data, value, by, sort=False):
+    values = pd.to_numeric(data[value], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    if by:
+        codes = data.groupby(list(by), sort=sort, dropna=True, observed=True).ngroup().to_numpy()
+    else:
+        codes = np.zeros(len(values), dtype=np.int64)
+    keep = (codes >= 0) & ~np.isnan(values)
+    values, codes = values[keep], codes[keep]
+    order = np.lexsort((values, codes))
+    values, codes = values[order], codes[order]
+    return np.split(values, np.flatnonzero(np.diff(codes)) + 1) if len(values) else []
+
+# Callable errorbar for seaborn: all groups are bootstrapped in one batch on first use, then looked up
+class BootstrapErrorbar:
+    def __init__(self, estimator="mean", n_boot=1000, level=95, seed=0, data=None, value=None, by=()):
+        self.estimator = estimator
+        self.n_boot = int(n_boot)
+        self.level = level
+        self.seed = int(seed)
+        self._pending = (data, value, list(by)) if data is not None else None
+
+    # Stable across reruns so render cache keys built from the plot arguments stay valid
+    def __repr__(self):
+        return f"BootstrapErrorbar(estimator={self.estimator!r}, n_boot={self.n_boot}, level={self.level}, seed={self.seed})"
+
+    def _key(self, digest):
+        return (digest, self.estimator, self.n_boot, self.level, self.seed)
+
+    # The same errorbar for a subset of the rows it was built for (one facet, say), precomputing only that subset's groups
+    def restricted(self, data):
+        if self._pending is None:
+            return BootstrapErrorbar(self.estimator, self.n_boot, self.level, self.seed)
+        _, value, by = self._pending
+        return BootstrapErrorbar(self.estimator, self.n_boot, self.level, self.seed, data=data, value=value, by=by)
+
+    def precompute(self, groups):
+        jobs = [(values_digest(values), values) for values in groups]
+        missing = [(digest, values) for digest, values in jobs if self._key(digest) not in BOOTSTRAP_CACHE]
+        computed = bootstrap_intervals(missing, self.estimator, self.n_boot, self.level, self.seed)
+        for digest, interval in computed.items():
+            BOOTSTRAP_CACHE.put(self._key(digest), interval, nbytes=64)
+        return [computed[digest] if digest in computed else self(values) for digest, values in jobs]
+
+    def __call__(self, values):
+        if self._pending is not None:
+            data, value, by = self._pending
+            self._pending = None
+            self.precompute(grouped_values(data, value, by))
+        values = np.sort(np.asarray(values, dtype=float))
+        values = values[~np.isnan(values)]
+        digest = values_digest(values)
+        # Groups seaborn forms differently (e.g. on a log scale) are bootstrapped on demand
+        return BOOTSTRAP_CACHE.get_or_compute(self._key(digest), lambda: bootstrap_interval(values, digest, self.estimator, self.n_boot, self.level, self.seed), nbytes=64)
+
+# Swap seaborn's per-group bootstrap for the batched engine when the estimator and errorbar allow it
+def bootstrap_errorbar(data, value, by, estimator, errorbar, n_boot, seed=0):
+    if errorbar == "ci":
+        errorbar = ("ci", 95)
+    if not (isinstance(errorbar, tuple) and errorbar[0] == "ci") or estimator not in BOOTSTRAP_ESTIMATORS:
+        return errorbar
+    if value is None or not pd.api.types.is_numeric_dtype(data[value]) or pd.api.types.is_bool_dtype(data[value]):
+        return errorbar
+    return BootstrapErrorbar(estimator, n_boot, errorbar[1], seed, data=data, value=value, by=[column for column in by if column is not None])
+
+LINE_ESTIMATORS = ["mean", "median", "sum", "min", "max", "count"]
+# Per-point line summaries shared by every session, so cosmetic changes skip the groupby
+AGGREGATE_CACHE = LRUCache(env_megabytes("EDA_AGGREGATE_CACHE_MB", 64), "aggregate")
+
+# Estimate and error interval of y for every (x, semantic) group in one groupby pass
+def aggregate_lines(data, x, y, by, estimator="mean", errorbar=("ci", 95), n_boot=1000, seed=0):
+    keys = list(dict.fromkeys([x] + [column for column in by if column is not None]))
+    frame = data[list(dict.fromkeys(keys + [y]))].dropna(subset=[x, y])
+    grouped = frame.groupby(keys, sort=True, dropna=True, observed=True)[y]
+    estimate = grouped.agg(estimator).astype(float)
+    if isinstance(errorbar, str):
+        errorbar = (errorbar, 95 if errorbar in ("ci", "pi") else 1)
+    method, level = errorbar if errorbar else (None, None)
+    if method in ("sd", "se"):
+        spread = (grouped.std() if method == "sd" else grouped.sem()) * level
+        low, high = estimate - spread, estimate + spread
+    elif method == "pi":
+        edge = (100 - level) / 200
+        low, high = grouped.quantile(edge), grouped.quantile(1 - edge)
+    elif method == "ci" and estimator in BOOTSTRAP_ESTIMATORS:
+        intervals = BootstrapErrorbar(estimator, n_boot, level, seed).precompute(grouped_values(frame, y, keys, sort=True))
+        low = pd.Series([interval[0] for interval in intervals], index=estimate.index)
+        high = pd.Series([interval[1] for interval in intervals], index=estimate.index)
+    elif method == "ci":
+        low, high = estimate, estimate  # Every resample of a group has the same count
+    else:
+        low = high = pd.Series(np.nan, index=estimate.index)
+    # Seaborn draws no interval for single observations
+    single = grouped.count() <= 1
+    summary = pd.DataFrame({y: estimate, f"{y}min": low.where(~single).astype(float), f"{y}max": high.where(~single).astype(float)})
+    return summary.reset_index()
+
+# Cached aggregate_lines, keyed by the data fingerprint and the statistical options only
+def line_aggregate(data, x, y, by, estimator="mean", errorbar=("ci", 95), n_boot=1000, seed=0):
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return aggregate_lines(data, x, y, by, estimator, errorbar, n_boot, seed)
+    key = content_hash(fingerprint.encode(), x=x, y=y, by=list(by), estimator=estimator, errorbar=errorbar, n_boot=n_boot, seed=seed)
+    # Stamped so later stages (downsampling, rendering) need not rehash the summary
+    return AGGREGATE_CACHE.get_or_compute(key, lambda: stamp_fingerprint(aggregate_lines(data, x, y, by, estimator, errorbar, n_boot, seed), key))
+
+# Three rows per point (low, estimate, high): seaborn's median recovers the estimate and a 100% interval the bounds.
+# None when some interval excludes its estimate (e.g. a percentile interval around a sum), which this cannot encode
+def line_rows(summary, y):
+    low = summary[f"{y}min"].fillna(summary[y])
+    high = summary[f"{y}max"].fillna(summary[y])
+    if ((low > summary[y]) | (high < summary[y])).any():
+        return None
+    keys = summary.drop(columns=[y, f"{y}min", f"{y}max"])
+    rows = pd.concat([keys.assign(**{y: low}), keys.assign(**{y: summary[y]}), keys.assign(**{y: high})], ignore_index=True)
+    return rows.dropna(subset=[y])
+
+# Indices of the n_out points Largest-Triangle-Three-Buckets keeps from a series sorted by x
+def lttb(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # Interior points split into n_out - 2 buckets; the first and last points are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / sizes, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / sizes, y[-1])
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    ax, ay = x[0], y[0]
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        cx, cy = mean_x[bucket + 1], mean_y[bucket + 1]
+        # Twice the triangle area spanned by the last kept point, each candidate and the next bucket's mean
+        area = np.abs((ax - cx) * (y[start:stop] - ay) - (ax - x[start:stop]) * (cy - ay))
+        chosen = start + int(area.argmax())
+        selected[bucket + 1] = chosen
+        ax, ay = x[chosen], y[chosen]
+    return selected
+
+# LTTB downsamples of one series at resolutions growing by `factor`, each built from the next finer one
+class LinePyramid:
+    def __init__(self, x, y, base=2048, factor=4, max_levels=4):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        order = np.argsort(x, kind="stable")
+        order = order[np.isfinite(x[order]) & np.isfinite(y[order])]
+        self.positions = order
+        self.x = x[order]
+        self.y = y[order]
+        self.factor = factor
+        sizes = [base * factor ** level for level in range(max_levels) if base * factor ** level < len(order)]
+        self.levels = []
+        indices = np.arange(len(order))
+        for size in reversed(sizes):
+            indices = indices[lttb(self.x[indices], self.y[indices], size)]
+            self.levels.insert(0, indices)
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + self.x.nbytes + self.y.nbytes + sum(indices.nbytes for indices in self.levels)
+
+    # Row positions to draw for x_range: LTTB of the coarsest level with enough points there, or of the raw slice when zoomed past every level
+    def select(self, x_range=None, max_vertices=2048):
+        low, high = (0, len(self.x)) if x_range is None else (np.searchsorted(self.x, x_range[0], side="left"), np.searchsorted(self.x, x_range[1], side="right"))
+        if high - low <= max_vertices:
+            return self.positions[low:high]
+        source = np.arange(low, high)
+        for indices in self.levels:
+            start, stop = np.searchsorted(indices, low), np.searchsorted(indices, high)
+            if stop - start >= max_vertices:
+                source = indices[start:stop]
+                break
+        return self.positions[source[lttb(self.x[source], self.y[source], max_vertices)]]
+
+# Float positions along a line's x axis; datetimes become nanoseconds since the epoch
+def line_axis(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        stamps = values.to_numpy(dtype="datetime64[ns]")
+        return np.where(np.isnat(stamps), np.nan, stamps.view("int64").astype(float))
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+PYRAMID_CACHE = LRUCache(env_megabytes("EDA_PYRAMID_CACHE_MB", 256), "pyramid")
+
+# Pyramids for every line of a frame, or None when some line has repeated x values (seaborn must aggregate those)
+def line_pyramids(data, x, y, by):
+    by = [column for column in dict.fromkeys(by) if column is not None and column not in (x, y)]
+    def build():
+        if data.duplicated(subset=by + [x]).any():
+            return None
+        x_values = line_axis(data[x])
+        y_values = pd.to_numeric(data[y], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        groups = data.groupby(by, sort=False, dropna=False, observed=True).indices if by else {None: np.arange(len(data))}
+        return [(rows, LinePyramid(x_values[rows], y_values[rows])) for rows in groups.values()]
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return build()
+    key = content_hash(fingerprint.encode(), x=x, y=y, by=by)
+    pyramids = PYRAMID_CACHE.get(key)
+    if pyramids is None and key not in PYRAMID_CACHE:
+        pyramids = build()
+        PYRAMID_CACHE.put(key, pyramids, nbytes=sum(rows.nbytes + pyramid.nbytes for rows, pyramid in pyramids) if pyramids else 64)
+    return pyramids
+
+# A zoom range given in x's own values (numbers or datetimes) as positions on line_axis
+def line_range(data, x, x_range):
+    if x_range is None:
+        return None
+    return tuple(line_axis(pd.Series(list(x_range), dtype=data[x].dtype if pd.api.types.is_datetime64_any_dtype(data[x]) else float)))
+
+# Rows of `data` inside x_range, for lines drawn without downsampling
+def zoomed_rows(data, x, x_range):
+    if x_range is None:
+        return data
+    low, high = line_range(data, x, x_range)
+    values = line_axis(data[x])
+    return data[(values >= low) & (values <= high)]
+
+# Rows of `data` to draw so every line keeps at most max_vertices vertices inside x_range
+def downsample_lines(data, x, y, by, x_range=None, max_vertices=2048):
+    pyramids = line_pyramids(data, x, y, by)
+    if pyramids is None:
+        return None
+    x_range = line_range(data, x, x_range)
+    positions = np.concatenate([rows[pyramid.select(x_range, max_vertices)] for rows, pyramid in pyramids]) if pyramids else np.empty(0, dtype=np.int64)
+    return data.iloc[np.sort(positions)]
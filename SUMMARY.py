@@ -0,0 +1,295 @@
+import functools
+import math
+import os
+import threading
+import numpy as np
+import pandas as pd
+import matplotlib
+import matplotlib.cbook
+import seaborn.categorical
+from seaborn._statistics import LetterValues
+from CACHE import LRUCache, content_hash, env_megabytes, frame_fingerprint
+from PATCH import patched
+from DENSITY import BinnedDensityKDE, binned_kde_1d, binned_kde_enabled, binned_violinplot, histogram_axis, kde_factor, linear_binning
+from STATS import values_digest
+
+# Per-group sorted values and the statistics derived from them, shared by every session and every
+# box, boxen and violin view of the same dataset and grouping
+SUMMARY_CACHE = LRUCache(env_megabytes("EDA_SUMMARY_CACHE_MB", 256), "summary")
+# Points of the fine grid each group is pre-binned onto for the violin KDE
+SUMMARY_KDE_POINTS = int(os.environ.get("EDA_SUMMARY_KDE_POINTS", 4097))
+
+# np.percentile(values, q) for already sorted values, reading the two order statistics directly instead of partitioning
+def sorted_percentile(values, q):
+    quantiles = np.true_divide(np.asarray(q, dtype=float), 100)
+    virtual = np.atleast_1d((len(values) - 1) * quantiles)
+    previous = np.floor(virtual)
+    following = previous + 1
+    above = virtual >= len(values) - 1
+    previous[above], following[above] = -1, -1
+    previous, following = previous.astype(np.intp), following.astype(np.intp)
+    # numpy's interpolation, including its switch to counting back from the upper point past the midpoint
+    gamma = virtual - previous
+    lower, upper = values[previous], values[following]
+    difference = upper - lower
+    result = np.where(gamma >= 0.5, upper - difference * (1 - gamma), lower + difference * gamma)
+    return result if np.ndim(q) else result[0]
+
+# Everything box, boxen and violin plots need from one group, computed from its sorted values on first use
+class GroupSummary:
+    def __init__(self, values, rows):
+        self.count = len(values)
+        self.mean = np.mean(values)
+        order = np.argsort(values, kind="stable")
+        self.values = values[order]
+        # Row positions in the summarized frame, in value order
+        self.rows = rows[order]
+        self._derived = {}
+
+    def _memo(self, key, compute):
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def quartiles(self):
+        return self._memo("quartiles", lambda: sorted_percentile(self.values, [25, 50, 75]))
+
+    # Lowest and highest values inside the whiskers, as matplotlib's boxplot_stats defines them
+    def whiskers(self, whis=1.5):
+        def compute():
+            q1, _, q3 = self.quartiles()
+            if np.iterable(whis) and not isinstance(whis, str):
+                low, high = sorted_percentile(self.values, whis)
+            else:
+                low, high = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+            top = np.searchsorted(self.values, high, side="right") - 1
+            bottom = np.searchsorted(self.values, low, side="left")
+            whishi = q3 if top < 0 or self.values[top] < q3 else self.values[top]
+            whislo = q1 if bottom == self.count or self.values[bottom] > q1 else self.values[bottom]
+            return whislo, whishi
+        return self._memo(("whiskers", repr(whis)), compute)
+
+    # Positions (in value order) where the values below and above the whiskers end and begin
+    def _outlier_bounds(self, whis):
+        whislo, whishi = self.whiskers(whis)
+        return np.searchsorted(self.values, whislo, side="left"), np.searchsorted(self.values, whishi, side="right")
+
+    # Row positions of the points drawn as outliers
+    def outliers(self, whis=1.5):
+        low, high = self._outlier_bounds(whis)
+        return np.concatenate([self.rows[:low], self.rows[high:]])
+
+    # Values at the given value-order positions, put back in row order so markers overlap as seaborn draws them
+    def _in_row_order(self, positions):
+        return self.values[positions[np.argsort(self.rows[positions])]]
+
+    # One entry of matplotlib's boxplot_stats (without bootstrapped notches)
+    def box_stats(self, whis=1.5):
+        def compute():
+            q1, med, q3 = self.quartiles()
+            iqr = q3 - q1
+            whislo, whishi = self.whiskers(whis)
+            low, high = self._outlier_bounds(whis)
+            notch = 1.57 * iqr / np.sqrt(self.count)
+            return {"mean": self.mean, "iqr": iqr, "cilo": med - notch, "cihi": med + notch, "whishi": whishi, "whislo": whislo,
+                    "fliers": np.concatenate([self._in_row_order(np.arange(low)), self._in_row_order(np.arange(high, self.count))]), "q1": q1, "med": med, "q3": q3}
+        return dict(self._memo(("box", repr(whis)), compute))
+
+    # Seaborn's LetterValues result for this group, down to the depth its stopping rule picks
+    def letter_values(self, k_depth="tukey", outlier_prop=0.007, trust_alpha=0.05):
+        def compute():
+            estimator = LetterValues(k_depth, outlier_prop, trust_alpha)
+            k = estimator._compute_k(self.count)
+            exp = np.arange(k + 1, 1, -1), np.arange(2, k + 2)
+            levels = k + 1 - np.concatenate([exp[0], exp[1][1:]])
+            percentiles = 100 * np.concatenate([0.5 ** exp[0], 1 - 0.5 ** exp[1]])
+            if k_depth == "full":
+                percentiles[0] = 0
+                percentiles[-1] = 100
+            values = sorted_percentile(self.values, percentiles)
+            low = np.searchsorted(self.values, values.min(), side="left")
+            high = np.searchsorted(self.values, values.max(), side="right")
+            return {"k": k, "levels": levels, "percs": percentiles, "values": values,
+                    "fliers": self._in_row_order(np.r_[0:low, high:self.count]), "median": sorted_percentile(self.values, 50)}
+        return dict(self._memo(("letters", k_depth, outlier_prop, trust_alpha), compute))
+
+    # Kernel covariance gaussian_kde would use for this group, scaled by bw_adjust
+    def kde_covariance(self, bw_method="scott", bw_adjust=1):
+        factor = kde_factor(self.count, 1, bw_method)
+        if factor is None or self.count < 2:
+            return None
+        variance = self._memo("variance", lambda: np.var(self.values, ddof=1))
+        return variance * (factor * bw_adjust) ** 2
+
+    # The group linearly binned onto a fine grid spanning its range: the KDE inputs of a violin
+    def kde_inputs(self):
+        def compute():
+            start, stop = self.values[0], self.values[-1]
+            if not (np.isfinite(start) and np.isfinite(stop)) or stop <= start:
+                return None
+            grid = np.linspace(start, stop, SUMMARY_KDE_POINTS)
+            return grid, linear_binning(self.values, start, grid[1] - start, SUMMARY_KDE_POINTS)
+        return self._memo("kde", compute)
+
+# Summaries of every group of one dataset and grouping, looked up by the digest of a group's values in row
+# order; `keys` holds each grouping's first row with the group's token (its position in `tokens`, from 1, or
+# NaN when it has no values) in the value column, the frame a box or boxen plot is laid out from
+class GroupSummaries:
+    def __init__(self, groups, keys, tokens, log_scale=False):
+        self.groups = groups
+        self.keys = keys
+        self.tokens = tokens
+        self.log_scale = log_scale
+        self.counts = {summary.count for summary in groups.values()}
+        self.nbytes = sum(summary.values.nbytes + summary.rows.nbytes for summary in groups.values()) + 1024 * len(groups) + int(keys.memory_usage(deep=True).sum())
+
+    def find(self, values):
+        if len(values) not in self.counts:
+            return None
+        return self.groups.get(values_digest(values))
+
+    # Summary a group of `keys` stands for, from the token seaborn hands back (log scaled when the axis is)
+    def for_token(self, values):
+        if len(values) != 1 or not np.isfinite(values[0]):
+            return None
+        token = 10 ** values[0] if self.log_scale else values[0]
+        index = int(round(token)) - 1
+        return self.tokens[index] if 0 <= index < len(self.tokens) else None
+
+# One grouped pass: partition the rows by group once, then sort and digest each group's values
+def summarize_groups(data, value, by=(), log_scale=False):
+    values = histogram_axis(data[value], log_scale)
+    if by:
+        codes = data.groupby(list(by), sort=False, observed=True, dropna=True).ngroup().to_numpy(dtype=float, na_value=-1).astype(np.int64)
+        # Every grouping seaborn would place on an axis or legend, in order of appearance, missing keys included
+        first = np.flatnonzero(~data.duplicated(list(by)).to_numpy())
+    else:
+        codes = np.zeros(len(values), dtype=np.int64)
+        first = np.arange(min(len(values), 1))
+    positions = np.flatnonzero((codes >= 0) & ~np.isnan(values))
+    order = np.argsort(codes[positions], kind="stable")
+    bounds = np.flatnonzero(np.diff(codes[positions][order])) + 1
+    groups, coded = {}, {}
+    for rows in np.split(positions[order], bounds) if len(positions) else []:
+        group_values = values[rows]
+        coded[codes[rows[0]]] = groups[values_digest(group_values)] = GroupSummary(group_values, rows)
+    numbers = {code: number for number, code in enumerate([code for code in codes[first] if code in coded], 1)}
+    keys = data.iloc[first][list(by)].reset_index(drop=True)
+    keys[value] = [float(numbers.get(code, np.nan)) for code in codes[first]]
+    return GroupSummaries(groups, keys, [coded[code] for code in numbers], log_scale)
+
+# Cached summarize_groups for a dataset
+def group_summaries(data, value, by=(), log_scale=False):
+    by = [column for column in dict.fromkeys(by) if column is not None and column != value]
+    fingerprint = frame_fingerprint(data)
+    if fingerprint is None:
+        return summarize_groups(data, value, by, log_scale)
+    key = content_hash(fingerprint.encode(), value=value, by=by, log_scale=bool(log_scale))
+    return SUMMARY_CACHE.get_or_compute(key, lambda: summarize_groups(data, value, by, log_scale))
+
+# Value column and grouping columns of a categorical plot call, following seaborn's orientation rules;
+# None when the values are not plain numbers
+def summary_axis(data, x=None, y=None, hue=None, row=None, col=None, orient=None, log_scale=None, **kwargs):
+    numeric = {var: var is not None and pd.api.types.is_numeric_dtype(data[var]) and not pd.api.types.is_bool_dtype(data[var]) for var in (x, y)}
+    if orient in ("h", "y") or y is None or (orient not in ("v", "x") and x is not None and numeric[x] and not numeric[y]):
+        value, category, axis = x, y, 0
+    else:
+        value, category, axis = y, x, 1
+    if value is None or not numeric[value]:
+        return None
+    if isinstance(log_scale, tuple):
+        log_scale = log_scale[axis]
+    if log_scale not in (None, False, True, 10):
+        return None  # The summaries hold linear or log10 values only
+    return value, [category, hue, row, col], bool(log_scale)
+
+_summaries = threading.local()
+
+# Summary of the group `values` belongs to, while the current thread draws with `summarized`
+def summary_for(values):
+    summaries = getattr(_summaries, "active", None)
+    if summaries is None:
+        return None
+    values = np.asarray(values, dtype=float)
+    return summaries.for_token(values) if getattr(_summaries, "keyed", False) else summaries.find(values)
+
+_boxplot_stats = matplotlib.cbook.boxplot_stats
+
+# matplotlib's boxplot_stats (what seaborn's boxplot calls) answered from the summaries where they apply
+def summary_boxplot_stats(X, whis=1.5, bootstrap=None, labels=None, autorange=False):
+    if getattr(_summaries, "active", None) is None or bootstrap is not None or labels is not None or autorange or not isinstance(X, list):
+        return _boxplot_stats(X, whis=whis, bootstrap=bootstrap, labels=labels, autorange=autorange)
+    stats = []
+    for x in X:
+        summary = summary_for(x)
+        stats.extend([summary.box_stats(whis)] if summary is not None else _boxplot_stats([x], whis=whis))
+    return stats
+
+# Seaborn's boxenplot estimator, reading letter values from the summaries
+class SummaryLetterValues(LetterValues):
+    def __call__(self, x):
+        summary = summary_for(x)
+        if summary is None:
+            return super().__call__(x)
+        return summary.letter_values(self.k_depth, self.outlier_prop, self.trust_alpha)
+
+# The binned violin KDE, fed each group's pre-binned values instead of its rows
+class SummaryKDE(BinnedDensityKDE):
+    def _summary(self, data, orient):
+        if not binned_kde_enabled() or self.gridsize is None or len(data) < 2:
+            return None
+        if "weight" in data and not (data["weight"] == 1).all():
+            return None
+        summary = summary_for(data[orient])
+        if summary is None or summary.kde_inputs() is None or summary.kde_covariance(self.bw_method, self.bw_adjust) is None:
+            return None
+        return summary
+
+    def _get_support(self, data, orient):
+        summary = self._summary(data, orient)
+        if summary is None:
+            return super()._get_support(data, orient)
+        bandwidth = math.sqrt(summary.kde_covariance(self.bw_method, self.bw_adjust))
+        return np.linspace(summary.values[0] - bandwidth * self.cut, summary.values[-1] + bandwidth * self.cut, self.gridsize)
+
+    def _fit_and_evaluate(self, data, orient, support):
+        summary = self._summary(data, orient)
+        if summary is not None:
+            covariance = summary.kde_covariance(self.bw_method, self.bw_adjust)
+            grid, counts = summary.kde_inputs()
+            # Re-binning the fine grid costs accuracy only when its spacing nears the bandwidth
+            if grid[1] - grid[0] <= math.sqrt(covariance) / 8:
+                density = binned_kde_1d(grid, support, covariance, counts, self.cumulative)
+                if density is not None:
+                    return pd.DataFrame({orient: support, "weight": data["weight"].sum(), "density": density})
+        return super()._fit_and_evaluate(data, orient, support)
+
+# Wrap a seaborn categorical function so its box, letter-value and binned violin statistics come from the
+# cached group summaries (and it caches under its own name); the hooks are swapped in only for the duration of
+# the call. Box and boxen plots need nothing else from the rows, so seaborn lays them out from the summaries'
+# one row per group and never sees the data
+def summarized(plot, kind=None):
+    @functools.wraps(plot)
+    def summary_plot(*args, data=None, **kwargs):
+        axis = summary_axis(data, **kwargs) if isinstance(data, pd.DataFrame) else None
+        summaries = group_summaries(data, *axis) if axis is not None else None
+        keyed = summaries is not None and kwargs.get("kind", kind) in ("box", "boxen") and kwargs.get("bootstrap", matplotlib.rcParams["boxplot.bootstrap"]) is None
+        active, was_keyed = getattr(_summaries, "active", None), getattr(_summaries, "keyed", False)
+        _summaries.active, _summaries.keyed = summaries, keyed
+        try:
+            with patched(matplotlib.cbook, "boxplot_stats", summary_boxplot_stats), patched(seaborn.categorical, "LetterValues", SummaryLetterValues), patched(seaborn.categorical, "KDE", SummaryKDE):
+                return plot(*args, data=summaries.keys if keyed else data, **kwargs)
+        finally:
+            _summaries.active, _summaries.keyed = active, was_keyed
+    summary_plot.__name__ = f"summary_{plot.__name__}"
+    return summary_plot
+
+summary_boxplot = summarized(seaborn.categorical.boxplot, "box")
+summary_boxenplot = summarized(seaborn.categorical.boxenplot, "boxen")
+summary_catplot = summarized(seaborn.categorical.catplot)
+_binned_summary_violinplot = summarized(binned_violinplot)
+_exact_summary_violinplot = summarized(seaborn.categorical.violinplot)
+
+# Violin plot with its statistics from the cached group summaries, with the binned FFT KDE or seaborn's exact one
+def summary_violinplot(*args, binned=True, **kwargs):
+    return (_binned_summary_violinplot if binned else _exact_summary_violinplot)(*args, **kwargs)
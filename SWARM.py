@@ -0,0 +1,130 @@
+import functools
+import os
+import threading
+import time
+import numpy as np
+import seaborn.categorical
+from seaborn._base import infer_orient
+from seaborn.categorical import Beeswarm
+from DENSITY import binned_kde_1d, kde_covariance
+from PATCH import patched
+
+# Largest swarm (points per category, or per category and hue when dodged) laid out as a beeswarm
+SWARM_POINTS = int(os.environ.get("EDA_SWARM_POINTS", 5000))
+SWARM_FALLBACKS = ["density", "strip"]
+
+_layout = threading.local()
+
+# Seconds and points spent on beeswarm layout by the current thread since the last reset
+def layout_stats():
+    return getattr(_layout, "seconds", 0.0), getattr(_layout, "points", 0)
+
+def reset_layout_stats():
+    _layout.seconds, _layout.points = 0.0, 0
+
+# Seaborn's beeswarm placement, reproduced exactly but without its quadratic inner loops:
+# points are placed in value order, so the placed points that can touch the next one are a contiguous
+# tail of the sorted values, found by binary search, and candidates are screened against them in one pass
+class FastBeeswarm(Beeswarm):
+    def beeswarm(self, orig_xyr):
+        # Offsets arrive as a masked array, whose element-wise operations are many times slower
+        x, y, r = np.asarray(orig_xyr, dtype=float).T
+        # Seaborn draws every swarm with one marker size; anything else takes the original path
+        if len(orig_xyr) < 2 or not np.all(r == r[0]):
+            return super().beeswarm(orig_xyr)
+        started = time.perf_counter()
+        placed_x = x.copy()
+        midline = x[0]
+        reach = 2 * r[0]
+        for i in range(1, len(orig_xyr)):
+            y_i, r_i = y[i], r[i]
+            low = np.searchsorted(y[:i], y_i - reach * (1 + 1e-9) - 1e-12, side="left")
+            window = slice(low + np.count_nonzero(y_i - y[low:i] >= reach), i)
+            neighbors_x, neighbors_y, neighbors_r = placed_x[window], y[window], r[window]
+            if len(neighbors_x) == 0:
+                continue
+            dx = np.sqrt(np.maximum((r_i + neighbors_r) ** 2 - (y_i - neighbors_y) ** 2, 0)) * 1.05
+            # Left and right candidates alternate which comes first, as in seaborn
+            left_first = np.arange(len(neighbors_x)) % 2 == 0
+            candidates = np.empty(2 * len(neighbors_x) + 1)
+            candidates[0] = x[i]
+            candidates[1::2] = np.where(left_first, neighbors_x - dx, neighbors_x + dx)
+            candidates[2::2] = np.where(left_first, neighbors_x + dx, neighbors_x - dx)
+            candidates = candidates[np.argsort(np.abs(candidates - midline))]
+            sq_dy = np.square(neighbors_y - y_i)
+            sep_needed = np.square(neighbors_r + r_i)
+            # Each neighbour blocks an open interval of x; slightly narrowed, the union of those intervals
+            # passes every candidate seaborn could accept, and the exact test then confirms them in order
+            half = np.sqrt(np.maximum(sep_needed - sq_dy, 0)) * (1 - 1e-9)
+            order = np.argsort(neighbors_x - half)
+            starts = (neighbors_x - half)[order]
+            reach_x = np.maximum.accumulate((neighbors_x + half)[order])
+            covering = np.searchsorted(starts, candidates, side="left") - 1
+            free = (covering < 0) | (reach_x[np.maximum(covering, 0)] <= candidates)
+            for candidate in candidates[free]:
+                if np.all(np.square(neighbors_x - candidate) + sq_dy >= sep_needed):
+                    placed_x[i] = candidate
+                    break
+            else:
+                raise RuntimeError("No non-overlapping candidates found. This should not happen.")
+        _layout.seconds = getattr(_layout, "seconds", 0.0) + time.perf_counter() - started
+        _layout.points = getattr(_layout, "points", 0) + len(orig_xyr)
+        return np.c_[placed_x, y, r]
+
+# Wrap a seaborn categorical function so its swarms are laid out by FastBeeswarm (and it caches under its own name);
+# the class is swapped into seaborn only for the duration of the call, and gives seaborn's layout to any thread
+def fast_beeswarm(plot):
+    @functools.wraps(plot)
+    def fast(*args, **kwargs):
+        with patched(seaborn.categorical, "Beeswarm", FastBeeswarm):
+            return plot(*args, **kwargs)
+    fast.__name__ = f"fast_{plot.__name__}"
+    return fast
+
+fast_swarmplot = fast_beeswarm(seaborn.categorical.swarmplot)
+fast_catplot = fast_beeswarm(seaborn.categorical.catplot)
+
+# Size of the largest swarm seaborn would lay out for this data
+def largest_swarm(data, category, hue=None, dodge=False):
+    by = [column for column in (category, hue if dodge else None) if column is not None]
+    if not by:
+        return len(data)
+    return int(data.groupby(by, observed=True).size().max()) if len(data) else 0
+
+# Strip plot whose jitter follows each group's density, so the outline reads like a swarm or violin (a sina plot)
+def density_stripplot(data=None, orient="x", width=0.8, seed=0, ax=None, **kwargs):
+    ax = seaborn.categorical.stripplot(data=data, orient=orient, jitter=False, ax=ax, **kwargs)
+    hue = kwargs.get("hue")
+    levels = data[hue].nunique() if kwargs.get("dodge") and hue is not None else 1
+    half_width = width / 2 / levels
+    value_axis = 1 if orient == "x" else 0
+    log_values = (ax.get_yscale() if orient == "x" else ax.get_xscale()) == "log"
+    rng = np.random.default_rng(seed)
+    for points in ax.collections:
+        offsets = np.asarray(points.get_offsets(), dtype=float)
+        if len(offsets) < 2:
+            continue
+        values = offsets[:, value_axis]
+        if log_values:
+            values = np.log10(values)
+        covariance = kde_covariance(values)
+        grid = np.linspace(values.min(), values.max(), 200)
+        density = binned_kde_1d(values, grid, covariance) if covariance is not None and np.all(np.isfinite(covariance)) else None
+        if density is None or density.max() <= 0:
+            continue
+        spread = np.interp(values, grid, density) / density.max() * half_width
+        offsets[:, 1 - value_axis] += rng.uniform(-1, 1, len(offsets)) * spread
+        points.set_offsets(offsets)
+    return ax
+
+# Plot drawn instead of a swarm above the point budget
+def swarm_fallback(kind):
+    return density_stripplot if kind == "density" else seaborn.categorical.stripplot
+
+# Swarm plot as the swarm page draws it: laid out by FastBeeswarm while the largest swarm fits the point budget,
+# and drawn as a `fallback` strip above it
+def budget_swarmplot(data=None, x=None, y=None, hue=None, dodge=False, orient=None, point_budget=SWARM_POINTS, fallback="density", **kwargs):
+    orient = infer_orient(data[x] if x is not None else None, data[y] if y is not None else None, orient, require_numeric=False)
+    if largest_swarm(data, x if orient == "x" else y, hue, dodge) > point_budget:
+        return swarm_fallback(fallback)(data=data, x=x, y=y, hue=hue, dodge=dodge, orient=orient, **kwargs)
+    return fast_swarmplot(data=data, x=x, y=y, hue=hue, dodge=dodge, orient=orient, **kwargs)
@@ -4,30 +4,39 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from io import BytesIO
-import chardet
+from LOAD import *
+from RENDER import *
 from REL import *
 from DIS import *
 from CAT import *
 from REG import *
 from REL import *
-# Function to detect file encoding
-def detect_encoding(file):
-    raw_data = file.read()
-    file.seek(0)  # Reset file pointer to the beginning
-    result = chardet.detect(raw_data)
-    return result['encoding']
-
-# Function to read uploaded file into a DataFrame
-def read_file(file, encoding):
-    try:
-        if file.type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" or file.type == "application/vnd.ms-excel":
-            df = pd.read_excel(file)
+# Function to show dataset cache usage and the last encoding detection
+def show_cache_status():
+    with st.expander("Dataset cache"):
+        cache_mb = st.number_input("Cache size (MB)", min_value=16, value=DATASET_CACHE_BYTES // (1024 * 1024), step=64, help="Memory bound for parsed datasets; least recently used entries are evicted first")
+        DATASET_CACHE.resize(int(cache_mb) * 1024 * 1024)
+        stats = DATASET_CACHE.stats()
+        st.caption(f"{stats['hits']} hits / {stats['misses']} misses, {stats['entries']} datasets, {stats['bytes'] / 1e6:.1f} of {stats['max_bytes'] / 1e6:.0f} MB")
+        if 'encoding_detection' in st.session_state:
+            detection = st.session_state['encoding_detection']
+            st.caption(f"Encoding {detection.encoding} ({detection.mode} scan, {detection.confidence:.0%} confidence) from {detection.bytes_examined / 1e3:.0f} kB in {detection.seconds * 1000:.0f} ms")
+    with st.expander("Render cache"):
+        stats = RENDER_CACHE.stats()
+        st.caption(f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}), {stats['entries']} images, {stats['bytes'] / 1e6:.1f} of {stats['max_bytes'] / 1e6:.0f} MB")
+        st.caption(f"{len(session_plots())} stored plots, {session_plot_bytes() / 1e6:.1f} of {SESSION_PLOT_BYTES / 1e6:.0f} MB for this session")
+    with st.expander("Disk cache"):
+        if not DISK_CACHE.available:
+            st.caption("Install pyarrow to keep parsed datasets on disk between sessions")
         else:
-            df = pd.read_csv(file, encoding=encoding)
-        return df
-    except Exception as e:
-        st.error(f"Error reading file: {e}")
-        return None
+            stats = DISK_CACHE.stats()
+            st.caption(f"{stats['hits']} hits / {stats['misses']} misses, {stats['entries']} files, {stats['bytes'] / 1e6:.1f} of {stats['max_bytes'] / 1e6:.0f} MB in {DISK_CACHE.root}")
+            entries = DISK_CACHE.entries()
+            if entries:
+                st.dataframe(pd.DataFrame(entries).drop(columns="mtime"), hide_index=True)
+            if st.button("Clear disk cache", use_container_width=True):
+                DISK_CACHE.clear()
+                st.rerun()
 
 # Main function for the Streamlit app
 def main():
@@ -37,11 +46,38 @@ def main():
         st.header("Upload Data")
         uploaded_file = st.file_uploader("Upload CSV or Excel file", type=["csv", "xlsx"])
         if uploaded_file is not None:
-            # Detect encoding and read file
-            encoding = detect_encoding(uploaded_file)
-            df = read_file(uploaded_file, encoding)
+            streaming = uploaded_file.type not in EXCEL_TYPES and st.checkbox("Streaming mode", False, help="Aggregate the CSV chunk by chunk in bounded memory instead of loading it whole; only streamed plots are available")
+            if streaming:
+                df = None
+                profile = load_profile(uploaded_file)
+                if profile is not None:
+                    st.success(f"Streamed {profile.rows:,} rows!")
+                    show_cache_status()
+                    st.write("Column Summary:")
+                    st.dataframe(profile.summary())
+            else:
+                profile = None
+                compact = st.checkbox("Compact dtypes", False, help="Store low-cardinality text as categories, downcast numbers where lossless and parse date columns")
+                if uploaded_file.type in EXCEL_TYPES:
+                    engine = "c"
+                else:
+                    engine = st.selectbox("CSV parse engine", options=CSV_ENGINES, index=0, help="'pyarrow' parses on all cores into Arrow-backed columns; 'auto' uses it for files over 32 MB")
+                lazy = st.checkbox("Lazy column loading", uploaded_file.type in EXCEL_TYPES, help="Read each column only when a plot uses it; best for wide spreadsheets")
+                if lazy:
+                    df = load_lazy(uploaded_file, compact=compact, engine=engine)
+                else:
+                    all_columns = read_columns(uploaded_file)
+                    usecols = st.multiselect("Columns to read", options=all_columns, default=all_columns, help="Only the selected columns are parsed")
+                    # Reuse the parsed dataset when the same upload was already read
+                    df = load_dataset(uploaded_file, compact=compact, engine=engine, usecols=usecols if usecols and len(usecols) < len(all_columns) else None)
             if df is not None:
                 st.success("File successfully loaded!")
+                show_cache_status()
+                if compact and st.session_state.get('compaction_report') is not None:
+                    with st.expander("Dtype compaction"):
+                        report = st.session_state['compaction_report']
+                        st.caption(f"{report['bytes before'].sum() / 1e6:.1f} MB before, {report['bytes after'].sum() / 1e6:.1f} MB after compaction")
+                        st.dataframe(report, hide_index=True)
                 st.write("Data Preview:")
                 st.dataframe(df.head())
                 # Option menu for selecting chart types
@@ -52,6 +88,16 @@ def main():
                     default_index=0,
                 )
 
+    if uploaded_file is not None and profile is not None:
+        st.subheader("Streamed Plots")
+        chart_type = st.selectbox("Select Chart", ["Histogram", "ECDF", "Countplot"])
+        if chart_type=="Histogram":
+            show_streamed_histplot(profile)
+        elif chart_type=="ECDF":
+            show_streamed_ecdfplot(profile)
+        else:
+            show_streamed_countplot(profile)
+
     if uploaded_file is not None and df is not None:
         # Relational Plots
         if selected_chart == "Relational Plots":
@@ -0,0 +1,76 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import BATCH
+from BATCH import load_specs, main, read_dataset, spec_errors
+from CACHE import DiskCache
+
+
+@pytest.fixture(autouse=True)
+def disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(BATCH, "DISK_CACHE", DiskCache(str(tmp_path / "cache"), 64 * 1024 * 1024))
+
+
+def write_dataset(path, n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({"x": rng.normal(size=n), "y": rng.normal(size=n), "g": rng.choice(["été", "hiver"], n), "t": np.arange(n) % 50})
+    data.to_csv(path, index=False, encoding="utf-16")
+    return data
+
+
+def test_read_dataset_detects_the_encoding(tmp_path):
+    path = str(tmp_path / "data.csv")
+    data = write_dataset(path)
+    read = read_dataset(path)
+    assert set(read["g"]) == {"été", "hiver"}
+    assert np.allclose(read["x"], data["x"])
+    # The second read comes from the disk cache
+    hits = BATCH.DISK_CACHE.hits
+    assert read_dataset(path).equals(read)
+    assert BATCH.DISK_CACHE.hits == hits + BATCH.DISK_CACHE.available
+
+
+def test_read_dataset_reports_unparsable_files(tmp_path):
+    path = str(tmp_path / "empty.csv")
+    open(path, "w").close()
+    with pytest.raises(ValueError, match="could not be parsed"):
+        read_dataset(path)
+
+
+def test_spec_errors():
+    specs = [{"plot": "histplot"}, {"plot": "nope"}, {"plot": "kdeplot", "format": "gif"}, {"plot": "histplot", "name": "000-histplot"}]
+    assert spec_errors(specs, "png") == [
+        "spec 1: unknown plot 'nope'", "spec 2: format must be one of png, svg, pdf", "spec 3: the output name '000-histplot' is used twice",
+    ]
+
+
+def test_load_specs_needs_a_list(tmp_path):
+    path = str(tmp_path / "specs.json")
+    with open(path, "w") as handle:
+        json.dump({"plot": "histplot"}, handle)
+    with pytest.raises(ValueError, match="list of plot specs"):
+        load_specs(path)
+
+
+def test_main_renders_every_spec_and_writes_a_manifest(tmp_path):
+    dataset, specs, output = str(tmp_path / "data.csv"), str(tmp_path / "specs.json"), str(tmp_path / "plots")
+    write_dataset(dataset)
+    with open(specs, "w") as handle:
+        json.dump([
+            {"plot": "lineplot", "x": "t", "y": "y", "hue": "g"},
+            {"plot": "swarmplot", "x": "g", "y": "x", "point_budget": 100},
+            {"plot": "boxplot", "x": "g", "y": "x", "format": "svg"},
+            {"plot": "heatmap", "correlation": "spearman", "name": "corr"},
+            {"plot": "histplot", "x": "missing"},
+        ], handle)
+    assert main([dataset, specs, "-o", output, "-j", "1"]) == 1
+    with open(os.path.join(output, "manifest.json")) as handle:
+        manifest = json.load(handle)
+    assert manifest["rows"] == 400 and manifest["workers"] == 1
+    assert [entry["status"] for entry in manifest["plots"]] == ["ok", "ok", "ok", "ok", "error"]
+    for entry in manifest["plots"][:4]:
+        assert os.path.getsize(entry["file"]) == entry["bytes"] > 0
+    assert manifest["plots"][2]["file"].endswith("002-boxplot.svg")
+    assert manifest["plots"][3]["file"].endswith("corr.png")
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from seaborn._statistics import EstimateAggregator
+import STATS
+from STATS import BootstrapErrorbar, bootstrap_errorbar, bootstrap_interval, bootstrap_intervals, grouped_values, values_digest
+
+
+def sorted_group(n, seed):
+    return np.sort(np.random.default_rng(seed).lognormal(size=n))
+
+
+@pytest.mark.parametrize("estimator", ["mean", "median"])
+def test_interval_matches_seaborn_bootstrap(estimator):
+    values = sorted_group(3000, 1)
+    low, high = bootstrap_interval(values, values_digest(values), estimator, n_boot=4000, level=95, seed=0)
+    frame = pd.DataFrame({"y": values})
+    reference = EstimateAggregator(estimator, ("ci", 95), n_boot=4000, seed=0)(frame, "y")
+    width = reference["ymax"] - reference["ymin"]
+    # Two independent bootstraps of the same percentile interval differ only by Monte Carlo noise
+    assert low == pytest.approx(reference["ymin"], abs=0.05 * width)
+    assert high == pytest.approx(reference["ymax"], abs=0.05 * width)
+
+
+def test_interval_is_reproducible_and_independent_of_other_groups():
+    first, second = sorted_group(500, 2), sorted_group(800, 3)
+    alone = bootstrap_intervals([(values_digest(first), first)], seed=7)
+    together = bootstrap_intervals([(values_digest(first), first), (values_digest(second), second)], seed=7)
+    assert alone[values_digest(first)] == together[values_digest(first)]
+
+
+def test_pool_gives_the_inline_intervals(monkeypatch):
+    groups = [sorted_group(400 + 100 * index, index) for index in range(4)]
+    jobs = [(values_digest(values), values) for values in groups]
+    inline = bootstrap_intervals(jobs, n_boot=200, seed=3, workers=1)
+    monkeypatch.setattr(STATS, "BOOTSTRAP_WORKERS", 2)
+    monkeypatch.setattr(STATS, "BOOTSTRAP_PARALLEL_DRAWS", 0)
+    try:
+        pooled = bootstrap_intervals(jobs, n_boot=200, seed=3)
+    finally:
+        STATS.reset_bootstrap_pool()
+    assert pooled == inline
+
+
+def test_errorbar_answers_every_group_it_precomputed():
+    rng = np.random.default_rng(4)
+    data = pd.DataFrame({"g": rng.choice(list("abc"), 900), "y": rng.normal(size=900)})
+    errorbar = bootstrap_errorbar(data, "y", ["g"], "mean", ("ci", 90), 300, seed=1)
+    assert isinstance(errorbar, BootstrapErrorbar)
+    for level, group in data.groupby("g"):
+        values = np.sort(group["y"].to_numpy())
+        assert errorbar(group["y"].to_numpy()) == bootstrap_interval(values, values_digest(values), "mean", 300, 90, 1)
+    assert len(grouped_values(data, "y", ["g"])) == 3
+
+
+def test_unsupported_errorbars_are_left_to_seaborn():
+    data = pd.DataFrame({"y": [1.0, 2.0, 3.0]})
+    assert bootstrap_errorbar(data, "y", [], "mean", "sd", 100) == "sd"
+    assert bootstrap_errorbar(data, "y", [], "count", ("ci", 95), 100) == ("ci", 95)
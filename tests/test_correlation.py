@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+import MATRIX
+from MATRIX import compute_correlation, correlation_intervals, correlation_matrix, correlation_pvalues, significance_view
+
+
+def frame(n=300, k=7, missing=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(n, k)) @ rng.normal(size=(k, k))
+    values[:, 0] += 1e6
+    values[rng.random((n, k)) < missing] = np.nan
+    return pd.DataFrame(values, columns=[f"c{i}" for i in range(k)])
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Several block pairs even for a handful of columns, so the assembly of the blocked matrix is exercised
+    column_blocks = MATRIX.column_blocks
+    monkeypatch.setattr(MATRIX, "column_blocks", lambda k: column_blocks(k, 3))
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman", "kendall"])
+@pytest.mark.parametrize("missing", [0.0, 0.2])
+def test_matches_pandas(small_blocks, method, missing):
+    data = frame(missing=missing)
+    corr, counts = compute_correlation(data, method, workers=2)
+    assert np.allclose(corr, data.corr(method=method), atol=1e-10, equal_nan=True)
+    present = data.notna().to_numpy(dtype=float)
+    assert np.array_equal(counts.to_numpy(), present.T @ present)
+
+
+def test_min_periods_and_constant_columns_follow_pandas():
+    data = frame(n=40, missing=0.6)
+    data["flat"] = 1.0
+    corr, _ = compute_correlation(data, min_periods=10)
+    assert np.allclose(corr, data.corr(min_periods=10), equal_nan=True)
+
+
+def test_cached_matrix_is_reused():
+    data = frame()
+    corr, counts = correlation_matrix(data, "spearman")
+    assert correlation_matrix(data, "spearman")[0] is corr
+    assert np.allclose(corr, data.corr("spearman"))
+
+
+@pytest.mark.parametrize("method, test", [("pearson", stats.pearsonr), ("spearman", stats.spearmanr), ("kendall", stats.kendalltau)])
+def test_pvalues_match_scipy(method, test):
+    data = frame(missing=0.1)
+    corr, counts = compute_correlation(data, method)
+    pvalues = correlation_pvalues(corr, counts, method)
+    for i, a in enumerate(data.columns):
+        for b in data.columns[i + 1:]:
+            pair = data[[a, b]].dropna()
+            expected = test(pair[a], pair[b]).pvalue
+            assert pvalues.loc[a, b] == pytest.approx(expected, rel=1e-6, abs=1e-12)
+
+
+def test_pearson_interval_matches_scipy():
+    data = frame()
+    corr, counts = compute_correlation(data)
+    lower, upper = correlation_intervals(corr, counts, level=0.9)
+    expected = stats.pearsonr(data["c1"], data["c2"]).confidence_interval(0.9)
+    assert (lower.loc["c1", "c2"], upper.loc["c1", "c2"]) == pytest.approx((expected.low, expected.high))
+
+
+def test_significance_view_blanks_insignificant_cells():
+    data = frame()
+    data["noise"] = np.random.default_rng(9).normal(size=len(data))
+    corr, counts = compute_correlation(data)
+    pvalues = correlation_pvalues(corr, counts)
+    view = significance_view(corr, counts, alpha=0.01)
+    assert view.isna().equals(~(pvalues <= 0.01))
+    assert np.allclose(view, corr.where(pvalues <= 0.01), equal_nan=True)
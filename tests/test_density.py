@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn
+import seaborn.categorical
+import seaborn.distributions
+from matplotlib.figure import Figure
+from scipy.stats import gaussian_kde
+from seaborn._statistics import Histogram
+from DENSITY import bin_histogram, binned_kde_1d, binned_kde_2d, binned_kdeplot, binned_violinplot, histogram_edges, kde_covariance, kde_support
+
+
+def sample(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.concatenate([rng.normal(0, 1, n // 2), rng.normal(4, 0.5, n - n // 2)])
+
+
+def test_histogram_matches_numpy_and_seaborn_edges():
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame({"x": sample(), "g": rng.choice(list("abc"), 20000)})
+    frame, weight, edges = bin_histogram(data, "x", ["g"], bins="auto")
+    assert np.allclose(edges, np.histogram_bin_edges(data["x"], "auto"))
+    for level, group in data.groupby("g"):
+        counts, _ = np.histogram(group["x"], edges)
+        drawn = frame[frame["g"] == level]
+        assert drawn[weight].sum() == len(group)
+        assert np.array_equal(drawn[weight].to_numpy(), counts[counts > 0])
+
+
+def test_discrete_edges_follow_seaborn():
+    values = np.array([1.0, 2.0, 2.0, 5.0])
+    assert np.array_equal(histogram_edges(values, discrete=True), np.arange(0.5, 6.0))
+
+
+@pytest.mark.parametrize("values, binwidth", [
+    (np.linspace(0, 10, 50), 2), (np.linspace(0, 10, 50), 3), (np.linspace(0, 10, 50), 25), (np.array([0.1, 0.35, 0.7]), 0.1), (np.array([4.0, 4.0]), 1),
+])
+def test_binwidth_edges_follow_seaborn(values, binwidth):
+    params = Histogram(binwidth=binwidth).define_bin_params(values)
+    edges = histogram_edges(values, binwidth=binwidth)
+    assert np.allclose(edges, np.histogram_bin_edges(values, **params))
+    assert np.allclose(np.diff(edges), binwidth) and edges[-1] >= values.max()
+    frame, weight, edges = bin_histogram(pd.DataFrame({"x": values}), "x", binwidth=binwidth)
+    counts = np.histogram(values, **params)[0]
+    assert frame[weight].tolist() == counts[counts > 0].tolist()
+
+
+@pytest.mark.parametrize("bw_method, cumulative", [("scott", False), ("silverman", False), ("scott", True)])
+def test_binned_kde_matches_scipy(bw_method, cumulative):
+    values = sample()
+    covariance = kde_covariance(values, bw_method=bw_method)
+    grid = kde_support(values, np.sqrt(covariance[0, 0]), 3, 200)
+    binned = binned_kde_1d(values, grid, covariance, cumulative=cumulative)
+    exact = gaussian_kde(values, bw_method=bw_method)
+    truth = np.array([exact.integrate_box_1d(-np.inf, point) for point in grid]) if cumulative else exact(grid)
+    assert np.abs(binned - truth).max() < 1e-3 * truth.max()
+
+
+def test_weighted_binned_kde_matches_scipy():
+    values = sample(5000, 2)
+    weights = np.random.default_rng(3).uniform(0.5, 2, len(values))
+    covariance = kde_covariance(values, weights)
+    grid = kde_support(values, np.sqrt(covariance[0, 0]), 3, 200)
+    truth = gaussian_kde(values, weights=weights)(grid)
+    assert np.abs(binned_kde_1d(values, grid, covariance, weights) - truth).max() < 1e-3 * truth.max()
+
+
+def test_bivariate_binned_kde_matches_scipy():
+    rng = np.random.default_rng(4)
+    values = rng.multivariate_normal([0, 1], [[1, 0.6], [0.6, 2]], 4000).T
+    covariance = kde_covariance(values)
+    grid1 = kde_support(values[0], np.sqrt(covariance[0, 0]), 3, 50)
+    grid2 = kde_support(values[1], np.sqrt(covariance[1, 1]), 3, 50)
+    mesh1, mesh2 = np.meshgrid(grid1, grid2, indexing="ij")
+    truth = gaussian_kde(values)([mesh1.ravel(), mesh2.ravel()]).reshape(mesh1.shape)
+    assert np.abs(binned_kde_2d(values[0], values[1], grid1, grid2, covariance) - truth).max() < 2e-3 * truth.max()
+
+
+def test_kdeplot_draws_seaborns_curve_and_restores_seaborn():
+    originals = seaborn.distributions.KDE, seaborn.categorical.KDE
+    data = pd.DataFrame({"x": sample()})
+    exact = seaborn.kdeplot(data=data, x="x", ax=Figure().subplots()).lines[0].get_xydata()
+    binned = binned_kdeplot(data=data, x="x", ax=Figure().subplots()).lines[0].get_xydata()
+    assert np.array_equal(exact[:, 0], binned[:, 0])
+    # Close to the exact curve, but not identical to it: the binned estimator did the drawing
+    assert 0 < np.abs(exact[:, 1] - binned[:, 1]).max() < 1e-3 * exact[:, 1].max()
+    assert (seaborn.distributions.KDE, seaborn.categorical.KDE) == originals
+
+
+def test_violinplot_patch_is_scoped_to_the_call():
+    original = seaborn.categorical.KDE
+    data = pd.DataFrame({"x": sample(), "g": np.repeat(["a", "b"], 10000)})
+    binned_violinplot(data=data, x="g", y="x", ax=Figure().subplots())
+    assert seaborn.categorical.KDE is original
@@ -0,0 +1,100 @@
+import pickle
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn
+import FACET
+from FACET import common_norm_factor, draw_panel, facet_caption, facet_stats, panel_limits, parallel_facets, rasterize_panel, shared_limits, shared_semantics
+
+
+@pytest.fixture(autouse=True)
+def inline(monkeypatch):
+    # Panels are drawn in this process; the pool only moves the same calls elsewhere
+    monkeypatch.setattr(FACET, "FACET_WORKERS", 1)
+
+
+def frame(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    g = rng.choice(["a", "b", "c"], n, p=[0.6, 0.3, 0.1])
+    return pd.DataFrame({"x": rng.normal(size=n) * np.where(g == "a", 1, 3) + np.where(g == "c", 10, 0), "y": rng.exponential(size=n),
+                         "g": g, "h": rng.choice(["p", "q"], n)})
+
+
+# Limits of seaborn's own grid, and the ones shared_limits finds from the panels drawn one at a time
+def grid_and_panel_limits(name, data, col, **kwargs):
+    grid = FACET.FACET_PLOTS[name][0](data=data, col=col, **kwargs)
+    plt.close(grid.figure)
+    family = FACET.FACET_PLOTS[name][1]
+    panel_kws = {**kwargs, **shared_semantics(family, data, kwargs), "legend": False}
+    drawn = [draw_panel(name, panel, panel_kws, common_norm_factor(name, family, panel, data, kwargs)) for _, panel in data.groupby(col, sort=False)]
+    shared = [shared_limits([limits[axis] for _, _, limits in drawn], mpl.rcParams[f"axes.{axis}margin"]) for axis in "xy"]
+    return (grid.axes.flat[0].get_xlim(), grid.axes.flat[0].get_ylim()), shared, drawn
+
+
+@pytest.mark.parametrize("name, kwargs", [
+    ("relplot", {"x": "x", "y": "y", "hue": "h"}),
+    ("displot", {"x": "x", "hue": "h"}),
+    ("displot", {"x": "x", "stat": "density"}),
+    ("displot", {"x": "x", "kind": "kde"}),
+    ("catplot", {"x": "h", "y": "x", "kind": "box"}),
+    ("catplot", {"x": "x", "y": "h", "kind": "strip"}),
+    ("lmplot", {"x": "x", "y": "y", "hue": "h"}),
+])
+def test_shared_limits_match_seaborns_grid(name, kwargs):
+    expected, shared, _ = grid_and_panel_limits(name, frame(), "g", **kwargs)
+    assert np.allclose(shared, expected)
+
+
+def test_common_norm_rescales_panels_like_seaborn():
+    data = frame()
+    grid = seaborn.displot(data=data, x="x", col="g", stat="density")
+    plt.close(grid.figure)
+    _, _, drawn = grid_and_panel_limits("displot", data, "g", x="x", stat="density")
+    for ax, (figure, _, _) in zip(grid.axes.flat, drawn):
+        heights = [patch.get_height() for patch in figure.axes[0].patches]
+        assert np.allclose(heights, [patch.get_height() for patch in ax.patches])
+
+
+def test_workers_return_limits_and_pixels_not_figures():
+    data = frame()
+    task = ("relplot", data, {"x": "x", "y": "y", "hue": "h", "legend": False}, 1.0)
+    figure, labels, limits = draw_panel(*task)
+    # What the first pass sends back is a few numbers, however many points the panel draws
+    assert pickle.loads(pickle.dumps(panel_limits(*task))) == (labels, limits)
+    assert len(pickle.dumps(panel_limits(*task))) < 2000
+    args = ((-5, 20), (0, 10), "g = a", labels, True, True, (True, True), (3, 2), 50)
+    redrawn, origin = rasterize_panel(task, *args)
+    pixels, drawn_origin = rasterize_panel(figure, *args)
+    assert origin == drawn_origin and np.array_equal(redrawn, pixels)
+
+
+def test_shared_semantics_follow_the_whole_dataset():
+    data = frame()
+    data["size"] = np.arange(len(data))
+    shared = shared_semantics("relplot", data, {"x": "x", "y": "y", "hue": "g", "size": "size"})
+    assert shared["hue_order"] == list(pd.unique(data["g"]))
+    assert shared["size_norm"] == (0.0, len(data) - 1.0)
+    bins = shared_semantics("displot", data, {"x": "x"})["bins"]
+    assert np.allclose(bins, np.histogram_bin_edges(data["x"], "auto"))
+
+
+def test_parallel_grid_draws_every_panel():
+    figure = parallel_facets(seaborn.relplot)(data=frame(), x="x", y="y", hue="h", col="g", col_wrap=2)
+    assert facet_stats()["panels"] == 3 and facet_stats()["fallback"] is None
+    assert facet_caption().startswith("Drew 3 facets")
+    assert len(figure.axes) == 1 and figure.axes[0].images
+
+
+@pytest.mark.parametrize("kwargs, reason", [
+    ({}, "there are no facets"),
+    ({"col": "g", "facet_kws": {"sharex": "col"}}, "the parallel renderer does not reproduce axes shared by row or column"),
+    ({"col": "g", "multiple": "fill", "hue": "h"}, "the parallel renderer does not reproduce filled distributions"),
+])
+def test_unsupported_grids_fall_back_to_seaborn(kwargs, reason):
+    grid = parallel_facets(seaborn.displot)(data=frame(), x="x", **kwargs)
+    plt.close(grid.figure)
+    assert isinstance(grid, seaborn.FacetGrid)
+    assert facet_stats()["fallback"] == reason
+    assert facet_caption() == f"Drawn by seaborn in one process: {reason}"
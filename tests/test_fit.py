@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn
+import seaborn.regression
+from matplotlib.figure import Figure
+from scipy import stats
+from FIT import PolynomialFit, analytic_regplot, fit_groups, grouped_lmplot, lowess_regplot
+
+
+def sample(n=400, low=0, high=10, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(low, high, n)
+    u = (x - low) / (high - low)
+    return x, np.sin(6 * u) + rng.normal(0, 0.2, n)
+
+
+# The textbook OLS band: yhat +- t * sqrt(s^2 g' (X'X)^-1 g) on the raw Vandermonde matrix
+def ols_band(x, y, grid, order, level=95):
+    design = np.vander(x, order + 1)
+    beta, rss = np.linalg.lstsq(design, y, rcond=None)[:2]
+    dof = len(x) - order - 1
+    points = np.vander(grid, order + 1)
+    leverage = np.einsum("ij,jk,ik->i", points, np.linalg.inv(design.T @ design), points)
+    half = stats.t.ppf(0.5 + level / 200, dof) * np.sqrt(rss[0] / dof * leverage)
+    yhat = points @ beta
+    return yhat - half, yhat + half
+
+
+@pytest.mark.parametrize("order", [1, 2, 3, 5])
+def test_polynomial_fit_matches_polyfit(order):
+    x, y = sample(low=1000, high=1010)
+    fit = PolynomialFit(x, y, order)
+    grid = np.linspace(1000, 1010, 50)
+    # Polynomial.fit maps x onto [-1, 1] first, so it stays exact where np.polyfit is poorly conditioned
+    assert np.allclose(fit.predict(grid), np.polynomial.Polynomial.fit(x, y, order)(grid), atol=1e-8)
+    if order <= 3:
+        assert np.allclose(fit.predict(grid), np.polyval(np.polyfit(x, y, order), grid), atol=1e-6)
+
+
+@pytest.mark.parametrize("order", [1, 3])
+def test_band_matches_closed_form(order):
+    x, y = sample(n=60)
+    grid = np.linspace(0, 10, 30)
+    band = PolynomialFit(x, y, order).band(grid, 90)
+    assert np.allclose(band, ols_band(x, y, grid, order, 90))
+
+
+def test_regplot_draws_the_analytic_band_and_restores_seaborn():
+    original = seaborn.regression._RegressionPlotter
+    # Importing FIT leaves seaborn's own plotter in place
+    assert original.__module__ == "seaborn.regression"
+    x, y = sample(n=80)
+    ax = analytic_regplot(x=x, y=y, order=2, truncate=True, ax=Figure().subplots())
+    assert seaborn.regression._RegressionPlotter is original
+    grid = ax.lines[0].get_xdata()
+    assert np.allclose(ax.lines[0].get_ydata(), np.polyval(np.polyfit(x, y, 2), grid))
+    lower, upper = ols_band(x, y, grid, 2)
+    vertices = ax.collections[-1].get_paths()[0].vertices
+    expected = np.concatenate([np.interp(vertices[:, 0], grid, lower)[:, None], np.interp(vertices[:, 0], grid, upper)[:, None]], axis=1)
+    assert np.allclose(np.abs(expected - vertices[:, 1:]).min(axis=1), 0, atol=1e-9)
+
+
+def test_analytic_band_is_close_to_seaborns_bootstrap():
+    x, y = sample(n=200)
+    analytic = analytic_regplot(x=x, y=y, ax=Figure().subplots()).collections[-1].get_paths()[0].vertices
+    boot = seaborn.regplot(x=x, y=y, seed=0, ax=Figure().subplots()).collections[-1].get_paths()[0].vertices
+    width = np.ptp(analytic[:, 1])
+    assert np.abs(analytic - boot).max() < 0.1 * width
+
+
+def test_lowess_regplot_needs_no_statsmodels_and_restores_seaborn():
+    original = seaborn.regression._RegressionPlotter
+    x = np.random.default_rng(2).uniform(0, 10, 400)
+    y = 2 * x + np.random.default_rng(3).normal(0, 0.5, 400)
+    ax = lowess_regplot(x=x, y=y, lowess=True, ax=Figure().subplots())
+    assert seaborn.regression._RegressionPlotter is original
+    line = ax.lines[0]
+    assert np.abs(line.get_ydata() - 2 * line.get_xdata()).max() < 0.3
+
+
+def offset_groups(ranges, n=300, seed=0):
+    frames = []
+    for index, (low, high) in enumerate(ranges):
+        x, y = sample(n, low, high, seed + index)
+        frames.append(pd.DataFrame({"x": x, "y": y, "g": f"g{index}"}))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("ranges", [[(0, 10), (1000, 1010)], [(0, 1), (100, 101)]])
+@pytest.mark.parametrize("order", [1, 3])
+def test_grouped_fits_match_polyfit_on_offset_groups(ranges, order):
+    data = offset_groups(ranges)
+    fits = fit_groups(data, "x", "y", ["g"], order)
+    table = fits.table()
+    for (low, high), (_, group) in zip(ranges, data.groupby("g", sort=False)):
+        x, y = group["x"].to_numpy(), group["y"].to_numpy()
+        expected = np.polynomial.Polynomial.fit(x, y, order)
+        fit = fits.find(x, y)
+        grid = np.linspace(low, high, 50)
+        assert np.allclose(fit.predict(grid), expected(grid), atol=1e-8)
+        assert np.allclose(fit.band(grid), PolynomialFit(x, y, order).band(grid))
+        residuals = y - expected(x)
+        row = table[table["g"] == group["g"].iloc[0]].iloc[0]
+        assert row["residual sd"] == pytest.approx(np.sqrt(residuals @ residuals / (len(x) - order - 1)))
+        assert row["r2"] == pytest.approx(1 - residuals @ residuals / np.sum((y - y.mean()) ** 2))
+        assert np.allclose(fit.coefficients(), expected.convert().coef, rtol=1e-6)
+
+
+def test_ill_conditioned_groups_fall_back_to_seaborn():
+    data = offset_groups([(0, 10)])
+    data = pd.concat([data, pd.DataFrame({"x": [5.0, 5.0, 5.0, 6.0], "y": [1.0, 2.0, 3.0, 4.0], "g": "flat"})], ignore_index=True)
+    fits = fit_groups(data, "x", "y", ["g"], 3)
+    flat = data[data["g"] == "flat"]
+    assert fits.find(flat["x"], flat["y"]).inverse is None
+    assert fits.find(flat["x"], flat["y"]).band(np.linspace(5, 6, 5)) is None
+    assert np.isfinite(fits.table()["intercept"]).all()
+    grid = grouped_lmplot(data=data, x="x", y="y", hue="g", order=3, truncate=True)
+    assert len(grid.ax.lines) == 2
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import seaborn
+from matplotlib.figure import Figure
+from REL import aggregated_lineplot
+from STATS import LinePyramid, downsample_lines, lttb, zoomed_rows
+
+
+# Largest-Triangle-Three-Buckets written out point by point, as in Steinarsson's description
+def reference_lttb(x, y, n_out):
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = [0]
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < n_out - 1:
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+            cx, cy = np.mean(x[next_start:next_stop]), np.mean(y[next_start:next_stop])
+        else:
+            cx, cy = x[-1], y[-1]
+        ax, ay = x[selected[-1]], y[selected[-1]]
+        best, best_area = start, -1.0
+        for i in range(start, stop):
+            area = abs((ax - cx) * (y[i] - ay) - (ax - x[i]) * (cy - ay))
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.sort(rng.uniform(0, 100, n))
+    return x, np.sin(x / 3) + rng.normal(scale=0.2, size=n)
+
+
+def test_lttb_matches_reference():
+    x, y = series(5000)
+    for n_out in (3, 10, 257, 1000):
+        assert np.array_equal(lttb(x, y, n_out), reference_lttb(x, y, n_out))
+
+
+def test_lttb_keeps_short_series():
+    x, y = series(50)
+    assert np.array_equal(lttb(x, y, 100), np.arange(50))
+
+
+def test_pyramid_bounds_vertices_inside_zoom():
+    x, y = series(100_000, 1)
+    pyramid = LinePyramid(x, y, base=512)
+    positions = pyramid.select((20.0, 40.0), max_vertices=600)
+    assert len(positions) == 600
+    assert np.all((x[positions] >= 20.0) & (x[positions] <= 40.0))
+    # The extremes of the zoomed slice survive downsampling
+    inside = (x >= 20.0) & (x <= 40.0)
+    assert y[positions].max() == y[inside].max() or y[positions].min() == y[inside].min()
+
+
+def test_downsample_lines_per_group_and_duplicates():
+    x, y = series(20_000, 2)
+    data = pd.DataFrame({"x": np.concatenate([x, x]), "y": np.concatenate([y, -y]), "g": np.repeat(["a", "b"], len(x))})
+    sampled = downsample_lines(data, "x", "y", ["g"], (10.0, 90.0), max_vertices=300)
+    assert sampled.groupby("g").size().tolist() == [300, 300]
+    assert sampled["x"].between(10.0, 90.0).all()
+    # Without a grouping column each x repeats, which only seaborn's aggregation can handle
+    assert downsample_lines(data, "x", "y", [], None) is None
+    zoomed = zoomed_rows(data, "x", (10.0, 90.0))
+    assert len(zoomed) == data["x"].between(10.0, 90.0).sum()
+
+
+def test_zoomed_rows_on_datetimes():
+    stamps = pd.date_range("2024-01-01", periods=100, freq="h")
+    data = pd.DataFrame({"x": stamps, "y": np.arange(100.0)})
+    zoomed = zoomed_rows(data, "x", (stamps[10].to_pydatetime(), stamps[19].to_pydatetime()))
+    assert zoomed["y"].tolist() == list(np.arange(10.0, 20.0))
+
+
+def test_aggregated_lineplot_draws_seaborns_lines():
+    rng = np.random.default_rng(5)
+    data = pd.DataFrame({"x": rng.integers(0, 200, 20000), "h": rng.choice(["p", "q"], 20000)})
+    data["y"] = np.sin(data["x"] / 20) + (data["h"] == "q") + rng.normal(0, 0.3, len(data))
+    exact = seaborn.lineplot(data=data, x="x", y="y", hue="h", errorbar="sd", ax=Figure().subplots())
+    aggregated = aggregated_lineplot(data=data, x="x", y="y", hue="h", errorbar="sd", ax=Figure().subplots())
+    assert len(exact.collections) == len(aggregated.collections) == 2
+    for line, other in zip(exact.lines[:2], aggregated.lines[:2]):
+        assert np.allclose(line.get_xydata(), other.get_xydata())
+    for band, other in zip(exact.collections, aggregated.collections):
+        assert np.allclose(band.get_paths()[0].vertices, other.get_paths()[0].vertices)
+
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from FIT import knn_bandwidth, lowess_accuracy, smooth_lowess
+
+
+def sample(n, seed=0, outliers=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 10, n)
+    y = np.sin(x) + rng.normal(0, 0.3, n)
+    y[rng.choice(n, outliers, replace=False)] += 8
+    return x, y
+
+
+# LOWESS as statsmodels defines it, one weighted least-squares fit per point: tricube weights over the
+# frac * n nearest x values, then `it` passes reweighting the points by the bisquare of their residuals
+def reference_lowess(x, y, frac=2 / 3, it=3):
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    n = len(x)
+    k = int(frac * n + 1e-10)
+    robustness = np.ones(n)
+    for iteration in range(it + 1):
+        fitted = np.empty(n)
+        for i in range(n):
+            distance = np.abs(x - x[i])
+            h = np.sort(distance)[k - 1]
+            weights = (1 - np.clip(distance / h, 0, 1) ** 3) ** 3 * robustness
+            design = np.stack([np.ones(n), x - x[i]], axis=1) * np.sqrt(weights)[:, None]
+            fitted[i] = np.linalg.lstsq(design, y * np.sqrt(weights), rcond=None)[0][0]
+        residuals = y - fitted
+        robustness = np.clip(1 - (residuals / (6 * np.median(np.abs(residuals)))) ** 2, 0, None) ** 2
+    return x, fitted
+
+
+@pytest.mark.parametrize("frac, it, outliers", [(2 / 3, 0, 0), (0.3, 3, 0), (0.2, 3, 15)])
+def test_exact_smoother_matches_reference(frac, it, outliers):
+    x, y = sample(300, outliers=outliers)
+    fit = smooth_lowess(x, y, frac, it, anchors=None, bins=None)
+    xs, expected = reference_lowess(x, y, frac, it)
+    assert np.allclose(fit.anchors, xs)
+    assert np.allclose(fit.fitted, expected, atol=1e-8)
+
+
+def test_binned_smoother_stays_close_to_exact():
+    x, y = sample(4000, seed=1, outliers=20)
+    exact = smooth_lowess(x, y, 0.1, anchors=None, bins=None)
+    binned = smooth_lowess(x, y, 0.1, anchors=256, bins=1024)
+    assert len(binned.anchors) <= 256
+    assert np.abs(binned.predict(exact.anchors) - exact.fitted).max() < 0.01 * y.std()
+
+
+def test_accuracy_check_reports_small_errors():
+    x, y = sample(5000, seed=2)
+    accuracy = lowess_accuracy(x, y, 0.3)
+    assert accuracy["rows"] == 2000 and accuracy["max_error"] < 0.02
+    assert lowess_accuracy(np.ones(10), np.arange(10.0)) is None
+
+
+@pytest.mark.parametrize("k", [1, 2, 7, 50])
+def test_knn_bandwidth_matches_brute_force(k):
+    rng = np.random.default_rng(3)
+    xs = np.sort(np.round(rng.normal(size=50), 1))
+    anchors = np.concatenate([xs, rng.uniform(-4, 4, 100)])
+    expected = np.sort(np.abs(xs[None, :] - anchors[:, None]), axis=1)[:, k - 1]
+    assert np.allclose(knn_bandwidth(xs, anchors, k), expected)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+import seaborn
+from scipy import stats
+from STATS import QuantileSketch
+from DENSITY import sketch_ecdf, sketch_ecdfplot
+
+
+def data(n=200_000, seed=0):
+    return np.random.default_rng(seed).lognormal(size=n)
+
+
+def test_sketch_ranks_within_the_error_bound():
+    values = data()
+    error = 0.005
+    sketch = QuantileSketch(QuantileSketch.k_for_error(error)).update(values)
+    grid = np.quantile(values, np.linspace(0.001, 0.999, 999))
+    exact = stats.ecdf(values).cdf.evaluate(grid)
+    assert np.abs(sketch.cdf(grid) - exact).max() <= 2 * error
+    assert sketch.n == len(values) and sketch.min == values.min() and sketch.max == values.max()
+    assert sketch.weighted_items()[1].sum() == len(values)
+
+
+def test_merged_sketches_match_one_sketch_of_all_rows():
+    values = data(100_000, 1)
+    k = QuantileSketch.k_for_error(0.01)
+    merged = QuantileSketch(k)
+    for chunk in np.array_split(values, 7):
+        merged.merge(QuantileSketch(k).update(chunk))
+    probabilities = np.linspace(0.01, 0.99, 99)
+    ranks = stats.ecdf(values).cdf.evaluate(merged.quantile(probabilities))
+    assert np.abs(ranks - probabilities).max() <= 0.02
+    assert merged.weighted_items()[1].sum() == len(values)
+
+
+def test_sketched_ecdfplot_follows_seaborns_ecdf():
+    rng = np.random.default_rng(2)
+    frame = pd.DataFrame({"x": data(50_000, 3), "g": rng.choice(list("ab"), 50_000)})
+    sketched, weight = sketch_ecdf(frame, "x", by=["g"], error=0.005)
+    assert len(sketched) < len(frame) / 5
+    exact_ax = seaborn.ecdfplot(data=frame, x="x", hue="g", hue_order=["a", "b"], ax=Figure().subplots())
+    sketch_ax = sketch_ecdfplot(data=sketched, x="x", hue="g", hue_order=["a", "b"], weights=weight, ax=Figure().subplots())
+    for exact_line, sketch_line in zip(exact_ax.lines, sketch_ax.lines):
+        exact_x, exact_y = exact_line.get_data()
+        sketch_x, sketch_y = sketch_line.get_data()
+        finite = np.isfinite(exact_x)
+        drawn = np.interp(exact_x[finite], sketch_x[np.isfinite(sketch_x)], sketch_y[np.isfinite(sketch_x)])
+        assert np.abs(drawn - exact_y[finite]).max() <= 0.01
+
+
+def test_common_norm_ends_each_group_at_its_share():
+    frame = pd.DataFrame({"x": np.arange(300.0), "g": ["a"] * 100 + ["b"] * 200})
+    sketched, weight = sketch_ecdf(frame, "x", by=["g"])
+    ax = sketch_ecdfplot(data=sketched, x="x", hue="g", hue_order=["a", "b"], weights=weight, common_norm=True, ax=Figure().subplots())
+    ends = sorted(line.get_ydata()[-1] for line in ax.lines)
+    assert np.allclose(ends, [1 / 3, 2 / 3])
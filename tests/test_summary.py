@@ -0,0 +1,106 @@
+import matplotlib.cbook
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn
+import seaborn.categorical
+from matplotlib.figure import Figure
+from seaborn._statistics import LetterValues
+from SUMMARY import GroupSummary, sorted_percentile, summarize_groups, summary_boxenplot, summary_boxplot, summary_violinplot
+
+
+def frame(n=6000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"v": np.concatenate([rng.standard_t(3, n // 2), rng.exponential(2, n - n // 2)]), "g": rng.choice(list("abcd"), n)})
+
+
+def test_sorted_percentile_matches_numpy():
+    values = np.sort(np.random.default_rng(1).normal(size=1001))
+    q = [0, 0.7, 25, 50, 75, 99.3, 100]
+    assert np.allclose(sorted_percentile(values, q), np.percentile(values, q))
+
+
+@pytest.mark.parametrize("whis", [1.5, 0.5, (5, 95)])
+def test_box_stats_match_matplotlib(whis):
+    values = frame()["v"].to_numpy()
+    stats = GroupSummary(values, np.arange(len(values))).box_stats(whis)
+    expected = matplotlib.cbook.boxplot_stats([values], whis=whis)[0]
+    for key in ["mean", "iqr", "cilo", "cihi", "whishi", "whislo", "q1", "med", "q3"]:
+        assert stats[key] == pytest.approx(expected[key]), key
+    assert np.array_equal(stats["fliers"], expected["fliers"])
+
+
+@pytest.mark.parametrize("k_depth", ["tukey", "proportion", "trustworthy", "full"])
+def test_letter_values_match_seaborn(k_depth):
+    values = frame()["v"].to_numpy()
+    letters = GroupSummary(values, np.arange(len(values))).letter_values(k_depth)
+    expected = LetterValues(k_depth, 0.007, 0.05)(values)
+    assert letters["k"] == expected["k"]
+    for key in ["levels", "percs", "values", "median"]:
+        assert np.allclose(letters[key], expected[key]), key
+    assert np.array_equal(np.sort(letters["fliers"]), np.sort(expected["fliers"]))
+
+
+def test_groups_partition_the_rows():
+    data = frame()
+    data.loc[::50, "v"] = np.nan
+    summaries = summarize_groups(data, "v", ["g"])
+    assert sum(summary.count for summary in summaries.groups.values()) == data["v"].notna().sum()
+    for _, group in data.groupby("g"):
+        values = group["v"].dropna().to_numpy()
+        assert summaries.find(values).count == len(values)
+
+
+@pytest.mark.parametrize("kwargs", [{"x": "g", "y": "v"}, {"x": "v", "y": "g", "hue": "h", "log_scale": True}])
+def test_boxplot_draws_what_seaborn_draws(kwargs):
+    data = frame()
+    data["v"] = data["v"].abs()
+    data["h"] = np.random.default_rng(4).choice(["p", "q", None], len(data))
+    # A category without values and a key with a missing hue still take their place on the axes
+    data.loc[data["g"] == "d", "v"] = np.nan
+    exact = seaborn.boxplot(data=data, ax=Figure().subplots(), **kwargs)
+    summary = summary_boxplot(data=data, ax=Figure().subplots(), **kwargs)
+    assert len(exact.lines) == len(summary.lines)
+    for line, other in zip(exact.lines, summary.lines):
+        assert np.allclose(line.get_xydata(), other.get_xydata())
+    assert (exact.get_xlim(), exact.get_ylim()) == (summary.get_xlim(), summary.get_ylim())
+
+
+def test_box_and_boxen_plots_are_laid_out_from_one_row_per_group(monkeypatch):
+    data = frame()
+    rows = []
+    for name in ["plot_boxes", "plot_boxens"]:
+        method = getattr(seaborn.categorical._CategoricalPlotter, name)
+        monkeypatch.setattr(seaborn.categorical._CategoricalPlotter, name, lambda self, *args, method=method, **kwargs: rows.append(len(self.plot_data)) or method(self, *args, **kwargs))
+    summary_boxplot(data=data, x="g", y="v", ax=Figure().subplots())
+    summary_boxenplot(data=data, x="g", y="v", ax=Figure().subplots())
+    assert rows == [4, 4]
+    # Bootstrapped notches need the rows
+    summary_boxplot(data=data, x="g", y="v", notch=True, bootstrap=100, ax=Figure().subplots())
+    assert rows[-1] == len(data)
+
+
+def test_boxenplot_draws_what_seaborn_draws():
+    data = frame()
+    exact = seaborn.boxenplot(data=data, x="g", y="v", ax=Figure().subplots())
+    summary = summary_boxenplot(data=data, x="g", y="v", ax=Figure().subplots())
+    assert len(exact.collections) == len(summary.collections) > 0
+    for collection, other in zip(exact.collections, summary.collections):
+        assert np.allclose(collection.get_offsets(), other.get_offsets())
+        assert all(np.allclose(path.vertices, other_path.vertices) for path, other_path in zip(collection.get_paths(), other.get_paths()))
+
+
+def test_hooks_are_installed_only_during_the_call():
+    originals = matplotlib.cbook.boxplot_stats, seaborn.categorical.LetterValues, seaborn.categorical.KDE
+    data = frame()
+    for plot in [summary_boxplot, summary_boxenplot, summary_violinplot]:
+        plot(data=data, x="g", y="v", ax=Figure().subplots())
+        assert (matplotlib.cbook.boxplot_stats, seaborn.categorical.LetterValues, seaborn.categorical.KDE) == originals
+
+
+def test_unbinned_violinplot_is_seaborns():
+    data = frame(n=600)
+    exact = seaborn.violinplot(data=data, x="g", y="v", ax=Figure().subplots())
+    summary = summary_violinplot(data=data, x="g", y="v", binned=False, ax=Figure().subplots())
+    for collection, other in zip(exact.collections, summary.collections, strict=True):
+        assert all(np.allclose(path.vertices, other_path.vertices) for path, other_path in zip(collection.get_paths(), other.get_paths()))
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn
+import seaborn.categorical
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from seaborn.categorical import Beeswarm
+from SWARM import FastBeeswarm, budget_swarmplot, fast_catplot, fast_swarmplot, largest_swarm, layout_stats, reset_layout_stats
+
+
+@pytest.mark.parametrize("n, seed", [(50, 0), (400, 1), (1500, 2)])
+def test_layout_matches_seaborns_beeswarm(n, seed):
+    rng = np.random.default_rng(seed)
+    y = np.sort(np.round(rng.normal(size=n), 2))
+    points = np.c_[np.zeros(n), y, np.full(n, 0.02)]
+    assert np.array_equal(FastBeeswarm().beeswarm(points), Beeswarm().beeswarm(points))
+
+
+# Swarms are laid out when the figure is drawn, by the Beeswarm instance created when the plot was made
+def drawn(ax):
+    FigureCanvasAgg(ax.figure).draw()
+    return ax
+
+
+def test_swarmplot_draws_seaborns_offsets_and_restores_seaborn():
+    rng = np.random.default_rng(3)
+    data = pd.DataFrame({"g": rng.choice(list("ab"), 600), "y": rng.gamma(2, size=600)})
+    exact = drawn(seaborn.swarmplot(data=data, x="g", y="y", ax=Figure().subplots()))
+    reset_layout_stats()
+    fast = drawn(fast_swarmplot(data=data, x="g", y="y", ax=Figure().subplots()))
+    for exact_points, fast_points in zip(exact.collections, fast.collections):
+        assert np.array_equal(exact_points.get_offsets(), fast_points.get_offsets())
+    assert layout_stats()[1] == 600
+    assert seaborn.categorical.Beeswarm is Beeswarm
+
+
+def test_catplot_swarm_uses_the_fast_layout():
+    data = pd.DataFrame({"g": ["a"] * 200, "y": np.linspace(0, 1, 200)})
+    reset_layout_stats()
+    grid = fast_catplot(data=data, x="g", y="y", kind="swarm")
+    reset_layout_stats()
+    FigureCanvasAgg(grid.figure).draw()
+    assert layout_stats()[1] == 200
+    assert largest_swarm(data, "g") == 200
+
+
+@pytest.mark.parametrize("x, y", [("g", "y"), ("y", "g")])
+def test_budget_swarmplot_lays_out_swarms_within_the_budget_only(x, y):
+    data = pd.DataFrame({"g": np.repeat(["a", "b"], [300, 50]), "y": np.random.default_rng(4).normal(size=350)})
+    reset_layout_stats()
+    drawn(budget_swarmplot(data=data, x=x, y=y, point_budget=300, ax=Figure().subplots()))
+    assert layout_stats()[1] == 350
+    reset_layout_stats()
+    ax = drawn(budget_swarmplot(data=data, x=x, y=y, point_budget=299, ax=Figure().subplots()))
+    assert layout_stats()[1] == 0
+    assert sum(len(points.get_offsets()) for points in ax.collections) == 350
+